@@ -0,0 +1,49 @@
+"""
+Compare the JSON codecs on a realistic request envelope and response.
+
+Times parsing an IntentRequest envelope with resolved slots and rendering a
+response with session attributes, for every codec that is installed.
+
+    python benchmarks/bench_json.py
+"""
+import timeit
+
+from flask import Flask
+
+from flask_ask.codec import get_codec
+from flask_ask.test import AlexaRequestBuilder
+
+NUMBER = 20000
+
+
+def main():
+    builder = AlexaRequestBuilder().intent('OneshotTideIntent')
+    builder.slot('City', 'san francisco').slot('Date', '2017-07-08')
+    envelope = builder.make()
+    response = {
+        'version': '1.0',
+        'response': {
+            'outputSpeech': {'type': 'SSML', 'ssml': '<speak>High tide is at 6:42 in the morning.</speak>'},
+            'card': {'type': 'Simple', 'title': 'Tides', 'content': 'High tide is at 6:42 in the morning.'},
+            'reprompt': {'outputSpeech': {'type': 'PlainText', 'text': 'Which city?'}},
+            'shouldEndSession': False,
+        },
+        'sessionAttributes': {'city': 'san francisco', 'date': '2017-07-08', 'history': list(range(20))},
+    }
+
+    app = Flask(__name__)
+    with app.app_context():
+        body = get_codec('json').dumps(envelope)
+        for name in ('json', 'orjson', 'rapidjson', 'ujson'):
+            try:
+                codec = get_codec(name)
+            except ImportError:
+                print('{:<10} not installed'.format(name))
+                continue
+            loads = timeit.timeit(lambda: codec.loads(body), number=NUMBER) / NUMBER
+            dumps = timeit.timeit(lambda: codec.dumps(response), number=NUMBER) / NUMBER
+            print('{:<10} loads {:6.1f} us   dumps {:6.1f} us'.format(name, loads * 1e6, dumps * 1e6))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,42 @@
+"""
+Compare the WSGI-emulating and direct AWS Lambda entry points.
+
+Times one IntentRequest event through run_aws_lambda, which serializes the
+event, builds a WSGI environ and parses the rendered response back, and
+through run_aws_lambda_direct, which dispatches the event dict in place.
+
+    python benchmarks/bench_lambda.py
+"""
+import timeit
+
+from flask import Flask
+
+from flask_ask import Ask, statement
+from flask_ask.test import AlexaRequestBuilder
+
+NUMBER = 5000
+
+
+def main():
+    app = Flask(__name__)
+    ask = Ask(app, '/')
+
+    @ask.intent('OneshotTideIntent')
+    def tide(city, date):
+        return statement('High tide in {} on {} is at 6:42 in the morning.'.format(city, date))
+
+    builder = AlexaRequestBuilder().intent('OneshotTideIntent')
+    builder.slot('city', 'san francisco').slot('date', '2017-07-08')
+    event = builder.make()
+
+    assert ask.run_aws_lambda(event) == ask.run_aws_lambda_direct(event)
+
+    wsgi = timeit.timeit(lambda: ask.run_aws_lambda(event), number=NUMBER) / NUMBER
+    direct = timeit.timeit(lambda: ask.run_aws_lambda_direct(event), number=NUMBER) / NUMBER
+    print('run_aws_lambda         {:7.1f} us'.format(wsgi * 1e6))
+    print('run_aws_lambda_direct  {:7.1f} us'.format(direct * 1e6))
+    print('saved per invocation   {:7.1f} us ({:.0%})'.format((wsgi - direct) * 1e6, 1 - direct / wsgi))
+
+
+if __name__ == '__main__':
+    main()
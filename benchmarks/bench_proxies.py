@@ -0,0 +1,44 @@
+"""
+Time attribute access through the flask_ask proxy globals.
+
+Handlers read request, session and context many times per request, and each
+read resolves the Ask instance. With blueprints that resolution used to walk
+every registered blueprint, so this registers a few unrelated blueprints
+before the Ask one.
+
+    python benchmarks/bench_proxies.py
+"""
+import timeit
+
+from flask import Flask, Blueprint
+
+from flask_ask import Ask, request, session, context
+from flask_ask.test import AlexaRequestBuilder
+
+NUMBER = 100000
+
+
+def main():
+    app = Flask(__name__)
+    for i in range(10):
+        app.register_blueprint(Blueprint('other{}'.format(i), __name__), url_prefix='/other{}'.format(i))
+    blueprint = Blueprint('skill', __name__, url_prefix='/ask')
+    ask = Ask(blueprint=blueprint)
+    app.register_blueprint(blueprint)
+
+    envelope = AlexaRequestBuilder().intent('OneshotTideIntent').slot('City', 'san francisco').make()
+
+    with app.app_context():
+        ask._dispatch(envelope)
+
+        def read():
+            request.type
+            session.attributes
+            context.System
+
+        elapsed = timeit.timeit(read, number=NUMBER) / NUMBER
+        print('three proxy reads (blueprint)  {:6.2f} us'.format(elapsed * 1e6))
+
+
+if __name__ == '__main__':
+    main()
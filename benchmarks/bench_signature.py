@@ -0,0 +1,63 @@
+"""
+Compare per-request signature verification cost.
+
+Runs the pyOpenSSL ``crypto.verify`` path Flask-Ask used to take (when
+pyOpenSSL is installed) against ``verifier.verify_signature`` with a cached
+``SigningCertificate``, for both SHA-1 and SHA-256 signatures.
+
+    python benchmarks/bench_signature.py
+"""
+import base64
+import datetime
+import timeit
+
+from cryptography import x509
+from cryptography.x509.oid import NameOID
+from cryptography.hazmat.backends import default_backend
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import rsa, padding
+
+from flask_ask import verifier
+
+NUMBER = 2000
+
+
+def make_certificate():
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048, backend=default_backend())
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, u'echo-api.amazon.com')])
+    now = datetime.datetime.utcnow()
+    cert = x509.CertificateBuilder().subject_name(name).issuer_name(name) \
+        .public_key(key.public_key()).serial_number(1) \
+        .not_valid_before(now).not_valid_after(now + datetime.timedelta(days=1)) \
+        .sign(key, hashes.SHA256(), default_backend())
+    return key, cert.public_bytes(serialization.Encoding.PEM)
+
+
+def report(label, seconds):
+    print('{:<40} {:8.1f} us/request'.format(label, seconds / NUMBER * 1e6))
+
+
+def main():
+    key, pem = make_certificate()
+    body = b'{"version": "1.0", "request": {"type": "IntentRequest"}}' * 20
+    sha1 = base64.b64encode(key.sign(body, padding.PKCS1v15(), hashes.SHA1()))
+    sha256 = base64.b64encode(key.sign(body, padding.PKCS1v15(), hashes.SHA256()))
+    cert = verifier.SigningCertificate.from_pem(pem)
+
+    try:
+        from OpenSSL import crypto
+    except ImportError:
+        print('pyOpenSSL not installed, skipping the legacy path')
+    else:
+        x509_cert = crypto.load_certificate(crypto.FILETYPE_PEM, pem)
+        report('pyOpenSSL crypto.verify sha1', timeit.timeit(
+            lambda: crypto.verify(x509_cert, base64.b64decode(sha1), body, 'sha1'), number=NUMBER))
+
+    report('verify_signature sha1 (cached key)', timeit.timeit(
+        lambda: verifier.verify_signature(cert, sha1, body), number=NUMBER))
+    report('verify_signature sha256 (cached key)', timeit.timeit(
+        lambda: verifier.verify_signature(cert, sha256, body, 'sha256'), number=NUMBER))
+
+
+if __name__ == '__main__':
+    main()
@@ -13,7 +13,9 @@ from .core import (
     version,
     context,
     current_stream,
-    convert_errors
+    convert_errors,
+    alexa_api,
+    copy_ask_context
 )
 
 from .models import (
@@ -28,3 +30,6 @@ from .models import (
     upsell,
     refund
 )
+
+from .router import SkillRouter
+from .api import AlexaAPIError
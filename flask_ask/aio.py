@@ -0,0 +1,76 @@
+"""
+Running async view functions from the synchronous dispatcher
+"""
+import inspect
+import threading
+
+try:
+    import asyncio
+except ImportError:  # Python 2
+    asyncio = None
+
+try:
+    from contextvars import copy_context
+except ImportError:  # Python < 3.7
+    copy_context = None
+
+
+_loops = threading.local()
+
+
+def is_awaitable(obj):
+    """True if obj is a coroutine or other awaitable returned by an async view function."""
+    return asyncio is not None and inspect.isawaitable(obj)
+
+
+def run_sync(awaitable):
+    """Runs an awaitable to completion and returns its result.
+
+    Each thread gets one event loop, created on first use and reused for every later request
+    that thread serves, so async view functions do not pay for a new loop per request. If the
+    calling thread is already running a loop, the awaitable runs on a short-lived helper thread
+    instead, in a copy of the caller's contextvars context.
+    """
+    if _running_loop() is not None:
+        return _run_in_helper_thread(awaitable)
+
+    loop = getattr(_loops, 'loop', None)
+    if loop is None or loop.is_closed():
+        loop = _loops.loop = asyncio.new_event_loop()
+    return loop.run_until_complete(awaitable)
+
+
+def close_loop():
+    """Closes the calling thread's event loop, if it has one."""
+    loop = getattr(_loops, 'loop', None)
+    if loop is not None:
+        _loops.loop = None
+        loop.close()
+
+
+def _running_loop():
+    # returns None instead of raising when no loop is running, unlike get_running_loop
+    return asyncio._get_running_loop()
+
+
+def _run_in_helper_thread(awaitable):
+    outcome = {}
+    context = copy_context() if copy_context is not None else None
+
+    def run():
+        try:
+            if context is None:
+                outcome['result'] = run_sync(awaitable)
+            else:
+                outcome['result'] = context.run(run_sync, awaitable)
+        except BaseException as e:
+            outcome['error'] = e
+        finally:
+            close_loop()
+
+    helper = threading.Thread(target=run)
+    helper.start()
+    helper.join()
+    if 'error' in outcome:
+        raise outcome['error']
+    return outcome['result']
@@ -0,0 +1,174 @@
+"""
+Client for the Alexa REST APIs a skill can call while handling a request
+"""
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+from six.moves.urllib.parse import quote
+
+from . import logger
+from .cache import SingleFlight, UserCache
+from .transport import ConnectionPool
+
+
+IN_SKILL_PRODUCTS_PATH = '/v1/users/~current/skills/~current/inSkillProducts'
+
+
+class AlexaAPIError(Exception):
+    """Raised when an Alexa API answers with a non-2xx status."""
+
+    def __init__(self, status, data):
+        super(AlexaAPIError, self).__init__('Alexa API answered {}: {!r}'.format(status, data[:200]))
+        self.status = status
+        self.data = data
+
+
+class AlexaAPIClient(object):
+    """Calls the Alexa APIs found at a request's context.System.apiEndpoint, authorized with its
+    apiAccessToken.
+
+    Requests share the keep-alive connections of a ConnectionPool, and calls that must not hold
+    up the response, such as progressive responses, run on a small background thread pool.
+    GET results can be cached per user and locale; concurrent identical GETs for a user are
+    made once.
+
+    Keyword Arguments:
+        pool {transport.ConnectionPool} -- HTTP connection pool (default: {ConnectionPool()})
+        max_workers {int} -- threads sending background calls (default: {4})
+        cache {cache.UserCache} -- per-user cache of GET results, or None to disable caching
+            (default: {UserCache()})
+    """
+
+    def __init__(self, pool=None, max_workers=4, cache=None):
+        self.pool = pool or ConnectionPool()
+        self.cache = UserCache() if cache is None else cache
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        self._flight = SingleFlight()
+
+    def request(self, method, endpoint, path, token, body=None, headers=None):
+        """Sends one API call and returns its decoded JSON body, or None if it has none.
+
+        Raises AlexaAPIError for non-2xx answers.
+        """
+        request_headers = {'Authorization': 'Bearer {}'.format(token), 'Accept': 'application/json'}
+        if body is not None:
+            body = json.dumps(body).encode('utf-8')
+            request_headers['Content-Type'] = 'application/json'
+        if headers:
+            request_headers.update(headers)
+
+        response = self.pool.request(method, endpoint.rstrip('/') + path, body, request_headers)
+        if not 200 <= response.status < 300:
+            raise AlexaAPIError(response.status, response.data)
+        if not response.data:
+            return None
+        return json.loads(response.data.decode('utf-8'))
+
+    def get(self, endpoint, path, token, user_id=None, locale=None):
+        """GETs path and returns the decoded JSON body.
+
+        With a user_id, the result is cached for that user and locale, and concurrent calls for the
+        same user, locale and path share one request. Cached values are shared between callers and
+        must not be modified.
+        """
+        headers = {'Accept-Language': locale} if locale else None
+        if user_id is None or self.cache is None:
+            return self.request('GET', endpoint, path, token, headers=headers)
+
+        key = (locale, path)
+        value = self.cache.get(user_id, key)
+        if value is None:
+            value = self._flight.do((user_id, key), self._get_and_cache, endpoint, path, token, headers,
+                                    user_id, key)
+        return value
+
+    def _get_and_cache(self, endpoint, path, token, headers, user_id, key):
+        value = self.request('GET', endpoint, path, token, headers=headers)
+        if value is not None:
+            self.cache.set(user_id, key, value)
+        return value
+
+    def send_directive(self, endpoint, token, request_id, directive):
+        """Sends a directive, such as VoicePlayer.Speak, for the request with id request_id."""
+        body = {'header': {'requestId': request_id}, 'directive': directive}
+        return self.request('POST', endpoint, '/v1/directives', token, body)
+
+    def submit(self, func, *args, **kwargs):
+        """Runs func on the background pool and returns a concurrent.futures.Future for its result.
+
+        Failures are logged, and are also raised by the future's result().
+        """
+        future = self._executor.submit(func, *args, **kwargs)
+        future.add_done_callback(_log_failure)
+        return future
+
+    def close(self):
+        """Waits for background calls to finish and closes idle connections."""
+        self._executor.shutdown(wait=True)
+        self.pool.close()
+
+
+class RequestAPI(object):
+    """The Alexa service APIs as seen from one request.
+
+    Built by Ask.alexa_api from the request's context.System: its apiEndpoint, apiAccessToken, user
+    and device, and the request's locale. Results are cached per user and locale by the client.
+
+    @ask.launch
+    def launch():
+        products = alexa_api.in_skill_products()
+        ...
+    """
+
+    def __init__(self, client, endpoint, token, user_id=None, device_id=None, locale=None):
+        self.client = client
+        self.endpoint = endpoint
+        self.token = token
+        self.user_id = user_id
+        self.device_id = device_id
+        self.locale = locale
+
+    def get(self, path, cached=True):
+        """GETs any API path, cached for the user unless cached is False."""
+        user_id = self.user_id if cached else None
+        return self.client.get(self.endpoint, path, self.token, user_id=user_id, locale=self.locale)
+
+    def in_skill_products(self):
+        """Returns the skill's in-skill products as seen by the user, following nextToken pages."""
+        products = []
+        path = IN_SKILL_PRODUCTS_PATH
+        while True:
+            page = self.get(path) or {}
+            products.extend(page.get('inSkillProducts') or [])
+            next_token = page.get('nextToken')
+            if not next_token:
+                return products
+            path = '{}?nextToken={}'.format(IN_SKILL_PRODUCTS_PATH, quote(next_token, safe=''))
+
+    def device_address(self, country_and_postal_code=False):
+        """Returns the device's address, or only its country and postal code."""
+        path = '/v1/devices/{}/settings/address'.format(self.device_id)
+        if country_and_postal_code:
+            path += '/countryAndPostalCode'
+        return self.get(path)
+
+    def device_setting(self, name):
+        """Returns a device setting: 'timeZone', 'distanceUnits' or 'temperatureUnit'."""
+        return self.get('/v2/devices/{}/settings/System.{}'.format(self.device_id, name))
+
+    def profile(self, field):
+        """Returns a customer profile field: 'name', 'givenName', 'email' or 'mobileNumber'."""
+        return self.get('/v2/accounts/~current/settings/Profile.{}'.format(field))
+
+    def invalidate(self, prefix=None):
+        """Drops the user's cached results, or only those for paths starting with prefix."""
+        if self.client.cache is not None and self.user_id is not None:
+            self.client.cache.invalidate(self.user_id, prefix)
+
+
+def _log_failure(future):
+    if future.cancelled():
+        return
+    error = future.exception()
+    if error is not None:
+        logger.warning('Background Alexa API call failed: {}'.format(error))
@@ -0,0 +1,154 @@
+"""
+ASGI adapter for serving a skill under an async server such as uvicorn or hypercorn
+
+Requires Python 3.5+.
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.datastructures import Headers
+
+from . import logger, verifier
+from .core import _Verification
+
+
+class AskASGI(object):
+    """Serves an Ask skill as an ASGI application.
+
+    Connections are handled on the event loop, so a worker can hold thousands of them open while
+    waiting for request bodies or for Amazon's signing certificates. Each request goes through
+    the same verification, parsing, dispatch and rendering as the Flask view:
+
+        1. the body is read and parsed on the loop;
+        2. the checks that only look at the request JSON (application ID, timestamp and
+           @ask.verification_check functions) run on the loop;
+        3. the signing certificate is loaded with verifier.load_certificate_async, so a cache
+           miss downloads it in the thread pool without blocking the loop;
+        4. the signature check, dispatch and rendering run in the thread pool inside an app
+           context, because Flask's contexts are bound to a thread. async view functions are
+           awaited on the worker thread's event loop.
+
+    Example:
+
+        app = Flask(__name__)
+        ask = Ask(app, '/')
+        asgi_app = AskASGI(ask)
+
+        # uvicorn module:asgi_app
+
+    Arguments:
+        ask {Ask} -- the skill's Ask instance, initialized with a Flask app
+
+    Keyword Arguments:
+        route {str} -- path the skill is served on (default: {the Ask route, or '/'})
+        executor {concurrent.futures.Executor} -- pool running dispatch and certificate downloads
+            (default: {ThreadPoolExecutor with max_workers threads, shut down on lifespan shutdown})
+        max_workers {int} -- size of the default thread pool (default: {None, the executor's default})
+    """
+
+    def __init__(self, ask, route=None, executor=None, max_workers=None):
+        if ask.app is None:
+            raise TypeError("AskASGI needs an Ask instance initialized with a Flask app")
+        self.ask = ask
+        self.app = ask.app
+        self.route = route or ask._route or '/'
+        self._owns_executor = executor is None
+        self.executor = executor or ThreadPoolExecutor(max_workers=max_workers)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+        elif scope['type'] == 'http':
+            status, headers, body = await self._http(scope, receive)
+            await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+            await send({'type': 'http.response.body', 'body': body})
+        else:
+            raise ValueError('Unsupported ASGI scope type "{}"'.format(scope['type']))
+
+    def close(self):
+        """Shuts down the thread pool if the adapter created it, and waits for ask.after_response work."""
+        if self._owns_executor:
+            self.executor.shutdown(wait=True)
+        if self.ask._task_queue is not None:
+            self.ask._task_queue.close()
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.close()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def _http(self, scope, receive):
+        if scope['path'] != self.route:
+            return _plain(404, b'Not Found')
+        if scope['method'] != 'POST':
+            return _plain(405, b'Method Not Allowed')
+
+        raw_body = await _read_body(receive)
+        headers = Headers([(name.decode('latin-1'), value.decode('latin-1')) for name, value in scope['headers']])
+        try:
+            return await self._handle(raw_body, headers)
+        except verifier.VerificationError as e:
+            logger.warning('Request verification failed: {}'.format(e))
+            return _plain(400, b'Bad Request')
+        except Exception:
+            logger.exception('Error handling Alexa request')
+            return _plain(500, b'Internal Server Error')
+
+    async def _handle(self, raw_body, headers):
+        ask = self.ask
+        loop = asyncio.get_event_loop()
+
+        # nothing below awaits while the app context is pushed, so requests never see each other's context
+        with self.app.app_context():
+            payload = ask.json_codec.loads(raw_body)
+            verify = ask.ask_verify_requests
+            verification = _Verification(payload, raw_body, headers)
+            if verify:
+                ask._run_verification_stages(verification, ask._payload_verification_stages())
+                cert_sources = dict(cache=ask.cert_cache, fetcher=ask.cert_fetcher, store=ask.cert_store,
+                                    chain_validator=ask.chain_validator)
+
+        if verify:
+            start = loop.time()
+            try:
+                verification.cert = await verifier.load_certificate_async(
+                    headers['Signaturecertchainurl'], loop=loop, executor=self.executor, **cert_sources)
+            except BaseException:
+                ask.verification_stats.record('certificate', loop.time() - start, rejected=True)
+                raise
+            ask.verification_stats.record('certificate', loop.time() - start)
+
+        return await loop.run_in_executor(self.executor, self._respond, verification, verify)
+
+    def _respond(self, verification, verify):
+        ask = self.ask
+        with self.app.app_context():
+            if verify:
+                ask._run_verification_stages(verification, [('signature', ask._verify_signature)])
+            result = ask._respond(verification.payload)
+            response = self.app.make_response(result)
+            ask._queue_after_response()
+            if isinstance(result, bytes):
+                response.mimetype = 'application/json'
+            headers = [(name.lower().encode('latin-1'), value.encode('latin-1'))
+                       for name, value in response.headers.items()]
+            return response.status_code, headers, response.get_data()
+
+
+async def _read_body(receive):
+    chunks = []
+    more_body = True
+    while more_body:
+        message = await receive()
+        chunks.append(message.get('body', b''))
+        more_body = message.get('more_body', False)
+    return b''.join(chunks)
+
+
+def _plain(status, body):
+    return status, [(b'content-type', b'text/plain'), (b'content-length', str(len(body)).encode('ascii'))], body
@@ -1,6 +1,15 @@
 """
-Stream cache functions
+Stream cache functions and in-process caching helpers
 """
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.contrib.cache import SimpleCache
+
+from . import logger
 
 
 def push_stream(cache, user_id, stream):
@@ -78,3 +87,254 @@ def top_stream(cache, user_id):
     if stack is None:
         return None
     return stack.pop()
+
+
+class SingleFlight(object):
+    """
+    Collapse concurrent calls that share a key into a single call.
+
+    The first caller for a key runs the function, callers arriving while
+    it is still running wait for it and receive the same result or exception.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, func, *args, **kwargs):
+        """
+        Call `func(*args, **kwargs)` unless a call for `key` is already in flight.
+
+        :param key: hashable key identifying the call
+        :param func: function to call
+
+        :return: result of the call made for `key`
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = func(*args, **kwargs)
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+    def in_flight(self, key):
+        """Return True if a call for `key` is currently running."""
+        return key in self._calls
+
+
+class _Call(object):
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class ResponseCache(object):
+    """
+    Rendered responses keyed by Alexa requestId.
+
+    Alexa retries a request with the same requestId when the skill is slow to
+    answer. Keeping the rendered response lets a retry be answered straight
+    away instead of running the view function, and its side effects, again.
+
+    :param store: werkzeug BasicCache-like object, e.g. a RedisCache shared by
+                  several processes (default: SimpleCache holding `max_size` entries)
+    :param timeout: seconds a response is kept
+    :param max_size: number of responses the default store holds
+    """
+
+    key_prefix = 'flask_ask.response:'
+
+    def __init__(self, store=None, timeout=60, max_size=500):
+        if store is None:
+            store = SimpleCache(threshold=max_size, default_timeout=timeout)
+        self.store = store
+        self.timeout = timeout
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, request_id):
+        """
+        :return: the cached response body for `request_id`, otherwise None
+        """
+        response = self.store.get(self.key_prefix + request_id)
+        if response is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return response
+
+    def set(self, request_id, response):
+        """
+        Cache a rendered response body. Only successful responses should be stored.
+        """
+        return self.store.set(self.key_prefix + request_id, response, timeout=self.timeout)
+
+
+class CallCache(object):
+    """
+    Results of outbound calls, such as requests to a web service, keyed by
+    the call's arguments.
+
+    A result is fresh for `ttl` seconds. After that it may still be served
+    for `stale_ttl` seconds while a single background call refreshes it, so
+    callers are not held up by a slow upstream. Concurrent misses for a key
+    are collapsed into one call. Exceptions are raised to the callers and
+    never cached.
+
+    :param store: werkzeug BaseCache-like object, e.g. a RedisCache shared by
+                  several processes (default: SimpleCache holding `max_size` entries)
+    :param max_size: number of results the default store holds
+    :param max_workers: threads refreshing stale results
+    """
+
+    key_prefix = 'flask_ask.call:'
+
+    def __init__(self, store=None, max_size=1000, max_workers=4):
+        if store is None:
+            store = SimpleCache(threshold=max_size)
+        self.store = store
+        self._flight = SingleFlight()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+
+    def get(self, key, func, ttl, stale_ttl=0, make_refresh=None):
+        """
+        Return the cached result for `key`, calling `func()` to produce it when
+        there is none.
+
+        :param key: hashable key identifying the call; its repr is hashed into the store key
+        :param func: function making the call
+        :param ttl: seconds the result is fresh
+        :param stale_ttl: seconds a stale result is served while it is refreshed
+        :param make_refresh: called on the calling thread, only when a stale result is
+                             about to be refreshed, to build the function run in the background
+                             instead of `func`, e.g. `func` wrapped with copy_ask_context
+
+        :return: the result of the call
+        """
+        store_key = self.key_prefix + hashlib.sha1(repr(key).encode('utf-8')).hexdigest()
+        entry = self.store.get(store_key)
+        if entry is not None:
+            fresh_until, value = entry
+            if time.time() < fresh_until:
+                self.hits += 1
+                return value
+            if stale_ttl:
+                self.stale_hits += 1
+                if not self._flight.in_flight(store_key):
+                    refresh = make_refresh() if make_refresh is not None else func
+                    try:
+                        self._executor.submit(self._refresh, store_key, refresh, ttl, stale_ttl)
+                    except RuntimeError:
+                        pass  # closed: keep serving the stale result
+                return value
+
+        self.misses += 1
+        return self._flight.do(store_key, self._call, store_key, func, ttl, stale_ttl)
+
+    def close(self):
+        """Wait for background refreshes to finish."""
+        self._executor.shutdown(wait=True)
+
+    def _call(self, store_key, func, ttl, stale_ttl):
+        value = func()
+        self.store.set(store_key, (time.time() + ttl, value), timeout=ttl + stale_ttl)
+        return value
+
+    def _refresh(self, store_key, func, ttl, stale_ttl):
+        try:
+            self._flight.do(store_key, self._call, store_key, func, ttl, stale_ttl)
+        except Exception:
+            logger.warning('Refreshing a cached call failed, the stale result is kept', exc_info=True)
+
+
+class UserCache(object):
+    """
+    Values cached per user with a time to live, invalidated per user.
+
+    Entries are grouped by user id so that everything cached for a user, or
+    every key of a user starting with a prefix, can be dropped at once. The
+    least recently used users are evicted beyond `max_users`.
+
+    :param ttl: seconds an entry is kept
+    :param max_users: number of users whose entries are kept
+    """
+
+    def __init__(self, ttl=300, max_users=1000):
+        self.ttl = ttl
+        self.max_users = max_users
+        self._lock = threading.Lock()
+        self._users = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_id, key):
+        """
+        :return: the value cached for `user_id` under `key`, otherwise None
+        """
+        now = time.time()
+        with self._lock:
+            entries = self._users.pop(user_id, None)
+            if entries is not None:
+                self._users[user_id] = entries
+                entry = entries.get(key)
+                if entry is not None:
+                    expires, value = entry
+                    if expires > now:
+                        self.hits += 1
+                        return value
+                    del entries[key]
+            self.misses += 1
+            return None
+
+    def set(self, user_id, key, value):
+        with self._lock:
+            entries = self._users.pop(user_id, None)
+            if entries is None:
+                entries = {}
+            entries[key] = (time.time() + self.ttl, value)
+            self._users[user_id] = entries
+            while len(self._users) > self.max_users:
+                self._users.popitem(last=False)
+
+    def invalidate(self, user_id, prefix=None):
+        """
+        Drop the entries of `user_id`, or only those whose key starts with `prefix`.
+        Keys must be strings, or tuples whose last item is a string, to be matched by prefix.
+        """
+        with self._lock:
+            if prefix is None:
+                self._users.pop(user_id, None)
+                return
+            entries = self._users.get(user_id)
+            if entries:
+                for key in [k for k in entries if _key_path(k).startswith(prefix)]:
+                    del entries[key]
+
+    def __len__(self):
+        with self._lock:
+            return sum(len(entries) for entries in self._users.values())
+
+
+def _key_path(key):
+    return key[-1] if isinstance(key, tuple) else key
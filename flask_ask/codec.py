@@ -0,0 +1,115 @@
+"""
+JSON codecs used to parse Alexa requests and render responses
+"""
+from flask import json
+
+
+class JSONCodec(object):
+    """Standard library json through Flask's encoder. This is the default codec.
+
+    Every codec parses str or bytes with `loads` and renders to UTF-8 bytes
+    with `dumps`, which accepts the same `default` and `cls` arguments as
+    json.dumps so that session.attributes_encoder keeps working.
+    """
+
+    name = 'json'
+
+    def loads(self, data):
+        return json.loads(data)
+
+    def dumps(self, obj, default=None, cls=None):
+        kw = {}
+        if default is not None:
+            kw['default'] = default
+        if cls is not None:
+            kw['cls'] = cls
+        return json.dumps(obj, **kw).encode('utf-8')
+
+
+class OrjsonCodec(JSONCodec):
+    """orjson, the fastest codec. Falls back to the standard codec for
+    encoder classes and for values orjson cannot serialize."""
+
+    name = 'orjson'
+
+    def __init__(self):
+        import orjson
+        self._orjson = orjson
+
+    def loads(self, data):
+        return self._orjson.loads(data)
+
+    def dumps(self, obj, default=None, cls=None):
+        if cls is None:
+            try:
+                return self._orjson.dumps(obj, default=default)
+            except TypeError:
+                pass
+        return super(OrjsonCodec, self).dumps(obj, default=default, cls=cls)
+
+
+class RapidjsonCodec(JSONCodec):
+    """python-rapidjson. Falls back to the standard codec for encoder classes
+    and for values rapidjson cannot serialize."""
+
+    name = 'rapidjson'
+
+    def __init__(self):
+        import rapidjson
+        self._rapidjson = rapidjson
+
+    def loads(self, data):
+        if isinstance(data, bytes):
+            data = data.decode('utf-8')
+        return self._rapidjson.loads(data)
+
+    def dumps(self, obj, default=None, cls=None):
+        if cls is None:
+            try:
+                return self._rapidjson.dumps(obj, default=default).encode('utf-8')
+            except TypeError:
+                pass
+        return super(RapidjsonCodec, self).dumps(obj, default=default, cls=cls)
+
+
+class UjsonCodec(JSONCodec):
+    """ujson. Falls back to the standard codec whenever a custom encoder is
+    given and for values ujson cannot serialize."""
+
+    name = 'ujson'
+
+    def __init__(self):
+        import ujson
+        self._ujson = ujson
+
+    def loads(self, data):
+        return self._ujson.loads(data)
+
+    def dumps(self, obj, default=None, cls=None):
+        if default is None and cls is None:
+            try:
+                return self._ujson.dumps(obj, escape_forward_slashes=False).encode('utf-8')
+            except (TypeError, OverflowError):
+                pass
+        return super(UjsonCodec, self).dumps(obj, default=default, cls=cls)
+
+
+_CODECS = [OrjsonCodec, RapidjsonCodec, UjsonCodec, JSONCodec]
+
+
+def get_codec(name='json'):
+    """Return a codec by name: 'json', 'orjson', 'rapidjson', 'ujson', or 'auto'
+    for the fastest one installed.
+
+    Raises ImportError if the named library is not installed.
+    """
+    if name == 'auto':
+        for codec_class in _CODECS:
+            try:
+                return codec_class()
+            except ImportError:
+                continue
+    for codec_class in _CODECS:
+        if codec_class.name == name:
+            return codec_class()
+    raise ValueError('Unknown JSON codec "{}"'.format(name))
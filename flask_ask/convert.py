@@ -1,7 +1,8 @@
 import re
-from datetime import datetime, time
+from datetime import datetime, time, timedelta, tzinfo
 
 import aniso8601
+import six
 
 from . import logger
 
@@ -55,3 +56,54 @@ def to_time(amazon_time):
 
 def to_timedelta(amazon_duration):
     return aniso8601.parse_duration(amazon_duration)
+
+
+class _UTC(tzinfo):
+
+    def utcoffset(self, dt):
+        return timedelta(0)
+
+    def tzname(self, dt):
+        return 'UTC'
+
+    def dst(self, dt):
+        return timedelta(0)
+
+    def __repr__(self):
+        return 'UTC'
+
+
+_utc = _UTC()
+_TIMESTAMP_CACHE_SIZE = 1024
+_timestamp_cache = {}
+
+
+def to_datetime(amazon_timestamp):
+    """Parse an ISO 8601 request timestamp into a timezone aware datetime.
+
+    Alexa sends timestamps as YYYY-MM-DDTHH:MM:SSZ, which is parsed by slicing
+    rather than by aniso8601; any other shape falls back to aniso8601. Results
+    are memoized, since concurrent requests and repeated reads of the same
+    attribute share the same handful of values.
+    """
+    try:
+        return _timestamp_cache[amazon_timestamp]
+    except (KeyError, TypeError):
+        pass
+
+    if (isinstance(amazon_timestamp, six.string_types) and len(amazon_timestamp) == 20 and
+            amazon_timestamp[4] == '-' and amazon_timestamp[7] == '-' and amazon_timestamp[10] == 'T' and
+            amazon_timestamp[13] == ':' and amazon_timestamp[16] == ':' and amazon_timestamp[19] == 'Z'):
+        try:
+            value = datetime(int(amazon_timestamp[0:4]), int(amazon_timestamp[5:7]), int(amazon_timestamp[8:10]),
+                             int(amazon_timestamp[11:13]), int(amazon_timestamp[14:16]),
+                             int(amazon_timestamp[17:19]), tzinfo=_utc)
+        except ValueError:
+            value = aniso8601.parse_datetime(amazon_timestamp)
+    else:
+        value = aniso8601.parse_datetime(amazon_timestamp)
+
+    if len(_timestamp_cache) >= _TIMESTAMP_CACHE_SIZE:
+        _timestamp_cache.clear()
+    _timestamp_cache[amazon_timestamp] = value
+    return value
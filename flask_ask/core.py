@@ -1,30 +1,60 @@
 import os
 import sys
+import copy
+import atexit
 import yaml
+import logging
 import inspect
 import io
 from datetime import datetime
 from functools import wraps, partial
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from timeit import default_timer
 
-import aniso8601
+from six import string_types
 from werkzeug.contrib.cache import SimpleCache
 from werkzeug.local import LocalProxy, LocalStack
+try:
+    from contextvars import ContextVar, copy_context
+except ImportError:  # Python < 3.7
+    ContextVar = copy_context = None
 from jinja2 import BaseLoader, ChoiceLoader, TemplateNotFound
-from flask import current_app, json, request as flask_request, _app_ctx_stack
+from flask import current_app, json, request as flask_request, _app_ctx_stack, has_request_context, \
+    copy_current_request_context
 
-from . import verifier, logger
-from .convert import to_date, to_time, to_timedelta
-from .cache import top_stream, set_stream
-import collections
+from . import verifier, logger, codec, aio
+from .convert import to_date, to_time, to_timedelta, to_datetime
+from .cache import top_stream, set_stream, ResponseCache, UserCache, CallCache
+from .stats import StageStats
+from .transport import ConnectionPool
+from .api import AlexaAPIClient, RequestAPI, IN_SKILL_PRODUCTS_PATH
+from .tasks import TaskQueue
 
 
 def find_ask():
     """
     Find our instance of Ask, navigating Local's and possible blueprints.
 
+    The instance found is remembered on the app context, so the proxies below
+    only search for it once per context.
+
     Note: This only supports returning a reference to the first instance
     of Ask found.
     """
+    ctx = _app_ctx_stack.top
+    if ctx is None and _state_var is not None:
+        state = _state_var.get(None)
+        if state is not None:
+            return state.ask
+    ask = getattr(ctx, '_ask_instance', None)
+    if ask is None:
+        ask = _search_ask()
+        if ask is not None:
+            ctx._ask_instance = ask
+    return ask
+
+
+def _search_ask():
     if hasattr(current_app, 'ask'):
         return getattr(current_app, 'ask')
     else:
@@ -35,7 +65,107 @@ def find_ask():
                     return getattr(blueprints[blueprint_name], 'ask')
 
 
+class _AskState(object):
+    """Per-request Ask state: the parsed request, session, version, context and convert errors.
+
+    The state lives on the app context. Flask reuses an app context that is already pushed, so the
+    Flask views start each request with a fresh one through _begin_request. While a request
+    is dispatched it is also bound to a ContextVar. asyncio tasks and contextvars.copy_context()
+    callables started by the view function carry the ContextVar with them, so they read the same
+    state even though they run without the app context.
+    """
+
+    __slots__ = ('ask', 'app', 'request', 'session', 'version', 'context', 'convert_errors',
+                 'started', 'deadline_at', 'after_response', 'responded')
+
+    def __init__(self, ask=None, app=None):
+        self.ask = ask
+        self.app = app
+        self.request = None
+        self.session = None
+        self.version = None
+        self.context = None
+        self.convert_errors = None
+        self.started = None
+        self.deadline_at = None
+        self.after_response = None
+        self.responded = False
+
+
+if ContextVar is not None:
+    _state_var = ContextVar('flask_ask_state')
+else:
+    _state_var = None
+
+
+def _current_state():
+    ctx = _app_ctx_stack.top
+    if ctx is None:
+        state = _state_var.get(None) if _state_var is not None else None
+        # outside of any request the properties read as empty, as they always have
+        return state if state is not None else _AskState()
+    state = getattr(ctx, '_ask_state', None)
+    if state is None:
+        state = ctx._ask_state = _AskState()
+    return state
+
+
+def _begin_request(started):
+    """Replaces the Ask state on the current app context with a fresh one for a new request."""
+    state = _app_ctx_stack.top._ask_state = _AskState()
+    state.started = started
+    return state
+
+
+def copy_ask_context(f):
+    """Wraps a function so it runs with the Ask state of the current request, on any thread.
+
+    The wrapped function pushes a new app context for the current app that shares this request's
+    request, session, context and flask.g, and runs inside a copy of the current contextvars
+    context. Use it to hand work to a thread pool while still reading session and request:
+
+    @ask.intent('SearchIntent')
+    def search(query):
+        @copy_ask_context
+        def lookup(source):
+            return source.search(query, locale=request.locale)
+
+        results = list(executor.map(lookup, sources))
+        return statement(summarize(results))
+
+    Changes made to session.attributes from the wrapped function are seen by the request.
+    """
+    state = _current_state()
+    ask = state.ask or find_ask()
+    app = state.app or current_app._get_current_object()
+    top = _app_ctx_stack.top
+    app_globals = top.g if top is not None else None
+    context = copy_context() if copy_context is not None else None
+
+    @wraps(f)
+    def wrapper(*args, **kwargs):
+        ctx = app.app_context()
+        if app_globals is not None:
+            ctx.g = app_globals
+        with ctx:
+            ctx._ask_state = state
+            ctx._ask_instance = ask
+            if context is None:
+                return f(*args, **kwargs)
+            return context.copy().run(f, *args, **kwargs)
+    return wrapper
+
+
+def _refresh_in_context(f, args, kwargs):
+    """Returns f bound to its arguments, carrying the current request's state when there is one."""
+    if _app_ctx_stack.top is not None:
+        f = copy_ask_context(f)
+    return partial(f, *args, **kwargs)
+
+
 def dbgdump(obj, default=None, cls=None):
+    if not logger.isEnabledFor(logging.DEBUG):
+        return
     if current_app.config.get('ASK_PRETTY_DEBUG_LOGS', False):
         indent = 2
     else:
@@ -51,12 +181,18 @@ context = LocalProxy(lambda: find_ask().context)
 convert_errors = LocalProxy(lambda: find_ask().convert_errors)
 current_stream = LocalProxy(lambda: find_ask().current_stream)
 stream_cache = LocalProxy(lambda: find_ask().stream_cache)
+alexa_api = LocalProxy(lambda: find_ask().alexa_api)
 
 from . import models
 
 
 _converters = {'date': to_date, 'time': to_time, 'timedelta': to_timedelta}
 
+_DEFAULT_DEADLINE_FALLBACK_TEXT = "Sorry, that is taking longer than expected. Please try again in a moment."
+
+# only these requests may be answered with speech, so only they get the skill-wide deadline
+_DEADLINE_REQUEST_TYPES = frozenset(['LaunchRequest', 'IntentRequest'])
+
 
 class Ask(object):
     """The Ask object provides the central interface for interacting with the Alexa service.
@@ -73,9 +209,27 @@ class Ask(object):
         blueprint {Flask blueprint} -- Flask Blueprint instance to use instead of Flask App (default: {None})
         stream_cache {Werkzeug BasicCache} -- BasicCache-like object for storing Audio stream data (default: {SimpleCache})
         path {str} -- path to templates yaml file for VUI dialog (default: {'templates.yaml'})
+        cert_cache {verifier.CertificateCache} -- cache for Alexa signing certificates
+            (default: {CertificateCache sized from ASK_CERT_CACHE_SIZE and ASK_CERT_CACHE_TTL})
+        cert_fetcher {verifier.CertificateFetcher} -- object whose fetch(url) downloads signing certificates
+            (default: {CertificateFetcher using ASK_CERT_CONNECT_TIMEOUT and ASK_CERT_READ_TIMEOUT})
+        cert_store {verifier.DiskCertificateStore} -- persistent store consulted before downloading
+            a signing certificate (default: {DiskCertificateStore at ASK_CERT_STORE_PATH, if set})
+        response_cache {cache.ResponseCache} -- cache of rendered responses keyed by requestId, used to
+            answer retried requests (default: {ResponseCache if ASK_RESPONSE_CACHE is set, otherwise None})
+        json_codec {codec.JSONCodec} -- codec used to parse requests and render responses
+            (default: {codec named by ASK_JSON_CODEC})
+        api_client {api.AlexaAPIClient} -- client for the Alexa APIs, used by alexa_api and progressive
+            responses (default: {AlexaAPIClient configured by the ASK_API_* settings})
+        call_cache {cache.CallCache} -- cache of results of functions decorated with @ask.cached
+            (default: {CallCache using ASK_CALL_CACHE_SIZE and ASK_CALL_CACHE_WORKERS})
+        task_queue {tasks.TaskQueue} -- queue running the functions passed to after_response
+            (default: {TaskQueue configured by the ASK_AFTER_RESPONSE_* settings})
     """
 
-    def __init__(self, app=None, route=None, blueprint=None, stream_cache=None, path='templates.yaml'):
+    def __init__(self, app=None, route=None, blueprint=None, stream_cache=None, path='templates.yaml',
+                 cert_cache=None, cert_fetcher=None, cert_store=None, response_cache=None, json_codec=None,
+                 api_client=None, call_cache=None, task_queue=None):
         self.app = app
         self._route = route
         self._intent_view_funcs = {}
@@ -86,9 +240,44 @@ class Ask(object):
         self._session_ended_view_func = None
         self._on_session_started_callback = None
         self._default_intent_view_func = None
+        self._default_intent_binder = None
+        self._view_binders = {}
+        self._intent_deadlines = {}
+        self._intent_fallbacks = {}
+        self._deadline_fallback_func = None
+        self._deadline_executor = None
+        self.deadline_stats = StageStats()
         self._player_request_view_funcs = {}
         self._player_mappings = {}
         self._player_converts = {}
+        self._display_element_selected_func = None
+        self._request_handlers = {
+            'LaunchRequest': self._handle_launch,
+            'SessionEndedRequest': self._handle_session_ended,
+            'IntentRequest': self._handle_intent,
+            'Display.ElementSelected': self._handle_display_element_selected,
+            'Connections.Response': self._handle_purchase,
+        }
+        self._request_prefix_handlers = {
+            'AudioPlayer': self._handle_audio_player,
+        }
+        self.request_stats = StageStats()
+        self._hooks = {'before_verify': [], 'after_parse': [], 'before_dispatch': [], 'after_render': []}
+        self.hook_stats = StageStats()
+        self._cert_cache = cert_cache
+        self._cert_fetcher = cert_fetcher
+        self._cert_store = cert_store
+        self._chain_validator = None
+        self._trust_store_error = None
+        self._response_cache = response_cache
+        self._json_codec = json_codec
+        self._api_client = api_client
+        self._call_cache = call_cache
+        self._task_queue = task_queue
+        self._application_id_set = (None, None)
+        self._verification_checks = []
+        self.verification_stats = StageStats()
+        self.cert_refresher = None
         if app is not None:
             self.init_app(app, path)
         elif blueprint is not None:
@@ -130,6 +319,151 @@ class Ask(object):
             Add tabs and linebreaks to the Alexa request and response printed to the debug log.
             This improves readability when printing to the console, but breaks formatting when logging to CloudWatch.
             Default: False
+
+        `ASK_CERT_CACHE_SIZE`:
+
+            Maximum number of Alexa signing certificates kept in memory once downloaded and validated.
+            Default: 16
+
+        `ASK_CERT_CACHE_TTL`:
+
+            Maximum number of seconds a cached signing certificate is reused before it is downloaded
+            and validated again. Certificates are never reused past their expiry date.
+            Default: None
+
+        `ASK_CERT_CONNECT_TIMEOUT`:
+
+            Seconds allowed to connect to Amazon when downloading a signing certificate.
+            Default: 2.0
+
+        `ASK_CERT_READ_TIMEOUT`:
+
+            Seconds allowed for each read when downloading a signing certificate.
+            Default: 5.0
+
+        `ASK_CERT_STORE_PATH`:
+
+            Directory in which downloaded signing certificates are kept between process restarts,
+            e.g. '/var/cache/flask_ask_certs'. Several worker processes of the same user may share the
+            directory. It is created with mode 0700 and refused if another user owns it or others may
+            write to it. Stored certificates are validated again when they are read.
+            Default: None
+
+        `ASK_CERT_PREWARM_URLS`:
+
+            List of signing certificate URLs to download and validate when init_app is called, and to
+            keep loaded from a background thread that reloads them before they expire. Must be set
+            before init_app is called.
+            Default: None
+
+        `ASK_VERIFY_CERT_CHAIN`:
+
+            Validates the full signing certificate chain against a trust store when a certificate is
+            downloaded. The result is remembered for the lifetime of the chain.
+            Default: True
+
+        `ASK_CERT_TRUST_STORE`:
+
+            Path to a PEM bundle of trusted root certificates used for chain validation. By default
+            the system bundle is used, or certifi's if the system has none.
+            Default: None
+
+        `ASK_RESPONSE_CACHE`:
+
+            Keep each rendered response for a short while, keyed by the request's requestId, so that
+            requests retried by Alexa are answered without running the view function again.
+            Default: False
+
+        `ASK_RESPONSE_CACHE_TIMEOUT`:
+
+            Seconds a rendered response is kept for retries.
+            Default: 60
+
+        `ASK_RESPONSE_CACHE_SIZE`:
+
+            Maximum number of rendered responses kept in memory.
+            Default: 500
+
+        `ASK_JSON_CODEC`:
+
+            JSON library used to parse requests and render responses: 'json', 'orjson', 'rapidjson',
+            'ujson', or 'auto' to use the fastest one installed.
+            Default: 'json'
+
+        `ASK_HANDLER_DEADLINE`:
+
+            Seconds a LaunchRequest or IntentRequest view function may take, counted from when the
+            request arrived, before the request is answered with the deadline fallback instead. Other
+            request types cannot be answered with speech and are not given a deadline. Intents can
+            set their own with @ask.intent(..., deadline=...). View functions then run on a thread pool.
+            Default: None
+
+        `ASK_HANDLER_DEADLINE_WORKERS`:
+
+            Size of the thread pool that runs view functions with a deadline.
+            Default: 32
+
+        `ASK_DEADLINE_FALLBACK_TEXT`:
+
+            Speech of the statement given when a view function runs past its deadline and neither
+            the intent nor @ask.deadline_fallback provides a fallback.
+            Default: "Sorry, that is taking longer than expected. Please try again in a moment."
+
+        `ASK_API_CONNECT_TIMEOUT`:
+
+            Seconds allowed to connect to the Alexa APIs, used by progressive responses.
+            Default: 2.0
+
+        `ASK_API_READ_TIMEOUT`:
+
+            Seconds allowed for each read from the Alexa APIs once connected.
+            Default: 5.0
+
+        `ASK_API_WORKERS`:
+
+            Threads sending Alexa API calls in the background, such as progressive responses.
+            Default: 4
+
+        `ASK_API_CACHE_TTL`:
+
+            Seconds alexa_api results are cached for, per user and locale.
+            Default: 300
+
+        `ASK_API_CACHE_SIZE`:
+
+            Number of users whose alexa_api results are cached.
+            Default: 1000
+
+        `ASK_CALL_CACHE_SIZE`:
+
+            Number of results of @ask.cached functions kept by the default call cache.
+            Default: 1000
+
+        `ASK_CALL_CACHE_WORKERS`:
+
+            Threads refreshing stale results of @ask.cached functions in the background.
+            Default: 4
+
+        `ASK_AFTER_RESPONSE_WORKERS`:
+
+            Threads running the functions passed to ask.after_response.
+            Default: 4
+
+        `ASK_AFTER_RESPONSE_QUEUE_SIZE`:
+
+            Functions passed to ask.after_response that may wait for a thread before the queue is full.
+            Default: 100
+
+        `ASK_AFTER_RESPONSE_OVERFLOW`:
+
+            What happens to a function passed to ask.after_response when the queue is full: 'run' runs
+            it on the request's thread once the response is built, 'drop' discards it with a warning.
+            Default: 'run'
+
+        `ASK_AFTER_RESPONSE_EXIT_WAIT`:
+
+            Seconds the interpreter waits at exit for functions passed to ask.after_response to finish.
+            Default: 10
         """
         if self._route is None:
             raise TypeError("route is a required argument when app is not None")
@@ -141,6 +475,28 @@ class Ask(object):
         app.add_url_rule(self._route, view_func=self._flask_view_func, methods=['POST'])
         app.jinja_loader = ChoiceLoader([app.jinja_loader, YamlLoader(app, path)])
 
+        prewarm_urls = app.config.get('ASK_CERT_PREWARM_URLS')
+        if prewarm_urls:
+            self._start_cert_refresher(app, prewarm_urls)
+
+    def _start_cert_refresher(self, app, cert_urls):
+        with app.app_context():
+            load = partial(verifier.load_certificate, cache=self.cert_cache, fetcher=self.cert_fetcher,
+                           store=self.cert_store, chain_validator=self.chain_validator)
+        self.cert_refresher = verifier.CertificateRefresher(cert_urls, self.cert_cache, load)
+        self.cert_refresher.warm()
+        self.cert_refresher.start()
+
+    def certificate_status(self):
+        """Describes the signing certificates currently cached and when they expire.
+
+        Returns a list of dicts with the certificate `url`, its `not_after` date and the time the
+        cache entry `expires_at`, both naive UTC datetimes.
+        """
+        if self._cert_cache is None:
+            return []
+        return self._cert_cache.status()
+
     def init_blueprint(self, blueprint, path='templates.yaml'):
         """Initialize a Flask Blueprint, similar to init_app, but without the access
         to the application config.
@@ -174,6 +530,153 @@ class Ask(object):
     def ask_application_id(self):
         return current_app.config.get('ASK_APPLICATION_ID', None)
 
+    def _application_ids(self):
+        """ASK_APPLICATION_ID as a frozenset, rebuilt only when the config value is replaced."""
+        records = self.ask_application_id
+        if records is None:
+            return None
+        cached_records, application_ids = self._application_id_set
+        if records is not cached_records:
+            if isinstance(records, string_types):
+                application_ids = frozenset([records])
+            else:
+                application_ids = frozenset(records)
+            self._application_id_set = (records, application_ids)
+        return application_ids
+
+    @property
+    def cert_cache(self):
+        if self._cert_cache is None:
+            self._cert_cache = verifier.CertificateCache(
+                max_size=current_app.config.get('ASK_CERT_CACHE_SIZE', 16),
+                ttl=current_app.config.get('ASK_CERT_CACHE_TTL', None))
+        return self._cert_cache
+
+    @property
+    def cert_fetcher(self):
+        if self._cert_fetcher is None:
+            self._cert_fetcher = verifier.CertificateFetcher(
+                connect_timeout=current_app.config.get('ASK_CERT_CONNECT_TIMEOUT', 2.0),
+                read_timeout=current_app.config.get('ASK_CERT_READ_TIMEOUT', 5.0))
+        return self._cert_fetcher
+
+    @property
+    def cert_store(self):
+        if self._cert_store is None:
+            path = current_app.config.get('ASK_CERT_STORE_PATH', None)
+            if path is not None:
+                self._cert_store = verifier.DiskCertificateStore(path)
+        return self._cert_store
+
+    @property
+    def response_cache(self):
+        if self._response_cache is None and current_app.config.get('ASK_RESPONSE_CACHE', False):
+            self._response_cache = ResponseCache(
+                timeout=current_app.config.get('ASK_RESPONSE_CACHE_TIMEOUT', 60),
+                max_size=current_app.config.get('ASK_RESPONSE_CACHE_SIZE', 500))
+        return self._response_cache
+
+    @property
+    def ask_handler_deadline(self):
+        return current_app.config.get('ASK_HANDLER_DEADLINE', None)
+
+    @property
+    def deadline_executor(self):
+        if self._deadline_executor is None:
+            self._deadline_executor = ThreadPoolExecutor(
+                max_workers=current_app.config.get('ASK_HANDLER_DEADLINE_WORKERS', 32))
+        return self._deadline_executor
+
+    @property
+    def api_client(self):
+        if self._api_client is None:
+            pool = ConnectionPool(connect_timeout=current_app.config.get('ASK_API_CONNECT_TIMEOUT', 2.0),
+                                  read_timeout=current_app.config.get('ASK_API_READ_TIMEOUT', 5.0))
+            cache = UserCache(ttl=current_app.config.get('ASK_API_CACHE_TTL', 300),
+                              max_users=current_app.config.get('ASK_API_CACHE_SIZE', 1000))
+            self._api_client = AlexaAPIClient(pool, max_workers=current_app.config.get('ASK_API_WORKERS', 4),
+                                              cache=cache)
+        return self._api_client
+
+    @property
+    def call_cache(self):
+        if self._call_cache is None:
+            self._call_cache = CallCache(max_size=current_app.config.get('ASK_CALL_CACHE_SIZE', 1000),
+                                         max_workers=current_app.config.get('ASK_CALL_CACHE_WORKERS', 4))
+        return self._call_cache
+
+    @property
+    def task_queue(self):
+        if self._task_queue is None:
+            self._task_queue = TaskQueue(max_workers=current_app.config.get('ASK_AFTER_RESPONSE_WORKERS', 4),
+                                         max_queued=current_app.config.get('ASK_AFTER_RESPONSE_QUEUE_SIZE', 100),
+                                         overflow=current_app.config.get('ASK_AFTER_RESPONSE_OVERFLOW', 'run'))
+            # queued work is finished before the interpreter exits, unless it takes longer than this
+            atexit.register(self._task_queue.close, current_app.config.get('ASK_AFTER_RESPONSE_EXIT_WAIT', 10))
+        return self._task_queue
+
+    @property
+    def alexa_api(self):
+        """The Alexa service APIs for the current request, as an api.RequestAPI.
+
+        Calls go to the request's context.System.apiEndpoint with its apiAccessToken, and results are
+        cached per user and locale. Raises ValueError if the request carries no endpoint or token.
+        """
+        system = getattr(self.context, 'System', None) or {}
+        endpoint = system.get('apiEndpoint')
+        token = system.get('apiAccessToken')
+        if not endpoint or not token:
+            raise ValueError('The request has no API endpoint or access token')
+        return RequestAPI(self.api_client, endpoint, token,
+                          user_id=(system.get('user') or {}).get('userId'),
+                          device_id=(system.get('device') or {}).get('deviceId'),
+                          locale=getattr(self.request, 'locale', None))
+
+    @property
+    def json_codec(self):
+        if self._json_codec is None:
+            self._json_codec = codec.get_codec(current_app.config.get('ASK_JSON_CODEC', 'json'))
+        return self._json_codec
+
+    @property
+    def chain_validator(self):
+        if self._chain_validator is None and current_app.config.get('ASK_VERIFY_CERT_CHAIN', True):
+            # a missing trust store is reported once, instead of being looked for on every request
+            if self._trust_store_error is None:
+                try:
+                    trusted = verifier.load_trust_store(current_app.config.get('ASK_CERT_TRUST_STORE', None))
+                except (verifier.VerificationError, IOError, OSError) as e:
+                    self._trust_store_error = str(e)
+                    logger.error('Certificate chains cannot be validated, so every request will be rejected: '
+                                 '{}'.format(e))
+                else:
+                    self._chain_validator = verifier.ChainValidator(trusted)
+            if self._trust_store_error is not None:
+                raise verifier.VerificationError(self._trust_store_error)
+        return self._chain_validator
+
+    def verification_check(self, f):
+        """Decorator registers an extra check run on every request before its signature is verified.
+
+        Checks are given the parsed request payload and run after the application ID and timestamp
+        checks, but before the signing certificate is loaded, so cheap rejections never cost a
+        certificate lookup or an RSA verification. A check rejects the request by raising
+        verifier.VerificationError.
+
+        @ask.verification_check
+        def known_locale(payload):
+            if payload['request'].get('locale') not in ('en-US', 'en-GB'):
+                raise VerificationError('Unsupported locale')
+
+        Per-check timings and rejection counts are reported in Ask.verification_stats under the
+        function's name.
+
+        Arguments:
+            f {function} -- function taking the request payload dict
+        """
+        self._verification_checks.append((f.__name__, lambda verification: f(verification.payload)))
+        return f
+
     def on_session_started(self, f):
         """Decorator to call wrapped function upon starting a session.
 
@@ -189,6 +692,86 @@ class Ask(object):
         """
         self._on_session_started_callback = f
 
+    def before_verify(self, f):
+        """Decorator registers a function called before each request is verified.
+
+        @ask.before_verify
+        def throttle():
+            if rate_limiter.exceeded(flask_request.remote_addr):
+                return 'Too Many Requests', 429
+
+        The function takes no arguments. In the Flask view it runs before the request body is parsed;
+        behind a SkillRouter it runs once the body has been parsed to find the skill. If it returns
+        anything but None, that is returned as the Flask response and the request goes no further.
+        It is not called by AskASGI or run_aws_lambda_direct. Hooks may be async, run in the order
+        they were registered, and each is timed in ask.hook_stats.
+
+        Arguments:
+            f {function} -- hook function
+        """
+        self._hooks['before_verify'].append(f)
+        return f
+
+    def after_parse(self, f):
+        """Decorator registers a function called with each request's payload once it has been parsed
+        and verified, before the response cache is consulted.
+
+        @ask.after_parse
+        def check_account(payload):
+            if payload['context']['System']['user'].get('accessToken') is None:
+                return 'Unauthorized', 401
+
+        The function may change the payload dict. If it returns anything but None, that is returned
+        as the Flask response, or converted to the response dict by run_aws_lambda_direct, and the
+        request is not dispatched. Hooks may be async, run in the order they were registered, and each
+        is timed in ask.hook_stats.
+
+        Arguments:
+            f {function} -- hook function, called with the payload dict
+        """
+        self._hooks['after_parse'].append(f)
+        return f
+
+    def before_dispatch(self, f):
+        """Decorator registers a function called before each request is handed to its view function.
+
+        @ask.before_dispatch
+        def require_subscription():
+            if not is_subscribed(session.user.userId):
+                return statement(render_template('subscribe_first'))
+
+        request, session and context are set up when it runs, and @ask.on_session_started has been
+        called. If it returns anything but None, that is used as the view function's result and the
+        view function is not called. Hooks may be async, run in the order they were registered, and
+        each is timed in ask.hook_stats.
+
+        Arguments:
+            f {function} -- hook function
+        """
+        self._hooks['before_dispatch'].append(f)
+        return f
+
+    def after_render(self, f):
+        """Decorator registers a function called with each response once it has been rendered.
+
+        @ask.after_render
+        def add_header(response):
+            response = current_app.make_response(response)
+            response.headers['X-Skill-Version'] = SKILL_VERSION
+            return response
+
+        The function receives what is about to be returned: the rendered JSON body or whatever the
+        view function returned for the Flask view, and the response dict for run_aws_lambda_direct.
+        If it returns anything but None, that replaces the response. It also runs for responses
+        served from the response cache. Hooks may be async, run in the order they were registered, and
+        each is timed in ask.hook_stats.
+
+        Arguments:
+            f {function} -- hook function, called with the response
+        """
+        self._hooks['after_render'].append(f)
+        return f
+
     def launch(self, f):
         """Decorator maps a view function as the endpoint for an Alexa LaunchRequest and starts the skill.
 
@@ -231,7 +814,7 @@ class Ask(object):
             self._flask_view_func(*args, **kw)
         return f
 
-    def intent(self, intent_name, mapping={}, convert={}, default={}):
+    def intent(self, intent_name, mapping={}, convert={}, default={}, deadline=None, fallback=None):
         """Decorator routes an Alexa IntentRequest and provides the slot parameters to the wrapped function.
 
         Functions decorated as an intent are registered as the view function for the Intent's URL,
@@ -241,6 +824,9 @@ class Ask(object):
         def weather(city):
             return statement('I predict great weather for {}'.format(city))
 
+        Keyword-only parameters are supplied by keyword. A function that accepts **kwargs also receives
+        every slot not bound to a named parameter.
+
         Arguments:
             intent_name {str} -- Name of the intent request to be mapped to the decorated function
 
@@ -254,12 +840,21 @@ class Ask(object):
             default {dict} --  Provides default values for Intent slots if Alexa reuqest
                 returns no corresponding slot, or a slot with an empty value
                 default: {}
+
+            deadline {float} -- Seconds this intent may take, overriding ASK_HANDLER_DEADLINE
+                default: {None}
+
+            fallback {response, str or function} -- Answer given when the deadline is exceeded: a response
+                such as statement(...), speech text for a statement, or a function returning a response.
+                Overrides the @ask.deadline_fallback function
+                default: {None}
         """
         def decorator(f):
-            self._intent_view_funcs[intent_name] = f
-            self._intent_mappings[intent_name] = mapping
-            self._intent_converts[intent_name] = convert
-            self._intent_defaults[intent_name] = default
+            self._register_view(intent_name, f, mapping, convert, default)
+            if deadline is not None:
+                self._intent_deadlines[intent_name] = deadline
+            if fallback is not None:
+                self._intent_fallbacks[intent_name] = fallback
 
             @wraps(f)
             def wrapper(*args, **kw):
@@ -267,9 +862,62 @@ class Ask(object):
             return f
         return decorator
 
+    def cached(self, ttl=60, key=None, stale_ttl=0):
+        """Decorator caches the results of a helper function that calls an external service.
+
+        Results are kept per arguments and request locale in the call cache. Concurrent calls with
+        the same arguments while there is no result make a single call. With stale_ttl, an expired
+        result keeps being returned for that many more seconds while one call refreshes it in the
+        background, so the upstream's latency only reaches requests that find nothing cached.
+
+        @ask.cached(ttl=600, stale_ttl=3600)
+        def get_tide_predictions(station, date):
+            return json.loads(urlopen(tide_url(station, date)).read())['predictions']
+
+        The function must be called while an app context is pushed, as view functions are. Refreshes
+        run in a copy of the request's context, and results are shared between requests, so they
+        should not be modified.
+
+        Keyword Arguments:
+            ttl {int} -- seconds a result is fresh (default: {60})
+            key {function} -- called with the function's arguments, returns the hashable cache key
+                (default: {None, the positional and keyword arguments})
+            stale_ttl {int} -- seconds an expired result is served while it is refreshed (default: {0})
+        """
+        def decorator(f):
+            name = '{}.{}'.format(f.__module__, getattr(f, '__qualname__', f.__name__))
+
+            @wraps(f)
+            def wrapper(*args, **kwargs):
+                call_key = key(*args, **kwargs) if key is not None else (args, sorted(kwargs.items()))
+                locale = getattr(_current_state().request, 'locale', None)
+                return self.call_cache.get((name, locale, call_key), partial(f, *args, **kwargs), ttl, stale_ttl,
+                                           make_refresh=partial(_refresh_in_context, f, args, kwargs))
+            return wrapper
+        return decorator
+
+    def deadline_fallback(self, f):
+        """Decorator registers the function that answers requests whose view function ran past its deadline.
+
+        @ask.deadline_fallback
+        def too_slow():
+            return question(render_template('still_working'))
+
+        The function is called in place of the view function, which keeps running in the background
+        but whose result is discarded. Intents registered with a fallback of their own use that instead.
+        The response is sent with the session attributes as they were before the view function started,
+        so changes made to session.attributes by either function are not kept.
+
+        Arguments:
+            f {function} -- fallback view function
+        """
+        self._deadline_fallback_func = f
+        return f
+
     def default_intent(self, f):
         """Decorator routes any Alexa IntentRequest that is not matched by any existing @ask.intent routing."""
         self._default_intent_view_func = f
+        self._default_intent_binder = _ViewBinder(f)
 
         @wraps(f)
         def wrapper(*args, **kw):
@@ -317,10 +965,7 @@ class Ask(object):
             
         """
         def decorator(f):
-            self._intent_view_funcs['Connections.Response'] = f
-            self._intent_mappings['Connections.Response'] = mapping
-            self._intent_converts['Connections.Response'] = convert
-            self._intent_defaults['Connections.Response'] = default
+            self._register_view('Connections.Response', f, mapping, convert, default)
             @wraps(f)
             def wrapper(*args, **kwargs):
                 self._flask_view_func(*args, **kwargs)
@@ -350,10 +995,7 @@ class Ask(object):
             logger.info('Current position within the stream is {} ms'.format(offset))
         """
         def decorator(f):
-            self._intent_view_funcs['AudioPlayer.PlaybackStarted'] = f
-            self._intent_mappings['AudioPlayer.PlaybackStarted'] = mapping
-            self._intent_converts['AudioPlayer.PlaybackStarted'] = convert
-            self._intent_defaults['AudioPlayer.PlaybackStarted'] = default
+            self._register_view('AudioPlayer.PlaybackStarted', f, mapping, convert, default)
 
             @wraps(f)
             def wrapper(*args, **kwargs):
@@ -381,10 +1023,7 @@ class Ask(object):
         Audioplayer Requests do not include the stream URL, it must be accessed from current_stream.url
         """
         def decorator(f):
-            self._intent_view_funcs['AudioPlayer.PlaybackFinished'] = f
-            self._intent_mappings['AudioPlayer.PlaybackFinished'] = mapping
-            self._intent_converts['AudioPlayer.PlaybackFinished'] = convert
-            self._intent_defaults['AudioPlayer.PlaybackFinished'] = default
+            self._register_view('AudioPlayer.PlaybackFinished', f, mapping, convert, default)
 
             @wraps(f)
             def wrapper(*args, **kwargs):
@@ -419,10 +1058,7 @@ class Ask(object):
         Audioplayer Requests do not include the stream URL, it must be accessed from current_stream.url
         """
         def decorator(f):
-            self._intent_view_funcs['AudioPlayer.PlaybackStopped'] = f
-            self._intent_mappings['AudioPlayer.PlaybackStopped'] = mapping
-            self._intent_converts['AudioPlayer.PlaybackStopped'] = convert
-            self._intent_defaults['AudioPlayer.PlaybackStopped'] = default
+            self._register_view('AudioPlayer.PlaybackStopped', f, mapping, convert, default)
 
             @wraps(f)
             def wrapper(*args, **kwargs):
@@ -474,10 +1110,7 @@ class Ask(object):
             _infodump('Stream holds the token {}'.format(stream_token))
         """
         def decorator(f):
-            self._intent_view_funcs['AudioPlayer.PlaybackNearlyFinished'] = f
-            self._intent_mappings['AudioPlayer.PlaybackNearlyFinished'] = mapping
-            self._intent_converts['AudioPlayer.PlaybackNearlyFinished'] = convert
-            self._intent_defaults['AudioPlayer.PlaybackNearlyFinished'] = default
+            self._register_view('AudioPlayer.PlaybackNearlyFinished', f, mapping, convert, default)
 
             @wraps(f)
             def wrapper(*args, **kwargs):
@@ -511,10 +1144,7 @@ class Ask(object):
                     playerActivity - player state when the error occurred
         """
         def decorator(f):
-            self._intent_view_funcs['AudioPlayer.PlaybackFailed'] = f
-            self._intent_mappings['AudioPlayer.PlaybackFailed'] = mapping
-            self._intent_converts['AudioPlayer.PlaybackFailed'] = convert
-            self._intent_defaults['AudioPlayer.PlaybackFailed'] = default
+            self._register_view('AudioPlayer.PlaybackFailed', f, mapping, convert, default)
 
             @wraps(f)
             def wrapper(*args, **kwargs):
@@ -522,45 +1152,91 @@ class Ask(object):
             return f
         return decorator
 
+    def on_request(self, request_type, mapping={}, convert={}, default={}):
+        """Decorator routes any Alexa request type to the wrapped function.
+
+        request_type is either an exact type, or a dotted prefix ending in '.*' that matches every
+        type under it. Exact types take precedence over prefixes, and longer prefixes over shorter
+        ones. Registering a type that Ask already handles, such as 'LaunchRequest', replaces the
+        built-in routing for it.
+
+        The wrapped view function may accept parameters from the request, bound the same way as
+        for intent and on_playback functions: slots if the request carries an intent, otherwise
+        the request's own fields.
+
+        @ask.on_request('CanFulfillIntentRequest')
+        def can_fulfill(city):
+            answer = 'YES' if city in known_cities else 'NO'
+            return json.dumps({'version': '1.0', 'response': {'canFulfillIntent': {'canFulfill': answer}}})
+
+        @ask.on_request('AlexaSkillEvent.*')
+        def skill_event(type, body):
+            logger.info('{} received'.format(type))
+            return "{}", 200
+
+        Per-type call counts and timings are reported in Ask.request_stats.
+
+        Arguments:
+            request_type {str} -- Alexa request type, or a prefix such as 'AlexaSkillEvent.*'
+
+        Keyword Arguments:
+            mapping {dict} -- Maps parameters to request fields of a different name
+                default: {}
+
+            convert {dict} -- Converts request values to data types before assignment to parameters
+                default: {}
+
+            default {dict} --  Provides default values for parameters missing from the request
+                default: {}
+        """
+        def decorator(f):
+            binder = _ViewBinder(f, mapping, convert, default)
+            self._add_request_handler(request_type, partial(self._call_view, binder))
+            return f
+        return decorator
+
     @property
     def request(self):
-        return getattr(_app_ctx_stack.top, '_ask_request', None)
+        return _current_state().request
 
     @request.setter
     def request(self, value):
-        _app_ctx_stack.top._ask_request = value
+        _current_state().request = value
 
     @property
     def session(self):
-        return getattr(_app_ctx_stack.top, '_ask_session', models._Field())
+        session = _current_state().session
+        if session is None:
+            return models._Field()
+        return session
 
     @session.setter
     def session(self, value):
-        _app_ctx_stack.top._ask_session = value
+        _current_state().session = value
 
     @property
     def version(self):
-        return getattr(_app_ctx_stack.top, '_ask_version', None)
+        return _current_state().version
 
     @version.setter
     def version(self, value):
-        _app_ctx_stack.top._ask_version = value
+        _current_state().version = value
 
     @property
     def context(self):
-        return getattr(_app_ctx_stack.top, '_ask_context', None)
+        return _current_state().context
 
     @context.setter
     def context(self, value):
-        _app_ctx_stack.top._ask_context = value
+        _current_state().context = value
 
     @property
     def convert_errors(self):
-        return getattr(_app_ctx_stack.top, '_ask_convert_errors', None)
+        return _current_state().convert_errors
 
     @convert_errors.setter
     def convert_errors(self, value):
-        _app_ctx_stack.top._ask_convert_errors = value
+        _current_state().convert_errors = value
 
     @property
     def current_stream(self):
@@ -640,16 +1316,12 @@ class Ask(object):
 
         # Convert the event provided by the AWS Lambda handler to a JSON
         # string that can be read as the body of a HTTP POST request.
-        body = json.dumps(event)
+        with self.app.app_context():
+            json_codec = self.json_codec
+        body = json_codec.dumps(event)
         environ['CONTENT_TYPE'] = 'application/json'
         environ['CONTENT_LENGTH'] = len(body)
-        
-        PY3 = sys.version_info[0] == 3
-        
-        if PY3:
-            environ['wsgi.input'] = io.StringIO(body)
-        else:
-            environ['wsgi.input'] = io.BytesIO(body)
+        environ['wsgi.input'] = io.BytesIO(body)
 
         # Start response is a required callback that must be passed when
         # the application is invoked. It is used to set HTTP status and
@@ -674,7 +1346,7 @@ class Ask(object):
             # The Lambda handler expects a Python object that can be
             # serialized as JSON, so we need to take the already serialized
             # JSON and deserialize it.
-            return json.loads(output)
+            return json_codec.loads(output)
 
         finally:
             # Per the WSGI spec, we need to invoke the close method if it
@@ -682,6 +1354,63 @@ class Ask(object):
             if hasattr(result, 'close'):
                 result.close()
 
+    def run_aws_lambda_direct(self, event):
+        """Invoke the Flask Ask application from an AWS Lambda function handler
+        without going through WSGI.
+
+        Works like run_aws_lambda, but the event dict is handed straight to the
+        Ask dispatcher inside an application context and the response is
+        returned as a dict. The event is never serialized to a request body,
+        no WSGI environ is built, and the response is not rendered to JSON and
+        parsed back.
+
+        Because there is no HTTP request, Flask's request context, before_request
+        and after_request hooks are not run; app context teardown functions are.
+        Requests are not verified, as with run_aws_lambda, so before_verify hooks are
+        not run either. Session attribute values must be JSON serializable unless
+        session.attributes_encoder is set.
+
+        Example usage:
+
+            def lambda_handler(event, _context):
+                return ask.run_aws_lambda_direct(event)
+        """
+        with self.app.app_context():
+            dbgdump(event)
+            result = self._run_hooks('after_parse', event)
+            if result is None:
+                response = self._render_dict(event)
+            else:
+                response = self._convert_result(result)
+            response = self._run_after_render(response)
+            self._queue_after_response()
+            return response
+
+    def _render_dict(self, event):
+        response_cache = self.response_cache
+        request_id = event.get('request', {}).get('requestId')
+        if response_cache is not None and request_id:
+            cached = response_cache.get(request_id)
+            if cached is not None:
+                return self.json_codec.loads(cached)
+
+        result = self._dispatch(event)
+        if isinstance(result, models._Response):
+            response = result.render_dict()
+            if response_cache is not None and request_id:
+                response_cache.set(request_id, self.json_codec.dumps(response))
+            return response
+        return self._convert_result(result)
+
+    def _convert_result(self, result):
+        # anything but a response object goes through Flask's usual conversion
+        if result is None:
+            result = "", 400
+        output = self.app.make_response(result)
+        if output.status_code // 100 != 2:
+            raise AssertionError("Non-2xx from app: status={}, body={}".format(output.status, output.data))
+        return self.json_codec.loads(output.data)
+
 
     def _get_user(self):
         if self.context:
@@ -691,34 +1420,63 @@ class Ask(object):
 
     def _alexa_request(self, verify=True):
         raw_body = flask_request.data
-        alexa_request_payload = json.loads(raw_body)
+        alexa_request_payload = self.json_codec.loads(raw_body)
 
         if verify:
-            cert_url = flask_request.headers['Signaturecertchainurl']
-            signature = flask_request.headers['Signature']
+            self._verify_request(alexa_request_payload, raw_body, flask_request.headers)
 
-            # load certificate - this verifies a the certificate url and format under the hood
-            cert = verifier.load_certificate(cert_url)
-            # verify signature
-            verifier.verify_signature(cert, signature, raw_body)
-
-            # verify timestamp
-            raw_timestamp = alexa_request_payload.get('request', {}).get('timestamp')
-            timestamp = self._parse_timestamp(raw_timestamp)
+        return alexa_request_payload
 
-            if not current_app.debug or self.ask_verify_timestamp_debug:
-                verifier.verify_timestamp(timestamp)
+    def _verify_request(self, payload, raw_body, headers):
+        """Runs the verification stages in order, cheapest first, timing each one.
 
-            # verify application id
-            try:
-                application_id = alexa_request_payload['session']['application']['applicationId']
-            except KeyError:
-                application_id = alexa_request_payload['context'][
-                    'System']['application']['applicationId']
-            if self.ask_application_id is not None:
-                verifier.verify_application_id(application_id, self.ask_application_id)
-
-        return alexa_request_payload
+        The checks that only need the request JSON run before the signing certificate is loaded
+        and the signature is checked, so junk or replayed requests are rejected without any
+        network or crypto work. A stage rejects the request by raising VerificationError.
+        """
+        verification = _Verification(payload, raw_body, headers)
+        self._run_verification_stages(verification, self._payload_verification_stages())
+        self._run_verification_stages(verification, [('certificate', self._verify_certificate),
+                                                     ('signature', self._verify_signature)])
+
+    def _payload_verification_stages(self):
+        """The stages that only look at the request JSON."""
+        stages = [('application_id', self._verify_application_id),
+                  ('timestamp', self._verify_timestamp)]
+        stages.extend(self._verification_checks)
+        return stages
+
+    def _run_verification_stages(self, verification, stages):
+        for name, stage in stages:
+            with self.verification_stats.timed(name):
+                stage(verification)
+
+    def _verify_application_id(self, verification):
+        application_ids = self._application_ids()
+        if application_ids is None:
+            return
+        verifier.verify_application_id(_payload_application_id(verification.payload), application_ids)
+
+    def _verify_timestamp(self, verification):
+        raw_timestamp = verification.payload.get('request', {}).get('timestamp')
+        timestamp = self._parse_timestamp(raw_timestamp)
+
+        if not current_app.debug or self.ask_verify_timestamp_debug:
+            verifier.verify_timestamp(timestamp)
+
+    def _verify_certificate(self, verification):
+        cert_url = verification.headers['Signaturecertchainurl']
+        # load certificate - this verifies a the certificate url and format under the hood
+        verification.cert = verifier.load_certificate(cert_url, cache=self.cert_cache, fetcher=self.cert_fetcher,
+                                                      store=self.cert_store, chain_validator=self.chain_validator)
+
+    def _verify_signature(self, verification):
+        signature = verification.headers.get('Signature-256')
+        if signature:
+            verifier.verify_signature(verification.cert, signature, verification.raw_body, 'sha256')
+        else:
+            signature = verification.headers['Signature']
+            verifier.verify_signature(verification.cert, signature, verification.raw_body, 'sha1')
 
     @staticmethod
     def _parse_timestamp(timestamp):
@@ -727,7 +1485,7 @@ class Ask(object):
         """
         if timestamp:
             try:
-                return aniso8601.parse_datetime(timestamp)
+                return to_datetime(timestamp)
             except AttributeError:
                 # raised by aniso8601 if raw_timestamp is not valid string
                 # in ISO8601 format
@@ -764,8 +1522,62 @@ class Ask(object):
         return {}
 
     def _flask_view_func(self, *args, **kwargs):
+        # handler deadlines count from here, so time spent on verification is part of the budget
+        _begin_request(default_timer())
+        result = self._run_hooks('before_verify')
+        if result is not None:
+            return result
         ask_payload = self._alexa_request(verify=self.ask_verify_requests)
+        result = self._respond(ask_payload)
+        self._queue_after_response()
+        return result
+
+    def _respond(self, ask_payload):
+        """Answers a parsed and verified request payload, running the after_parse and after_render hooks."""
         dbgdump(ask_payload)
+        response = self._run_hooks('after_parse', ask_payload)
+        if response is None:
+            response = self._render(ask_payload)
+        return self._run_after_render(response)
+
+    def _render(self, ask_payload):
+        """Dispatches the payload and renders the result, from the response cache when possible."""
+        response_cache = self.response_cache
+        request_id = ask_payload.get('request', {}).get('requestId')
+        if response_cache is not None and request_id:
+            cached = response_cache.get(request_id)
+            if cached is not None:
+                return cached
+
+        result = self._dispatch(ask_payload)
+        if result is not None:
+            if isinstance(result, models._Response):
+                response = result.render_response()
+                if response_cache is not None and request_id:
+                    response_cache.set(request_id, response)
+                return response
+            return result
+        return "", 400
+
+    def _dispatch(self, ask_payload):
+        """Sets up the request state from a parsed payload and calls the matching view function.
+
+        Returns whatever the view function returned, or None if no view function handles the request.
+        """
+        state = _current_state()
+        state.ask = self
+        state.app = current_app._get_current_object()
+        if state.started is None:
+            state.started = default_timer()
+        if _state_var is None:
+            return self._dispatch_request(ask_payload)
+        token = _state_var.set(state)
+        try:
+            return self._dispatch_request(ask_payload)
+        finally:
+            _state_var.reset(token)
+
+    def _dispatch_request(self, ask_payload):
         request_body = models._Field(ask_payload)
 
         self.request = request_body.request
@@ -788,82 +1600,281 @@ class Ask(object):
 
         try:
             if self.session.new and self._on_session_started_callback is not None:
-                self._on_session_started_callback()
+                self._resolve(self._on_session_started_callback())
         except AttributeError:
             pass
 
-        result = None
+        result = self._run_hooks('before_dispatch')
+        if result is not None:
+            return result
+
         request_type = self.request.type
+        handler = self._find_request_handler(request_type)
+        if handler is None:
+            logger.warning('No handler registered for request type "%s"', request_type)
+            self.request_stats.record(request_type, rejected=True)
+            return None
+
+        view_name = request_type
+        if request_type == 'IntentRequest':
+            view_name = self.request.intent.name
+        deadline = self._intent_deadlines.get(view_name)
+        if deadline is None and request_type in _DEADLINE_REQUEST_TYPES:
+            deadline = self.ask_handler_deadline
 
-        if request_type == 'LaunchRequest' and self._launch_view_func:
-            result = self._launch_view_func()
-        elif request_type == 'SessionEndedRequest':
-            if self._session_ended_view_func:
-                result = self._session_ended_view_func()
+        result = None
+        start = default_timer()
+        try:
+            if deadline is None:
+                result = self._resolve(handler())
             else:
-                result = "{}", 200
-        elif request_type == 'IntentRequest' and self._intent_view_funcs:
-            result = self._map_intent_to_view_func(self.request.intent)()
-        elif request_type == 'Display.ElementSelected' and self._display_element_selected_func:
-            result = self._display_element_selected_func()
-        elif 'AudioPlayer' in request_type:
-            result = self._map_player_request_to_func(self.request.type)()
-            # routes to on_playback funcs
-            # user can also access state of content.AudioPlayer with current_stream
-        elif 'Connections.Response' in request_type:
-            result = self._map_purchase_request_to_func(self.request.type)()
+                result = self._call_with_deadline(handler, view_name, deadline)
+        finally:
+            self.request_stats.record(request_type, default_timer() - start, rejected=result is None)
+        return result
 
-        if result is not None:
-            if isinstance(result, models._Response):
-                return result.render_response()
-            return result
-        return "", 400
+    def _call_with_deadline(self, handler, view_name, deadline):
+        """Runs the view function on the deadline pool and answers with the fallback if it overruns.
+
+        The budget counts from when the request arrived. A view function that overruns cannot be
+        interrupted, so it keeps running on its pool thread and its result is discarded. The fallback
+        is rendered with the session attributes as they were before the view function started, since
+        the abandoned view function may still be changing them.
+        """
+        state = _current_state()
+        state.deadline_at = state.started + deadline
+        attributes = copy.deepcopy(state.session.attributes)
+        resolve = self._resolve
+        call = lambda: resolve(handler())
+        if has_request_context():
+            # pushed inside the app context below, so flask.request and flask.g both carry over
+            call = copy_current_request_context(call)
+        future = self.deadline_executor.submit(copy_ask_context(call))
+        try:
+            result = future.result(timeout=max(state.deadline_at - default_timer(), 0))
+        except FutureTimeoutError:
+            self.deadline_stats.record(view_name, default_timer() - state.started, rejected=True)
+            logger.warning('"{}" ran past its {}s deadline, answering with the fallback'.format(view_name, deadline))
+            return self._deadline_fallback(view_name, attributes)
+        self.deadline_stats.record(view_name, default_timer() - state.started)
+        return result
+
+    def _deadline_fallback(self, view_name, attributes):
+        fallback = self._intent_fallbacks.get(view_name, self._deadline_fallback_func)
+        if fallback is None:
+            fallback = current_app.config.get('ASK_DEADLINE_FALLBACK_TEXT', _DEFAULT_DEADLINE_FALLBACK_TEXT)
+        if isinstance(fallback, string_types):
+            result = models.statement(fallback)
+        elif callable(fallback):
+            result = self._resolve(fallback())
+        else:
+            result = fallback
+        if isinstance(result, models._Response):
+            result._session_attributes = attributes
+        return result
+
+    def progressive_response(self, speech):
+        """Sends speech to the user while the view function keeps working.
+
+        Posts a VoicePlayer.Speak directive for the current request to the Alexa directives API, using
+        the request's context.System.apiEndpoint and apiAccessToken. The call is made on the API
+        client's background pool, so this returns at once with a concurrent.futures.Future; failures
+        are logged rather than raised into the view function. speech may be plain text or SSML.
+
+        @ask.intent('FlightIntent')
+        def flights(city):
+            ask.progressive_response('Looking up flights to {}'.format(city))
+            return statement(search_flights(city))
+
+        Returns None, after logging a warning, if the request carries no API endpoint or token.
+        """
+        system = getattr(self.context, 'System', None) or {}
+        endpoint = system.get('apiEndpoint')
+        token = system.get('apiAccessToken')
+        if not endpoint or not token:
+            logger.warning('Progressive response skipped: the request has no API endpoint or access token')
+            return None
+
+        directive = {'type': 'VoicePlayer.Speak', 'speech': speech}
+        client = self.api_client
+        return client.submit(client.send_directive, endpoint, token, self.request.requestId, directive)
+
+    def after_response(self, func, *args, **kwargs):
+        """Runs func(*args, **kwargs) in the background once the response has been built.
+
+        Use it for work the user does not have to wait for, such as analytics or saving state:
+
+        @ask.intent('ScoreIntent')
+        def score(points):
+            ask.after_response(save_score, session.user.userId, points)
+            return statement('You scored {}'.format(points))
+
+        Functions are queued on ask.task_queue when the view, router, ASGI adapter or
+        run_aws_lambda_direct has the response, in the order they were passed, and run with this
+        request's request, session and context. Nothing runs if the request fails. Outside of a
+        request, or once the response has been built, for example from another after_response
+        function, func is queued at once. Failures are logged.
+
+        Lambda freezes the process once the handler returns, so with run_aws_lambda_direct the
+        functions may only finish during a later invocation.
+        """
+        state = _current_state()
+        if state.request is None:
+            self.task_queue.submit(func, *args, **kwargs)
+            return
+        if state.responded:
+            self.task_queue.submit(copy_ask_context(func), *args, **kwargs)
+            return
+        if state.after_response is None:
+            state.after_response = []
+        state.after_response.append((copy_ask_context(func), args, kwargs))
+
+    def _run_hooks(self, stage, *args):
+        """Calls the hooks registered for stage, stopping at the first that returns something."""
+        for hook in self._hooks[stage]:
+            result = self._run_hook(stage, hook, *args)
+            if result is not None:
+                return result
+        return None
+
+    def _run_after_render(self, response):
+        """Passes response through the after_render hooks, each of which may replace it."""
+        for hook in self._hooks['after_render']:
+            result = self._run_hook('after_render', hook, response)
+            if result is not None:
+                response = result
+        return response
+
+    def _run_hook(self, stage, hook, *args):
+        name = '{}.{}'.format(stage, getattr(hook, '__name__', 'hook'))
+        start = default_timer()
+        try:
+            result = self._resolve(hook(*args))
+        except BaseException:
+            self.hook_stats.record(name, default_timer() - start, rejected=True)
+            raise
+        # a result from any hook but after_render stops the request
+        rejected = result is not None and stage != 'after_render'
+        self.hook_stats.record(name, default_timer() - start, rejected=rejected)
+        return result
+
+    def _queue_after_response(self):
+        state = _current_state()
+        state.responded = True
+        tasks = state.after_response
+        if tasks:
+            state.after_response = None
+            for func, args, kwargs in tasks:
+                self.task_queue.submit(func, *args, **kwargs)
+
+    def remaining_time(self):
+        """Seconds left before the current request's deadline, or None if no deadline applies.
+
+        View functions can pass it as the timeout of their outbound calls:
+
+        @ask.intent('WeatherIntent', deadline=3)
+        def weather(city):
+            forecast = requests.get(FORECAST_URL, params={'city': city}, timeout=ask.remaining_time())
+        """
+        deadline_at = _current_state().deadline_at
+        if deadline_at is None:
+            return None
+        return max(deadline_at - default_timer(), 0.0)
+
+    @staticmethod
+    def _resolve(result):
+        """Awaits the coroutine returned by an async view function or hook on this thread's event loop."""
+        if aio.is_awaitable(result):
+            return aio.run_sync(result)
+        return result
+
+    def _find_request_handler(self, request_type):
+        """Looks up the handler for an exact request type, then for its dotted prefixes, longest first."""
+        handler = self._request_handlers.get(request_type)
+        if handler is None:
+            prefix = request_type
+            while handler is None and '.' in prefix:
+                prefix = prefix.rsplit('.', 1)[0]
+                handler = self._request_prefix_handlers.get(prefix)
+        return handler
+
+    def _add_request_handler(self, request_type, handler):
+        if request_type.endswith('.*'):
+            self._request_prefix_handlers[request_type[:-2]] = handler
+        else:
+            self._request_handlers[request_type] = handler
+
+    def _handle_launch(self):
+        if self._launch_view_func:
+            return self._launch_view_func()
+
+    def _handle_session_ended(self):
+        if self._session_ended_view_func:
+            return self._session_ended_view_func()
+        return "{}", 200
+
+    def _handle_intent(self):
+        if self._intent_view_funcs or self._default_intent_binder is not None:
+            return self._map_intent_to_view_func(self.request.intent)()
+
+    def _handle_display_element_selected(self):
+        if self._display_element_selected_func:
+            return self._display_element_selected_func()
+
+    def _handle_audio_player(self):
+        # routes to on_playback funcs
+        # user can also access state of content.AudioPlayer with current_stream
+        return self._map_player_request_to_func(self.request.type)()
+
+    def _handle_purchase(self):
+        # a completed purchase changes the user's entitlements, so cached products are stale
+        user_id = self._get_user()
+        if user_id is not None and self.api_client.cache is not None:
+            self.api_client.cache.invalidate(user_id, IN_SKILL_PRODUCTS_PATH)
+        return self._map_purchase_request_to_func(self.request.type)()
+
+    def _register_view(self, view_name, f, mapping, convert, default):
+        """Registers a view function and compiles the binder that supplies its arguments."""
+        self._intent_view_funcs[view_name] = f
+        self._intent_mappings[view_name] = mapping
+        self._intent_converts[view_name] = convert
+        self._intent_defaults[view_name] = default
+        self._view_binders[view_name] = _ViewBinder(f, mapping, convert, default)
 
     def _map_intent_to_view_func(self, intent):
         """Provides appropiate parameters to the intent functions."""
-        if intent.name in self._intent_view_funcs:
-            view_func = self._intent_view_funcs[intent.name]
-        elif self._default_intent_view_func is not None:
-            view_func = self._default_intent_view_func
+        if intent.name in self._view_binders:
+            binder = self._view_binders[intent.name]
+        elif self._default_intent_binder is not None:
+            binder = self._default_intent_binder
         else:
             raise NotImplementedError('Intent "{}" not found and no default intent specified.'.format(intent.name))
 
-        PY3 = sys.version_info[0] == 3
-        if PY3:
-            argspec = inspect.getfullargspec(view_func)
-        else:
-            argspec = inspect.getargspec(view_func)
-            
-        arg_names = argspec.args
-        arg_values = self._map_params_to_view_args(intent.name, arg_names)
-
-        return partial(view_func, *arg_values)
+        return self._bind(binder)
 
     def _map_player_request_to_func(self, player_request_type):
         """Provides appropriate parameters to the on_playback functions."""
         # calbacks for on_playback requests are optional
-        view_func = self._intent_view_funcs.get(player_request_type, lambda: None)
-
-        argspec = inspect.getargspec(view_func)
-        arg_names = argspec.args
-        arg_values = self._map_params_to_view_args(player_request_type, arg_names)
-
-        return partial(view_func, *arg_values)
+        binder = self._view_binders.get(player_request_type, _noop_binder)
+        return self._bind(binder)
 
     def _map_purchase_request_to_func(self, purchase_request_type):
         """Provides appropriate parameters to the on_purchase functions."""
-        
-        if purchase_request_type in self._intent_view_funcs:
-            view_func = self._intent_view_funcs[purchase_request_type]
+
+        if purchase_request_type in self._view_binders:
+            binder = self._view_binders[purchase_request_type]
         else:
-            raise NotImplementedError('Request type "{}" not found and no default view specified.'.format(purchase_request_type)) 
+            raise NotImplementedError('Request type "{}" not found and no default view specified.'.format(purchase_request_type))
 
-        argspec = inspect.getargspec(view_func)
-        arg_names = argspec.args
-        arg_values = self._map_params_to_view_args(purchase_request_type, arg_names)
+        return self._bind(binder)
 
-        print('_map_purchase_request_to_func', arg_names, arg_values, view_func, purchase_request_type)
-        return partial(view_func, *arg_values)
+    def _call_view(self, binder):
+        return self._bind(binder)()
+
+    def _bind(self, binder):
+        args, kwargs, convert_errors = binder.bind(self._request_data())
+        self.convert_errors = convert_errors
+        return partial(binder.view_func, *args, **kwargs)
 
     def _get_slot_value(self, slot_object):
         slot_name = slot_object.name
@@ -881,15 +1892,8 @@ class Ask(object):
 
         return slot_value
 
-    def _map_params_to_view_args(self, view_name, arg_names):
-
-        arg_values = []
-        convert = self._intent_converts.get(view_name)
-        default = self._intent_defaults.get(view_name)
-        mapping = self._intent_mappings.get(view_name)
-
-        convert_errors = {}
-
+    def _request_data(self):
+        """Returns the values view arguments are bound from: the intent's slots, or the request's parameters."""
         request_data = {}
         intent = getattr(self.request, 'intent', None)
         if intent is not None:
@@ -901,30 +1905,122 @@ class Ask(object):
         else:
             for param_name in self.request:
                 request_data[param_name] = getattr(self.request, param_name, None)
+        return request_data
 
-        for arg_name in arg_names:
-            param_or_slot = mapping.get(arg_name, arg_name)
-            arg_value = request_data.get(param_or_slot)
-            if arg_value is None or arg_value == "":
-                if arg_name in default:
-                    default_value = default[arg_name]
-                    if isinstance(default_value, collections.Callable):
-                        default_value = default_value()
-                    arg_value = default_value
-            elif arg_name in convert:
-                shorthand_or_function = convert[arg_name]
-                if shorthand_or_function in _converters:
-                    shorthand = shorthand_or_function
-                    convert_func = _converters[shorthand]
-                else:
-                    convert_func = shorthand_or_function
-                try:
-                    arg_value = convert_func(arg_value)
-                except Exception as e:
-                    convert_errors[arg_name] = e
-            arg_values.append(arg_value)
-        self.convert_errors = convert_errors
-        return arg_values
+
+class _ViewBinder(object):
+    """Supplies a view function's arguments from request data.
+
+    The view's signature and its mapping, convert and default dicts are resolved once, when the
+    view is registered, into tuples of (argument name, request key, converter, default), so binding
+    a request only walks those tuples. Keyword-only arguments are passed by keyword. If the view
+    accepts **kwargs, it also receives the names that appear only in mapping, convert or default,
+    and every request value not bound to a named argument.
+    """
+
+    def __init__(self, view_func, mapping=None, convert=None, default=None):
+        mapping = mapping or {}
+        convert = convert or {}
+        default = default or {}
+        self.view_func = view_func
+
+        if sys.version_info[0] == 3:
+            argspec = inspect.getfullargspec(view_func)
+            kwonly_names = argspec.kwonlyargs
+            varkw = argspec.varkw
+        else:
+            argspec = inspect.getargspec(view_func)
+            kwonly_names = []
+            varkw = argspec.keywords
+
+        self.positional = tuple(self._compile(name, mapping, convert, default) for name in argspec.args)
+        keyword_names = list(kwonly_names)
+        if varkw is not None:
+            keyword_names.extend(name for name in sorted(set(mapping) | set(convert) | set(default))
+                                 if name not in argspec.args and name not in kwonly_names)
+        self.keyword = tuple(self._compile(name, mapping, convert, default) for name in keyword_names)
+
+        self.accepts_extra = varkw is not None
+        # request keys already bound, and argument names, are never passed again through **kwargs
+        self.reserved = frozenset(key for _, key, _, _ in self.positional + self.keyword) | \
+            frozenset(name for name, _, _, _ in self.positional + self.keyword)
+
+    @staticmethod
+    def _compile(name, mapping, convert, default):
+        converter = None
+        if name in convert:
+            shorthand_or_function = convert[name]
+            if shorthand_or_function in _converters:
+                converter = _converters[shorthand_or_function]
+            else:
+                converter = shorthand_or_function
+
+        default_factory = None
+        if name in default:
+            default_value = default[name]
+            default_factory = default_value if callable(default_value) else (lambda: default_value)
+
+        return name, mapping.get(name, name), converter, default_factory
+
+    def bind(self, request_data):
+        """
+        :param request_data: dict of slot or request parameter values
+        :return: (args, kwargs, convert_errors) for the view function
+        """
+        convert_errors = {}
+        get = request_data.get
+
+        args = []
+        for name, key, converter, default_factory in self.positional:
+            args.append(self._value(name, get(key), converter, default_factory, convert_errors))
+
+        kwargs = {}
+        for name, key, converter, default_factory in self.keyword:
+            kwargs[name] = self._value(name, get(key), converter, default_factory, convert_errors)
+
+        if self.accepts_extra:
+            for key, value in request_data.items():
+                if key not in self.reserved:
+                    kwargs[key] = value
+
+        return args, kwargs, convert_errors
+
+    @staticmethod
+    def _value(name, value, converter, default_factory, convert_errors):
+        if value is None or value == "":
+            if default_factory is not None:
+                return default_factory()
+        elif converter is not None:
+            try:
+                return converter(value)
+            except Exception as e:
+                convert_errors[name] = e
+        return value
+
+
+_noop_binder = _ViewBinder(lambda: None)
+
+
+def _payload_application_id(payload):
+    """Returns the applicationId a request payload was sent for, or None if the payload does not say."""
+    try:
+        return payload['session']['application']['applicationId']
+    except KeyError:
+        pass
+    try:
+        return payload['context']['System']['application']['applicationId']
+    except KeyError:
+        return None
+
+
+class _Verification(object):
+    """State handed between the request verification stages."""
+
+    def __init__(self, payload, raw_body, headers):
+        self.payload = payload
+        self.raw_body = raw_body
+        self.headers = headers
+        self.cert = None
 
 
 class YamlLoader(BaseLoader):
@@ -1,9 +1,12 @@
 import inspect
-from flask import json
+import logging
+import threading
+from flask import current_app
 from xml.etree import ElementTree
-import aniso8601
-from .core import session, context, current_stream, stream_cache, dbgdump
+from . import logger
+from .core import session, context, current_stream, stream_cache, dbgdump, find_ask
 from .cache import push_stream
+from .convert import to_datetime
 import uuid
 
 
@@ -14,7 +17,10 @@ class _Field(dict):
     to be accessed via dot notation or as a dict key-value.
 
     Parameters within the request_json that contain their data as a json object
-    are also represented as a _Field object.
+    are also represented as a _Field object. They are wrapped the first time
+    they are accessed rather than up front, and the wrapper replaces the raw
+    dict so later accesses return the same object. Handlers typically read a
+    handful of fields, so most of the envelope is never walked.
 
     Example:
 
@@ -28,23 +34,63 @@ class _Field(dict):
 
     def __init__(self, request_json={}):
         super(_Field, self).__init__(request_json)
-        for key, value in request_json.items():
-            if isinstance(value, dict):
-                value = _Field(value)
-            self[key] = value
+
+    def __getitem__(self, key):
+        value = dict.__getitem__(self, key)
+        if _needs_wrapping(value):
+            # threads reading the same field for the first time must all get the same wrapper
+            with _wrap_lock:
+                value = dict.__getitem__(self, key)
+                if _needs_wrapping(value):
+                    value = _Field(value)
+                    dict.__setitem__(self, key, value)
+        return value
+
+    def get(self, key, default=None):
+        if key in self:
+            return self[key]
+        return default
+
+    def pop(self, key, *default):
+        value = dict.pop(self, key, *default)
+        return _Field(value) if _needs_wrapping(value) else value
+
+    def popitem(self):
+        key, value = dict.popitem(self)
+        return key, _Field(value) if _needs_wrapping(value) else value
+
+    def setdefault(self, key, default=None):
+        dict.setdefault(self, key, default)
+        return self[key]
+
+    def values(self):
+        return [self[key] for key in self]
+
+    def items(self):
+        return [(key, self[key]) for key in self]
 
     def __getattr__(self, attr):
         # converts timestamp str to datetime.datetime object
         if 'timestamp' in attr:
-            return aniso8601.parse_datetime(self.get(attr))
+            return to_datetime(self.get(attr))
         return self.get(attr)
 
     def __setattr__(self, key, value):
         self.__setitem__(key, value)
 
 
+_wrap_lock = threading.Lock()
+
+
+def _needs_wrapping(value):
+    return isinstance(value, dict) and not isinstance(value, _Field)
+
+
 class _Response(object):
 
+    # rendered instead of session.attributes when set, e.g. for deadline fallbacks
+    _session_attributes = None
+
     def __init__(self, speech):
         self._json_default = None
         self._response = {
@@ -165,21 +211,45 @@ class _Response(object):
         self._response['card'] = card
         return self
 
-    def render_response(self):
-        response_wrapper = {
+    def _response_wrapper(self):
+        attributes = self._session_attributes
+        return {
             'version': '1.0',
             'response': self._response,
-            'sessionAttributes': session.attributes
+            'sessionAttributes': session.attributes if attributes is None else attributes
         }
-        
+
+    def render_response(self):
+        response_wrapper = self._response_wrapper()
+
         kw = {}
         if hasattr(session, 'attributes_encoder'):
             json_encoder = session.attributes_encoder
             kwargname = 'cls' if inspect.isclass(json_encoder) else 'default'
             kw[kwargname] = json_encoder
-        dbgdump(response_wrapper, **kw)
 
-        return json.dumps(response_wrapper, **kw)
+        body = find_ask().json_codec.dumps(response_wrapper, **kw)
+        if logger.isEnabledFor(logging.DEBUG):
+            if current_app.config.get('ASK_PRETTY_DEBUG_LOGS', False):
+                dbgdump(response_wrapper, **kw)
+            else:
+                logger.debug(body.decode('utf-8'))
+        return body
+
+    def render_dict(self):
+        """Returns the response envelope as a dict instead of JSON bytes.
+
+        Session attributes are passed through as they are, so they must be JSON
+        serializable by the caller. When session.attributes_encoder is set the
+        envelope is rendered with it and parsed back, since only the encoder
+        knows how to represent those values.
+        """
+        if hasattr(session, 'attributes_encoder'):
+            return find_ask().json_codec.loads(self.render_response())
+
+        response_wrapper = self._response_wrapper()
+        dbgdump(response_wrapper)
+        return response_wrapper
 
 
 class statement(_Response):
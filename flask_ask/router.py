@@ -0,0 +1,203 @@
+"""
+Hosting several skills in one Flask app
+"""
+from timeit import default_timer
+
+from flask import current_app, request as flask_request, _app_ctx_stack
+from flask.templating import Environment
+from jinja2 import BaseLoader, ChoiceLoader, TemplateNotFound
+from six import string_types
+
+from . import codec
+from .core import YamlLoader, find_ask, _begin_request, _payload_application_id
+from .verifier import VerificationError
+
+
+class SkillRouter(object):
+    """Serves several skills from one route, routing each request to the Ask instance registered
+    for its applicationId.
+
+    Skills are indexed by applicationId in a dict, so routing is one hash lookup however many
+    skills are hosted. A request for an applicationId that no skill is registered for is rejected
+    with VerificationError, so the lookup also verifies the application ID.
+
+    Each skill keeps its own view functions, stream cache and response cache, and the usual
+    request, session and context globals resolve to the skill serving the current request.
+    Configuration is shared through the app, and so are the certificate cache, fetcher and store
+    and the chain validator, since every skill's requests are signed with the same certificate.
+    A template defined in the templates file of the skill serving the current request is loaded
+    from that file, ahead of the app's own templates. Jinja caches it under a name qualified
+    with the file, so two skills can use the same template name. SkillRouter sets the app's
+    jinja_environment, so it must be set up before the app renders its first template.
+
+    Example:
+
+        app = Flask(__name__)
+        router = SkillRouter(app, '/')
+
+        tides = Ask()
+        router.add_skill(tides, 'amzn1.ask.skill.tides', path='tides.yaml')
+
+        @tides.intent('TideIntent')
+        def tide(city):
+            return statement(render_template('tides_high_tide', city=city))
+
+    Keyword Arguments:
+        app {Flask object} -- App instance - created with Flask(__name__) (default: {None})
+        route {str} -- entry point to which all skills' Alexa Requests are sent (default: {None})
+        json_codec {codec.JSONCodec} -- codec used to parse requests before routing them
+            (default: {codec named by ASK_JSON_CODEC})
+    """
+
+    def __init__(self, app=None, route=None, json_codec=None):
+        self.app = None
+        self._route = route
+        self._json_codec = json_codec
+        self._skills = {}
+        self._template_paths = {}
+        self._template_loaders = {}
+        # the first skill added; the others verify requests with its certificate objects
+        self._verifier_skill = None
+        self._shares_verifier = set()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        if self._route is None:
+            raise TypeError("route is a required argument when app is not None")
+
+        self.app = app
+
+        app.skill_router = self
+
+        app.add_url_rule(self._route, view_func=self._flask_view_func, methods=['POST'])
+        app.jinja_environment = _SkillEnvironment
+        app.jinja_loader = ChoiceLoader([_SkillTemplateLoader(self._template_loaders), app.jinja_loader])
+        # skills added before the app was known
+        for ask, path in self._template_paths.items():
+            self._load_templates(ask, path)
+
+    def add_skill(self, ask, application_ids, path='templates.yaml'):
+        """Registers an Ask instance created without an app or blueprint as a skill.
+
+        Arguments:
+            ask {Ask} -- the skill's Ask instance
+            application_ids {str or list} -- applicationId, or list of them, routed to this skill
+
+        Keyword Arguments:
+            path {str} -- path to the skill's templates yaml file, relative to the app (default: {'templates.yaml'})
+        """
+        if isinstance(application_ids, string_types):
+            application_ids = [application_ids]
+        for application_id in application_ids:
+            registered = self._skills.get(application_id)
+            if registered is not None and registered is not ask:
+                raise ValueError('Application ID "{}" is already routed to another skill'.format(application_id))
+
+        for application_id in application_ids:
+            self._skills[application_id] = ask
+        if self._verifier_skill is None:
+            self._verifier_skill = ask
+        self._template_paths[ask] = path
+        if self.app is not None:
+            self._load_templates(ask, path)
+
+    def _load_templates(self, ask, path):
+        ask.app = self.app
+        # skills sharing a templates file share its loader
+        if path not in self._template_loaders:
+            self._template_loaders[path] = YamlLoader(self.app, path)
+
+    def _template_name(self, name):
+        """Returns the name the template called name is loaded and cached as for the current skill."""
+        path = self._template_paths.get(find_ask())
+        loader = self._template_loaders.get(path)
+        if loader is not None and name in loader.mapping:
+            return '{}:{}'.format(path, name)
+        return name
+
+    def _share_verifier(self, ask):
+        """Points ask at the certificate objects of the first skill added, the first time it verifies a request."""
+        source = self._verifier_skill
+        if ask is source or ask in self._shares_verifier:
+            return
+        ask._cert_cache = source.cert_cache
+        ask._cert_fetcher = source.cert_fetcher
+        ask._cert_store = source.cert_store
+        try:
+            ask._chain_validator = source.chain_validator
+        except VerificationError:
+            ask._trust_store_error = source._trust_store_error
+        self._shares_verifier.add(ask)
+
+    def skill_for(self, application_id):
+        """Returns the Ask instance serving application_id, raising VerificationError if there is none."""
+        try:
+            return self._skills[application_id]
+        except KeyError:
+            raise VerificationError("Application ID verification failed")
+
+    @property
+    def json_codec(self):
+        if self._json_codec is None:
+            self._json_codec = codec.get_codec(current_app.config.get('ASK_JSON_CODEC', 'json'))
+        return self._json_codec
+
+    def _flask_view_func(self, *args, **kwargs):
+        started = default_timer()
+        raw_body = flask_request.data
+        ask_payload = self.json_codec.loads(raw_body)
+        application_id = _payload_application_id(ask_payload)
+        if application_id is None:
+            return "", 400
+        ask = self.skill_for(application_id)
+
+        # the request, session and context globals resolve to this skill for the rest of the request
+        _app_ctx_stack.top._ask_instance = ask
+        _begin_request(started)
+
+        result = ask._run_hooks('before_verify')
+        if result is not None:
+            return result
+        if ask.ask_verify_requests:
+            self._share_verifier(ask)
+            ask._verify_request(ask_payload, raw_body, flask_request.headers)
+        result = ask._respond(ask_payload)
+        ask._queue_after_response()
+        return result
+
+
+class _SkillEnvironment(Environment):
+    """Jinja environment of an app hosting skills, which qualifies the names of skill templates.
+
+    Jinja caches templates by name, so a template defined by the skill serving the current request
+    is loaded under its name prefixed with the skill's templates file.
+    """
+
+    def get_template(self, name, parent=None, globals=None):
+        if isinstance(name, string_types):
+            name = self.app.skill_router._template_name(name)
+        return Environment.get_template(self, name, parent, globals)
+
+    def select_template(self, names, parent=None, globals=None):
+        if isinstance(names, (list, tuple)):
+            names = [self.app.skill_router._template_name(name) if isinstance(name, string_types) else name
+                     for name in names]
+        return Environment.select_template(self, names, parent, globals)
+
+
+class _SkillTemplateLoader(BaseLoader):
+    """Loads the skill templates named by _SkillEnvironment, as 'path:name'."""
+
+    def __init__(self, loaders):
+        self._loaders = loaders
+
+    def get_source(self, environment, template):
+        path, _, name = template.partition(':')
+        loader = self._loaders.get(path)
+        if loader is None or not name:
+            raise TemplateNotFound(template)
+        source, filename, uptodate = loader.get_source(environment, name)
+        if source is None:
+            raise TemplateNotFound(template)
+        return source, filename, uptodate
@@ -0,0 +1,69 @@
+"""
+Counters and timings for request processing stages
+"""
+import threading
+from contextlib import contextmanager
+from timeit import default_timer
+
+
+class StageStats(object):
+    """
+    Thread-safe call counts, rejection counts and timings keyed by stage name.
+
+    Example:
+
+    stats = StageStats()
+    with stats.timed('signature'):
+        verify()
+
+    stats.snapshot()['signature']
+    # {'calls': 1, 'rejected': 0, 'total_time': 0.0004, 'max_time': 0.0004}
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stages = {}
+
+    def record(self, stage, elapsed=0.0, rejected=False):
+        """
+        Record one call of a stage.
+
+        :param stage: name of the stage
+        :param elapsed: seconds spent in the stage
+        :param rejected: True if the stage rejected the request or raised
+        """
+        with self._lock:
+            entry = self._stages.get(stage)
+            if entry is None:
+                entry = self._stages[stage] = {'calls': 0, 'rejected': 0, 'total_time': 0.0, 'max_time': 0.0}
+            entry['calls'] += 1
+            if rejected:
+                entry['rejected'] += 1
+            entry['total_time'] += elapsed
+            if elapsed > entry['max_time']:
+                entry['max_time'] = elapsed
+
+    @contextmanager
+    def timed(self, stage):
+        """
+        Time the body of a with block as one call of `stage`.
+        An exception escaping the block is recorded as a rejection.
+        """
+        start = default_timer()
+        rejected = True
+        try:
+            yield
+            rejected = False
+        finally:
+            self.record(stage, default_timer() - start, rejected)
+
+    def snapshot(self):
+        """
+        :return: dict of stage name to a copy of its counters
+        """
+        with self._lock:
+            return dict((stage, dict(entry)) for stage, entry in self._stages.items())
+
+    def reset(self):
+        with self._lock:
+            self._stages.clear()
@@ -0,0 +1,128 @@
+"""
+Running work after the response has been returned
+"""
+import threading
+from timeit import default_timer
+
+from six.moves import queue
+
+from . import logger
+
+
+class TaskQueue(object):
+    """Runs functions on a bounded thread pool, logging their failures.
+
+    At most max_workers tasks run at once and max_queued more wait for a thread. When both are
+    taken, a new task is handled according to overflow:
+
+        'run': the task runs on the calling thread, so a server falling behind serves requests
+               more slowly instead of piling up work in memory;
+        'drop': the task is discarded and a warning is logged.
+
+    The threads are daemon threads, so a task that never returns cannot keep the interpreter from
+    exiting once close has given up waiting for it.
+
+    Keyword Arguments:
+        max_workers {int} -- threads running tasks (default: {4})
+        max_queued {int} -- tasks waiting for a thread (default: {100})
+        overflow {str} -- 'run' or 'drop' (default: {'run'})
+    """
+
+    def __init__(self, max_workers=4, max_queued=100, overflow='run'):
+        if overflow not in ('run', 'drop'):
+            raise ValueError('overflow must be "run" or "drop", not "{}"'.format(overflow))
+        self.overflow = overflow
+        self._max_workers = max_workers
+        self._tasks = queue.Queue()
+        self._workers = []
+        self._slots = threading.BoundedSemaphore(max_workers + max_queued)
+        self._idle = threading.Condition()
+        self._pending = 0
+        self._closed = False
+        self.completed = 0
+        self.failed = 0
+        self.overflowed = 0
+
+    def submit(self, func, *args, **kwargs):
+        """Queues func(*args, **kwargs). Returns False if it was dropped."""
+        if self._closed or not self._slots.acquire(False):
+            self.overflowed += 1
+            if self.overflow == 'drop' or self._closed:
+                logger.warning('Background task {} dropped: the task queue is {}'.format(
+                    _name(func), 'closed' if self._closed else 'full'))
+                return False
+            self._run(func, args, kwargs)
+            return True
+
+        with self._idle:
+            self._pending += 1
+            # a thread is started per task until there are max_workers of them
+            if len(self._workers) < self._max_workers:
+                worker = threading.Thread(target=self._work, name='TaskQueue-{}'.format(len(self._workers)))
+                worker.daemon = True
+                self._workers.append(worker)
+                worker.start()
+        self._tasks.put((func, args, kwargs))
+        return True
+
+    def drain(self, timeout=None):
+        """Waits until every queued task has finished. Returns False if timeout ran out first."""
+        with self._idle:
+            if timeout is None:
+                while self._pending:
+                    self._idle.wait()
+                return True
+            return _wait_for(self._idle, lambda: not self._pending, timeout)
+
+    def close(self, timeout=None):
+        """Stops accepting tasks and waits for the queued ones, up to timeout seconds.
+
+        Returns False if tasks were still running when timeout ran out.
+        """
+        self._closed = True
+        drained = self.drain(timeout)
+        # idle threads exit; a thread still running a task exits once the task returns
+        for _ in self._workers:
+            self._tasks.put(None)
+        return drained
+
+    def _work(self):
+        while True:
+            task = self._tasks.get()
+            if task is None:
+                return
+            self._run_queued(*task)
+
+    def _run_queued(self, func, args, kwargs):
+        try:
+            self._run(func, args, kwargs)
+        finally:
+            self._slots.release()
+            with self._idle:
+                self._pending -= 1
+                if not self._pending:
+                    self._idle.notify_all()
+
+    def _run(self, func, args, kwargs):
+        try:
+            func(*args, **kwargs)
+        except Exception:
+            self.failed += 1
+            logger.exception('Background task {} failed'.format(_name(func)))
+        else:
+            self.completed += 1
+
+
+def _wait_for(condition, predicate, timeout):
+    # Condition.wait_for is Python 3 only
+    end = default_timer() + timeout
+    while not predicate():
+        remaining = end - default_timer()
+        if remaining <= 0:
+            return False
+        condition.wait(remaining)
+    return True
+
+
+def _name(func):
+    return getattr(func, '__name__', repr(func))
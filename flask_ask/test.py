@@ -163,7 +163,7 @@ class AlexaRequestBuilder:
         """
         return {
             'type': self._request_type,
-            'request_id': self._request_id,
+            'requestId': self._request_id,
             'timestamp': self._request_timestamp,
             'locale': self._locale,
             'intent': self._generate_intent_envelope(),
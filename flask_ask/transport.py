@@ -0,0 +1,111 @@
+"""
+Pooled HTTP client used for outbound calls to Amazon
+"""
+import socket
+import threading
+from collections import namedtuple
+
+from six.moves import http_client
+from six.moves.urllib.parse import urlparse
+
+
+Response = namedtuple('Response', ['status', 'headers', 'data'])
+
+
+class ConnectionPool(object):
+    """Thread-safe pool of keep-alive HTTP(S) connections.
+
+    Idle connections are kept per (scheme, host, port) and reused by later
+    requests to the same origin. Every connection is opened with
+    `connect_timeout` and then reads with `read_timeout`, so a slow or dead
+    peer can never hold a request thread indefinitely.
+
+    Keyword Arguments:
+        connect_timeout {float} -- seconds allowed to establish a connection (default: {2.0})
+        read_timeout {float} -- seconds allowed for each socket read once connected (default: {5.0})
+        max_idle {int} -- maximum idle connections kept per origin (default: {4})
+    """
+
+    def __init__(self, connect_timeout=2.0, read_timeout=5.0, max_idle=4):
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_idle = max_idle
+        self._idle = {}
+        self._lock = threading.Lock()
+
+    def request(self, method, url, body=None, headers=None):
+        """Send a request and return a Response(status, headers, data) tuple."""
+        parsed_url = urlparse(url)
+        origin = (parsed_url.scheme, parsed_url.hostname, parsed_url.port)
+        path = parsed_url.path or '/'
+        if parsed_url.query:
+            path += '?' + parsed_url.query
+
+        conn, reused = self._acquire(origin)
+        try:
+            response = self._send(conn, method, path, body, headers)
+        except socket.timeout:
+            conn.close()
+            raise
+        except (http_client.HTTPException, socket.error):
+            conn.close()
+            if not reused:
+                raise
+            # the server may have dropped an idle keep-alive connection, retry on a new one
+            conn = self._connect(origin)
+            try:
+                response = self._send(conn, method, path, body, headers)
+            except Exception:
+                conn.close()
+                raise
+        except Exception:
+            conn.close()
+            raise
+
+        if response.will_close:
+            conn.close()
+        else:
+            self._release(origin, conn)
+        return Response(response.status, dict(response.getheaders()), response.data)
+
+    def close(self):
+        """Close every idle connection."""
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for connections in idle.values():
+            for conn in connections:
+                conn.close()
+
+    def _acquire(self, origin):
+        with self._lock:
+            connections = self._idle.get(origin)
+            if connections:
+                return connections.pop(), True
+        return self._connect(origin), False
+
+    def _release(self, origin, conn):
+        with self._lock:
+            connections = self._idle.setdefault(origin, [])
+            if len(connections) < self.max_idle:
+                connections.append(conn)
+                return
+        conn.close()
+
+    def _connect(self, origin):
+        scheme, host, port = origin
+        if scheme == 'https':
+            conn = http_client.HTTPSConnection(host, port, timeout=self.connect_timeout)
+        elif scheme == 'http':
+            conn = http_client.HTTPConnection(host, port, timeout=self.connect_timeout)
+        else:
+            raise ValueError('Unsupported URL scheme "{}"'.format(scheme))
+        conn.connect()
+        conn.sock.settimeout(self.read_timeout)
+        return conn
+
+    @staticmethod
+    def _send(conn, method, path, body, headers):
+        conn.request(method, path, body, headers or {})
+        response = conn.getresponse()
+        response.data = response.read()
+        return response
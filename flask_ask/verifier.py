@@ -1,34 +1,497 @@
 import os
+import re
+import ssl
+import json
 import base64
+import calendar
+import hashlib
 import posixpath
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from functools import partial
 from datetime import datetime
+from six import string_types
+from six.moves import http_client
 from six.moves.urllib.parse import urlparse
-from six.moves.urllib.request import urlopen
 
-from OpenSSL import crypto
+from cryptography import x509
+from cryptography.exceptions import InvalidSignature
+from cryptography.hazmat.backends import default_backend
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import padding, ec
 
 from . import logger
+from .cache import SingleFlight
+from .transport import ConnectionPool
 
 
 class VerificationError(Exception): pass
 
 
-def load_certificate(cert_url):
+_DIGESTS = {'sha1': hashes.SHA1(), 'sha256': hashes.SHA256()}
+
+
+_PEM_CERTIFICATE = re.compile(b'-----BEGIN CERTIFICATE-----.+?-----END CERTIFICATE-----', re.DOTALL)
+
+
+class SigningCertificate(object):
+    """A parsed signing certificate together with its public key.
+
+    The public key is loaded once when the certificate is parsed, and the
+    object is what CertificateCache holds, so verifying a signature with a
+    cached certificate does no parsing at all. `chain` holds the signing
+    certificate followed by the intermediates served along with it.
+    """
+
+    def __init__(self, cert, chain=None):
+        self.cert = cert
+        self.chain = chain or [cert]
+        self.public_key = cert.public_key()
+        self.not_after = _not_after(cert)
+
+    @classmethod
+    def from_pem(cls, cert_data):
+        chain = _load_pem_certificates(cert_data)
+        if not chain:
+            raise VerificationError("Certificate could not be parsed")
+        return cls(chain[0], chain)
+
+
+class ChainValidator(object):
+    """Validates certificate chains against a trust store, memoizing the results.
+
+    The chain is walked from the leaf and ends at the first certificate that is
+    a trusted root, matched by subject and public key, or that is signed by
+    one. Certificates served past that point, such as a cross-signed copy of a
+    root whose legacy issuer is no longer trusted, are ignored. Every
+    certificate walked must be within its validity period and be signed by the
+    next one. Successful results are remembered per chain fingerprint until the
+    earliest notAfter among the certificates walked, so a chain is only walked
+    once during its lifetime however often its certificate is reloaded.
+
+    Arguments:
+        trusted {list} -- trusted root certificates, see load_trust_store
+
+    Keyword Arguments:
+        max_size {int} -- maximum number of remembered chains (default: {64})
+    """
+
+    def __init__(self, trusted, max_size=64):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._trusted = {}
+        for cert in trusted:
+            self._trusted.setdefault(cert.subject, []).append(cert)
+        self._trusted_keys = set((cert.subject, _public_key_bytes(cert)) for cert in trusted)
+        self._validated = OrderedDict()
+        self._lock = threading.Lock()
+
+    def validate(self, chain):
+        """Raise VerificationError unless `chain` (leaf first) leads to a trusted root."""
+        fingerprint = _chain_fingerprint(chain)
+        with self._lock:
+            expires_at = self._validated.get(fingerprint)
+            if expires_at is not None and time.time() < expires_at:
+                self.hits += 1
+                return
+            self.misses += 1
+
+        walked = self._validate_chain(chain)
+
+        expires_at = min(calendar.timegm(_not_after(cert).timetuple()) for cert in walked)
+        with self._lock:
+            self._validated.pop(fingerprint, None)
+            self._validated[fingerprint] = expires_at
+            while len(self._validated) > self.max_size:
+                self._validated.popitem(last=False)
+
+    def _validate_chain(self, chain):
+        """Walks the chain up to a trusted root and returns the certificates walked."""
+        now = datetime.utcnow()
+        for i, cert in enumerate(chain):
+            if (cert.subject, _public_key_bytes(cert)) in self._trusted_keys:
+                return chain[:i + 1]
+            if not _not_before(cert) <= now < _not_after(cert):
+                raise VerificationError("Certificate chain contains an expired certificate")
+            if self._issued_by_trusted_root(cert):
+                return chain[:i + 1]
+            if i + 1 == len(chain):
+                break
+            issuer = chain[i + 1]
+            if cert.issuer != issuer.subject or not _is_ca(issuer):
+                raise VerificationError("Certificate chain is out of order")
+            _verify_issued_by(cert, issuer)
+        raise VerificationError("Certificate chain does not lead to a trusted root")
+
+    def _issued_by_trusted_root(self, cert):
+        for root in self._trusted.get(cert.issuer, []):
+            try:
+                _verify_issued_by(cert, root)
+                return True
+            except VerificationError:
+                continue
+        return False
+
+
+def load_trust_store(path=None):
+    """Load trusted root certificates from a PEM bundle.
+
+    Without a `path`, the system bundle reported by ssl.get_default_verify_paths
+    is used, then certifi's bundle if certifi is installed.
+    """
+    if path is None:
+        path = ssl.get_default_verify_paths().cafile
+    if path is None:
+        try:
+            import certifi
+            path = certifi.where()
+        except ImportError:
+            raise VerificationError("No trust store found to validate certificate chains against")
+    with open(path, 'rb') as f:
+        trusted = _load_pem_certificates(f.read())
+    if not trusted:
+        raise VerificationError("Trust store {} holds no certificates".format(path))
+    return trusted
+
+
+class CertificateCache(object):
+    """In-process cache of parsed and validated signing certificates.
+
+    Entries are keyed by the normalized certificate URL and are kept until the
+    certificate's notAfter date, or until `ttl` seconds after they were stored
+    if that comes first. The least recently used entry is evicted once
+    `max_size` entries are held.
+
+    Keyword Arguments:
+        max_size {int} -- maximum number of certificates to hold (default: {16})
+        ttl {int} -- maximum age of an entry in seconds, None to rely on notAfter only (default: {None})
+    """
+
+    def __init__(self, max_size=16, ttl=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, cert_url):
+        """Return the cached certificate for `cert_url`, or None if absent or expired."""
+        key = _normalize_certificate_url(cert_url)
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                cert, expires_at = entry
+                if time.time() < expires_at:
+                    # re-insert to mark as most recently used
+                    self._entries[key] = entry
+                    self.hits += 1
+                    return cert
+            self.misses += 1
+            return None
+
+    def set(self, cert_url, cert, not_after):
+        """Store a validated certificate until `not_after` (a naive UTC datetime)."""
+        expires_at = calendar.timegm(not_after.timetuple())
+        if self.ttl is not None:
+            expires_at = min(expires_at, time.time() + self.ttl)
+        key = _normalize_certificate_url(cert_url)
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (cert, expires_at)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def expires_at(self, cert_url):
+        """Return the epoch time at which the entry for `cert_url` expires, or None if absent."""
+        entry = self._entries.get(_normalize_certificate_url(cert_url))
+        if entry is None:
+            return None
+        return entry[1]
+
+    def status(self):
+        """Return a list of dicts describing each cached certificate and when it expires."""
+        with self._lock:
+            entries = list(self._entries.items())
+        return [{'url': key,
+                 'not_after': cert.not_after,
+                 'expires_at': datetime.utcfromtimestamp(expires_at)}
+                for key, (cert, expires_at) in entries]
+
+    def invalidate(self, cert_url=None):
+        """Drop the entry for `cert_url`, or every entry when no URL is given."""
+        with self._lock:
+            if cert_url is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(_normalize_certificate_url(cert_url), None)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class CertificateFetcher(object):
+    """Downloads signing certificates over pooled keep-alive connections.
+
+    Concurrent fetches of the same URL share a single download, so a cold
+    cache under load results in one request to Amazon instead of one per
+    request thread. Any object with a `fetch(cert_url)` method returning the
+    PEM bytes can be used in its place, e.g. a local stand-in during tests.
+
+    Keyword Arguments:
+        pool {transport.ConnectionPool} -- connection pool to download with (default: {None})
+        connect_timeout {float} -- seconds allowed to connect when no pool is given (default: {2.0})
+        read_timeout {float} -- seconds allowed per read when no pool is given (default: {5.0})
+    """
+
+    def __init__(self, pool=None, connect_timeout=2.0, read_timeout=5.0):
+        if pool is None:
+            pool = ConnectionPool(connect_timeout=connect_timeout, read_timeout=read_timeout)
+        self.pool = pool
+        self._flights = SingleFlight()
+
+    def fetch(self, cert_url):
+        return self._flights.do(cert_url, self._download, cert_url)
+
+    def _download(self, cert_url):
+        try:
+            response = self.pool.request('GET', cert_url)
+        except (IOError, OSError, http_client.HTTPException) as e:
+            raise VerificationError("Certificate download failed: {}".format(e))
+        if response.status != 200:
+            raise VerificationError("Certificate download failed with status {}".format(response.status))
+        return response.data
+
+
+class DiskCertificateStore(object):
+    """Stores downloaded signing certificates in a directory shared between processes.
+
+    Each certificate that passed validation is kept in its own file together
+    with its notAfter date, so a freshly started worker can reuse a certificate
+    another worker already downloaded instead of downloading it again. Stored
+    certificates are only a download cache: load_certificate validates them
+    again when they are read. Files are written to a temporary name and renamed
+    into place, so readers never see a partially written entry.
+
+    The directory is created with mode 0700. An existing directory is refused
+    if it belongs to another user or others may write to it.
+
+    Arguments:
+        path {str} -- directory to keep certificates in, created if missing
+    """
+
+    def __init__(self, path):
+        self.path = path
+        if not os.path.isdir(path):
+            try:
+                os.makedirs(path, 0o700)
+            except OSError:
+                # another process may have created it in the meantime
+                if not os.path.isdir(path):
+                    raise
+        _check_private_directory(path)
+
+    def get(self, cert_url):
+        """Return a (pem, not_after) tuple for `cert_url`, or None if absent or expired."""
+        try:
+            with open(self._filename(cert_url)) as f:
+                record = json.load(f)
+            not_after = record['not_after']
+            pem = record['pem'].encode('ascii')
+        except (IOError, OSError, ValueError, KeyError, TypeError, AttributeError):
+            return None
+        if time.time() >= not_after:
+            return None
+        return pem, datetime.utcfromtimestamp(not_after)
+
+    def set(self, cert_url, pem, not_after):
+        """Atomically write a validated certificate and its notAfter (a naive UTC datetime)."""
+        record = {
+            'url': cert_url,
+            'pem': pem.decode('ascii'),
+            'not_after': calendar.timegm(not_after.timetuple()),
+        }
+        fd, tmp_path = tempfile.mkstemp(dir=self.path, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(record, f)
+            _replace(tmp_path, self._filename(cert_url))
+        except Exception:
+            os.remove(tmp_path)
+            raise
+
+    def _filename(self, cert_url):
+        key = _normalize_certificate_url(cert_url).encode('utf-8')
+        return os.path.join(self.path, hashlib.sha256(key).hexdigest() + '.json')
+
+
+class CertificateRefresher(object):
+    """Keeps a known set of signing certificates loaded in a CertificateCache.
+
+    `warm` loads every URL immediately. `start` runs a daemon thread which
+    reloads each certificate `margin` seconds before its cache entry expires,
+    so live requests never have to download it themselves. Failed loads are
+    logged and retried after `retry_interval` seconds.
+
+    Arguments:
+        urls {list} -- signing certificate URLs to keep loaded
+        cache {CertificateCache} -- cache the certificates are kept in
+        load {function} -- called as load(url, refresh=True) to download, validate and cache a certificate
+
+    Keyword Arguments:
+        margin {int} -- seconds before expiry at which a certificate is reloaded (default: {300})
+        retry_interval {int} -- seconds between attempts after a failure, and the shortest sleep (default: {60})
+    """
+
+    def __init__(self, urls, cache, load, margin=300, retry_interval=60):
+        self.urls = list(urls)
+        self.cache = cache
+        self.margin = margin
+        self.retry_interval = retry_interval
+        self._load = load
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def warm(self, due_only=False):
+        """Load the certificates, only those about to expire if `due_only`. Returns the number loaded."""
+        loaded = 0
+        deadline = time.time() + self.margin
+        for cert_url in self.urls:
+            expires_at = self.cache.expires_at(cert_url)
+            if due_only and expires_at is not None and expires_at > deadline:
+                continue
+            try:
+                self._load(cert_url, refresh=True)
+                loaded += 1
+            except Exception as e:
+                logger.warning("Could not load signing certificate {}: {}".format(cert_url, e))
+        return loaded
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='flask-ask-cert-refresher')
+            self._thread.daemon = True
+            self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+
+    def _run(self):
+        while True:
+            self._stopped.wait(self._next_delay())
+            if self._stopped.is_set():
+                return
+            self.warm(due_only=True)
+
+    def _next_delay(self):
+        expiries = [self.cache.expires_at(cert_url) for cert_url in self.urls]
+        if not expiries or None in expiries:
+            return self.retry_interval
+        return max(min(expiries) - self.margin - time.time(), self.retry_interval)
+
+
+_replace = getattr(os, 'replace', os.rename)
+
+
+def _check_private_directory(path):
+    if not hasattr(os, 'getuid'):
+        return
+    info = os.stat(path)
+    if info.st_uid != os.getuid():
+        raise VerificationError("Certificate store {} belongs to another user".format(path))
+    if info.st_mode & 0o022:
+        raise VerificationError("Certificate store {} is writable by other users".format(path))
+
+_default_fetcher = CertificateFetcher()
+
+
+def load_certificate(cert_url, cache=None, fetcher=None, store=None, refresh=False, chain_validator=None):
     if not _valid_certificate_url(cert_url):
         raise VerificationError("Certificate URL verification failed")
-    cert_data = urlopen(cert_url).read()
-    cert = crypto.load_certificate(crypto.FILETYPE_PEM, cert_data)
-    if not _valid_certificate(cert):
+    if cache is not None and not refresh:
+        cert = cache.get(cert_url)
+        if cert is not None:
+            return cert
+
+    cert = None
+    record = store.get(cert_url) if store is not None and not refresh else None
+    if record is not None:
+        # the store is only a download cache, so what it holds is validated like a download
+        try:
+            cert = _validated_certificate(cert_url, record[0], chain_validator)
+        except VerificationError as e:
+            logger.warning("Ignoring stored certificate for {}: {}".format(cert_url, e))
+
+    if cert is None:
+        if fetcher is None:
+            fetcher = _default_fetcher
+        cert_data = fetcher.fetch(cert_url)
+        cert = _validated_certificate(cert_url, cert_data, chain_validator)
+        if store is not None:
+            # only certificates that passed are stored, so a failure is never shared with other workers
+            store.set(cert_url, cert_data, cert.not_after)
+
+    if cache is not None:
+        cache.set(cert_url, cert, cert.not_after)
+    return cert
+
+
+def _validated_certificate(cert_url, cert_data, chain_validator):
+    cert = SigningCertificate.from_pem(cert_data)
+    if not _valid_certificate(cert.cert):
         raise VerificationError("Certificate verification failed")
+    if chain_validator is not None:
+        try:
+            chain_validator.validate(cert.chain)
+        except VerificationError as e:
+            logger.warning("Certificate chain validation failed for {}: {}".format(cert_url, e))
+            raise VerificationError("Certificate verification failed")
     return cert
 
 
-def verify_signature(cert, signature, signed_data):
+def load_certificate_async(cert_url, cache=None, fetcher=None, store=None, chain_validator=None,
+                           loop=None, executor=None):
+    """Loads a signing certificate without blocking an asyncio event loop.
+
+    Takes the same arguments as load_certificate and returns an asyncio future for its result.
+    A certificate already in `cache` is resolved immediately on the loop. Otherwise the disk
+    store, download and validation run in `executor` (the loop's default executor if None).
+    Concurrent loads of the same URL share a single download through the fetcher.
+    """
+    import asyncio
+    loop = loop or asyncio.get_event_loop()
+
+    if cache is not None and _valid_certificate_url(cert_url):
+        cert = cache.get(cert_url)
+        if cert is not None:
+            future = loop.create_future()
+            future.set_result(cert)
+            return future
+
+    load = partial(load_certificate, cert_url, cache=cache, fetcher=fetcher, store=store,
+                   chain_validator=chain_validator)
+    return loop.run_in_executor(executor, load)
+
+
+def verify_signature(cert, signature, signed_data, digest='sha1'):
+    """Verify a base64 encoded request signature against the signing certificate.
+
+    `digest` is 'sha1' for the legacy Signature header and 'sha256' for the
+    Signature-256 header.
+    """
+    if not isinstance(cert, SigningCertificate):
+        if hasattr(cert, 'to_cryptography'):
+            # pyOpenSSL X509 objects from older callers
+            cert = cert.to_cryptography()
+        cert = SigningCertificate(cert)
     try:
         signature = base64.b64decode(signature)
-        crypto.verify(cert, signature, signed_data, 'sha1')
-    except crypto.Error as e:
-        raise VerificationError(e)
+        cert.public_key.verify(signature, signed_data, padding.PKCS1v15(), _DIGESTS[digest])
+    except (InvalidSignature, TypeError, ValueError):
+        raise VerificationError("Signature verification failed")
 
 
 def verify_timestamp(timestamp):
@@ -38,7 +501,16 @@ def verify_timestamp(timestamp):
 
 
 def verify_application_id(candidate, records):
-    if candidate not in records:
+    """Checks that candidate is exactly one of the allowed application IDs.
+
+    records is either a single ID or a collection of IDs. Pass a set or frozenset
+    to make the check a hash lookup.
+    """
+    if isinstance(records, string_types):
+        valid = candidate == records
+    else:
+        valid = candidate in records
+    if not valid:
         raise VerificationError("Application ID verification failed")
 
 
@@ -51,19 +523,76 @@ def _valid_certificate_url(cert_url):
     return False
 
 
+def _normalize_certificate_url(cert_url):
+    parsed_url = urlparse(cert_url)
+    netloc = (parsed_url.hostname or '').lower()
+    if parsed_url.port not in (None, 443):
+        netloc += ':{}'.format(parsed_url.port)
+    return '{}://{}{}'.format(parsed_url.scheme.lower(), netloc, posixpath.normpath(parsed_url.path))
+
+
+def _load_pem_certificates(data):
+    certs = []
+    for block in _PEM_CERTIFICATE.findall(data):
+        try:
+            certs.append(x509.load_pem_x509_certificate(block, default_backend()))
+        except ValueError as e:
+            raise VerificationError("Certificate could not be parsed: {}".format(e))
+    return certs
+
+
+def _chain_fingerprint(chain):
+    digest = hashlib.sha256()
+    for cert in chain:
+        digest.update(cert.fingerprint(hashes.SHA256()))
+    return digest.digest()
+
+
+def _public_key_bytes(cert):
+    return cert.public_key().public_bytes(serialization.Encoding.DER,
+                                          serialization.PublicFormat.SubjectPublicKeyInfo)
+
+
+def _is_ca(cert):
+    try:
+        return cert.extensions.get_extension_for_class(x509.BasicConstraints).value.ca
+    except x509.ExtensionNotFound:
+        # v1 certificates carry no extensions at all
+        return cert.version == x509.Version.v1
+
+
+def _verify_issued_by(cert, issuer):
+    public_key = issuer.public_key()
+    try:
+        if isinstance(public_key, ec.EllipticCurvePublicKey):
+            public_key.verify(cert.signature, cert.tbs_certificate_bytes, ec.ECDSA(cert.signature_hash_algorithm))
+        else:
+            public_key.verify(cert.signature, cert.tbs_certificate_bytes, padding.PKCS1v15(),
+                              cert.signature_hash_algorithm)
+    except InvalidSignature:
+        raise VerificationError("Certificate chain signature verification failed")
+
+
+def _not_before(cert):
+    not_before = getattr(cert, 'not_valid_before_utc', None)
+    if not_before is None:
+        return cert.not_valid_before
+    return not_before.replace(tzinfo=None)
+
+
+def _not_after(cert):
+    not_after = getattr(cert, 'not_valid_after_utc', None)
+    if not_after is None:
+        return cert.not_valid_after
+    return not_after.replace(tzinfo=None)
+
+
 def _valid_certificate(cert):
-    not_after = cert.get_notAfter().decode('utf-8')
-    not_after = datetime.strptime(not_after, '%Y%m%d%H%M%SZ')
+    not_after = _not_after(cert)
     if datetime.utcnow() >= not_after:
         return False
-    found = False
-    for i in range(0, cert.get_extension_count()):
-        extension = cert.get_extension(i)
-        short_name = extension.get_short_name().decode('utf-8')
-        value = str(extension)
-        if 'subjectAltName' == short_name and 'DNS:echo-api.amazon.com' == value:
-                found = True
-                break
-    if not found:
+    try:
+        san = cert.extensions.get_extension_for_class(x509.SubjectAlternativeName)
+    except x509.ExtensionNotFound:
         return False
-    return True
+    return 'echo-api.amazon.com' in san.value.get_values_for_type(x509.DNSName)
@@ -46,7 +46,10 @@ def launch():
 def get_first_event(day):
     month_name = day.strftime('%B')
     day_number = day.day
-    events = _get_json_events_from_wikipedia(month_name, day_number)
+    try:
+        events = _get_json_events_from_wikipedia(month_name, day_number)
+    except ValueError:
+        events = None
     if not events:
         speech_output = "There is a problem connecting to Wikipedia at this time. Please try again later."
         return statement('<speak>{}</speak>'.format(speech_output))
@@ -103,6 +106,7 @@ def session_ended():
     return "{}", 200
 
 
+@ask.cached(ttl=3600, stale_ttl=86400)
 def _get_json_events_from_wikipedia(month, date):
     url = "{}{}_{}".format(URL_PREFIX, month, date)
     data = urlopen(url).read().decode('utf-8')
@@ -116,7 +120,8 @@ def _parse_json(text):
         slice_end = text.index("\\n\\n\\nBirths")
         text = text[slice_start:slice_end];
     except ValueError:
-        return events
+        # raised rather than returned, so the empty answer is not cached
+        raise ValueError('Wikipedia returned a page without events')
     start_index = end_index = 0
     done = False
     while not done:
@@ -1,6 +1,4 @@
-import requests
-from flask import  json
-from flask_ask import logger
+from flask_ask import logger, alexa_api, AlexaAPIError
 
 class Product():
     '''
@@ -19,34 +17,18 @@ class Product():
 
     '''
 
-    def __init__(self, apiAccessToken):
-        self.token = apiAccessToken
+    def __init__(self):
         self.product_list = self.query()
 
 
     def query(self):
-        # Information required to invoke the API is available in the session
-        apiEndpoint = "https://api.amazonalexa.com"
-        apiPath     = "/v1/users/~current/skills/~current/inSkillProducts"
-        token       = "bearer " + self.token
-        language    = "en-US" #self.event.request.locale
-
-        url = apiEndpoint + apiPath
-        headers = {
-                "Content-Type"      : 'application/json',
-                "Accept-Language"   : language,
-                "Authorization"     : token
-            }
-        #Call the API
-        res = requests.get(url, headers=headers)
-        logger.info('PRODUCTS:' + '*' * 80)
-        logger.info(res.status_code)
-        logger.info(res.text)
-        if res.status_code == 200:
-            data = json.loads(res.text)
-            return data['inSkillProducts']
-        else:
-            return None        
+        # alexa_api calls the endpoint in the request's context with its token and locale,
+        # and caches the products per user until a purchase completes
+        try:
+            return alexa_api.in_skill_products()
+        except AlexaAPIError as e:
+            logger.info('PRODUCTS: {}'.format(e))
+            return []
 
     def list(self):
         """ return list of purchasable and not entitled products"""
@@ -1,6 +1,5 @@
 import logging
 import os
-import requests
 
 from flask import Flask, json, render_template
 from flask_ask import Ask, request, session, question, statement, context, buy, upsell, refund, logger
@@ -17,7 +16,7 @@ PRODUCT_KEY = "PRODUCT"
 
 @ask.on_purchase_completed( mapping={'payload': 'payload','name':'name','status':'status','token':'token'})
 def completed(payload, name, status, token):
-    products = Product(context.System.apiAccessToken)
+    products = Product()
     logger.info('on-purchase-completed {}'.format( request))
     logger.info('payload: {} {}'.format(payload.purchaseResult, payload.productId))
     logger.info('name: {}'.format(name))
@@ -32,7 +31,7 @@ def completed(payload, name, status, token):
 
 @ask.launch
 def launch():
-    products = Product(context.System.apiAccessToken)
+    products = Product()
     question_text = render_template('welcome', products=products.list())
     reprompt_text = render_template('welcome_reprompt')
     return question(question_text).reprompt(reprompt_text).simple_card('Welcome', question_text)
@@ -40,7 +39,7 @@ def launch():
 
 @ask.intent('BuySkillItemIntent', mapping={'product_name': 'ProductName'})
 def buy_intent(product_name):
-    products = Product(context.System.apiAccessToken)
+    products = Product()
     logger.info("PRODUCT: {}".format(product_name))
     buy_card = render_template('buy_card', product=product_name)
     productId = products.productId(product_name)
@@ -59,7 +58,7 @@ def refund_intent(product_name):
     refund_card = render_template('refund_card')
     logger.info("PRODUCT: {}".format(product_name))
 
-    products = Product(context.System.apiAccessToken)
+    products = Product()
     productId = products.productId(product_name)
 
     if productId is not None:
@@ -223,7 +223,20 @@ def _json_date_handler(obj):
 
 
 def _make_tide_request(city, date):
-    station = STATIONS.get(city.lower())
+    try:
+        predictions = _get_tide_predictions(STATIONS.get(city.lower()), date)
+    except ValueError:
+        predictions = None
+    if not predictions:
+        statement_text = render_template('noaa_problem')
+    else:
+        tideinfo = _find_tide_info(predictions)
+        statement_text = render_template('tide_info', date=date, city=city, tideinfo=tideinfo)
+    return statement(statement_text).simple_card("Tide Pooler", statement_text)
+
+
+@ask.cached(ttl=600, stale_ttl=3600)
+def _get_tide_predictions(station, date):
     noaa_api_params = {
         'station': station,
         'product': 'predictions',
@@ -240,13 +253,9 @@ def _make_tide_request(city, date):
     url = ENDPOINT + "?" + urlencode(noaa_api_params)
     resp_body = urlopen(url).read()
     if len(resp_body) == 0:
-        statement_text = render_template('noaa_problem')
-    else:
-        noaa_response_obj = json.loads(resp_body)
-        predictions = noaa_response_obj['predictions']
-        tideinfo = _find_tide_info(predictions)
-        statement_text = render_template('tide_info', date=date, city=city, tideinfo=tideinfo)
-    return statement(statement_text).simple_card("Tide Pooler", statement_text)
+        # raised rather than returned, so the empty answer is not cached
+        raise ValueError('NOAA returned an empty response')
+    return json.loads(resp_body)['predictions']
 
 
 def _find_tide_info(predictions):
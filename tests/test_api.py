@@ -0,0 +1,216 @@
+import unittest
+import json
+import threading
+
+from six.moves import BaseHTTPServer, socketserver
+from flask import Flask
+
+from flask_ask import Ask, statement, alexa_api
+from flask_ask.api import AlexaAPIClient, AlexaAPIError, IN_SKILL_PRODUCTS_PATH
+from flask_ask.cache import UserCache
+from flask_ask.test import AlexaRequestBuilder
+from flask_ask.transport import ConnectionPool
+
+
+class _Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        self.server.received.append((self.path, self.headers['Authorization'], json.loads(body.decode('utf-8'))))
+        status = 204 if self.headers['Authorization'] == 'Bearer token-1' else 401
+        data = b'' if status == 204 else b'{"message": "bad token"}'
+        self.send_response(status)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        self.server.received.append((self.path, self.headers['Authorization'], self.headers['Accept-Language']))
+        if self.headers['Authorization'] != 'Bearer token-1':
+            status, data = 401, b'{"message": "bad token"}'
+        elif self.path.startswith(IN_SKILL_PRODUCTS_PATH):
+            status, data = 200, self._products()
+        else:
+            status, data = 200, json.dumps({'path': self.path}).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _products(self):
+        # two pages, tagged with the locale they were asked for; gets counts first pages
+        locale = self.headers['Accept-Language']
+        if 'nextToken' not in self.path:
+            self.server.gets += 1
+            page = {'inSkillProducts': [{'name': 'first', 'locale': locale}],
+                    'nextToken': 'a/b'}
+        else:
+            page = {'inSkillProducts': [{'name': 'second', 'locale': locale}], 'nextToken': None}
+        return json.dumps(page).encode('utf-8')
+
+    def log_message(self, *args):
+        pass
+
+
+class _Server(socketserver.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+    def __init__(self, *args):
+        BaseHTTPServer.HTTPServer.__init__(self, *args)
+        self.received = []
+        self.gets = 0
+
+
+class ProgressiveResponseTests(unittest.TestCase):
+    """ Progressive responses are posted to a local stand-in for the Alexa directives API """
+
+    def setUp(self):
+        self.server = _Server(('127.0.0.1', 0), _Handler)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        self.endpoint = 'http://127.0.0.1:{}'.format(self.server.server_address[1])
+
+        self.app = Flask(__name__)
+        self.app.config['ASK_VERIFY_REQUESTS'] = False
+        self.client = AlexaAPIClient(ConnectionPool(connect_timeout=1, read_timeout=1))
+        self.ask = Ask(app=self.app, route='/ask', api_client=self.client)
+        self.futures = []
+
+        @self.ask.intent('SlowIntent')
+        def slow():
+            self.futures.append(self.ask.progressive_response('One moment'))
+            return statement('done')
+
+    def tearDown(self):
+        self.client.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def post(self, token='token-1', endpoint=True):
+        envelope = AlexaRequestBuilder().intent('SlowIntent').request_id('req-9').make()
+        if endpoint:
+            envelope['context']['System'].update(apiEndpoint=self.endpoint, apiAccessToken=token)
+        return self.app.test_client().post('/ask', data=json.dumps(envelope))
+
+    def test_speak_directive_is_sent(self):
+        self.assertEqual(200, self.post().status_code)
+        self.assertIsNone(self.futures[0].result(timeout=5))
+
+        path, authorization, body = self.server.received[0]
+        self.assertEqual('/v1/directives', path)
+        self.assertEqual('Bearer token-1', authorization)
+        self.assertEqual({'header': {'requestId': 'req-9'},
+                          'directive': {'type': 'VoicePlayer.Speak', 'speech': 'One moment'}}, body)
+
+    def test_failures_do_not_reach_the_view(self):
+        self.assertEqual(200, self.post(token='expired').status_code)
+        with self.assertRaises(AlexaAPIError) as raised:
+            self.futures[0].result(timeout=5)
+        self.assertEqual(401, raised.exception.status)
+
+    def test_skipped_without_api_endpoint(self):
+        self.assertEqual(200, self.post(endpoint=False).status_code)
+        self.assertEqual([None], self.futures)
+        self.assertEqual([], self.server.received)
+
+
+class AlexaAPITests(unittest.TestCase):
+    """ alexa_api calls a local stand-in for the Alexa service APIs and caches per user and locale """
+
+    def setUp(self):
+        self.server = _Server(('127.0.0.1', 0), _Handler)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        self.endpoint = 'http://127.0.0.1:{}'.format(self.server.server_address[1])
+
+        self.app = Flask(__name__)
+        self.app.config['ASK_VERIFY_REQUESTS'] = False
+        self.client = AlexaAPIClient(ConnectionPool(connect_timeout=1, read_timeout=1), cache=UserCache(ttl=60))
+        self.ask = Ask(app=self.app, route='/ask', api_client=self.client)
+        self.results = []
+
+        @self.ask.intent('ProductsIntent')
+        def products():
+            self.results.append(alexa_api.in_skill_products())
+            return statement('done')
+
+        @self.ask.intent('AddressIntent')
+        def address():
+            self.results.append(alexa_api.device_address(country_and_postal_code=True))
+            return statement('done')
+
+        @self.ask.on_purchase_completed()
+        def completed(payload, name, status, token):
+            return statement('thanks')
+
+    def tearDown(self):
+        self.client.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def post(self, intent='ProductsIntent', user='user-1', locale='en-US', token='token-1', endpoint=True):
+        envelope = AlexaRequestBuilder().intent(intent).user_id(user).locale(locale).make()
+        if endpoint:
+            envelope['context']['System'].update(apiEndpoint=self.endpoint, apiAccessToken=token)
+        envelope['context']['System']['device'] = {'deviceId': 'device-1'}
+        return self.app.test_client().post('/ask', data=json.dumps(envelope))
+
+    def purchase(self, user='user-1'):
+        envelope = AlexaRequestBuilder().user_id(user).make()
+        envelope['request'] = {'type': 'Connections.Response', 'requestId': 'req-1', 'locale': 'en-US',
+                               'timestamp': '2019-01-01T00:00:00Z', 'name': 'Buy',
+                               'status': {'code': '200', 'message': 'OK'},
+                               'payload': {'purchaseResult': 'ACCEPTED', 'productId': 'p-1'}, 'token': ''}
+        return self.app.test_client().post('/ask', data=json.dumps(envelope))
+
+    def test_products_follow_pages_with_locale_and_token(self):
+        self.assertEqual(200, self.post().status_code)
+        self.assertEqual(['first', 'second'], [p['name'] for p in self.results[0]])
+        self.assertEqual([(IN_SKILL_PRODUCTS_PATH, 'Bearer token-1', 'en-US'),
+                          (IN_SKILL_PRODUCTS_PATH + '?nextToken=a%2Fb', 'Bearer token-1', 'en-US')],
+                         self.server.received)
+
+    def test_results_are_cached_per_user_and_locale(self):
+        self.post()
+        self.post()
+        self.assertEqual(1, self.server.gets)
+        self.assertEqual(self.results[0], self.results[1])
+
+        self.post(locale='de-DE')
+        self.assertEqual('de-DE', self.results[2][0]['locale'])
+        self.post(user='user-2')
+        self.assertEqual(3, self.server.gets)
+
+    def test_purchase_invalidates_the_users_products(self):
+        self.post()
+        self.post(user='user-2')
+        self.post(intent='AddressIntent')
+        self.assertEqual(200, self.purchase().status_code)
+
+        self.post()
+        self.post(user='user-2')
+        self.post(intent='AddressIntent')
+        self.assertEqual(3, self.server.gets)
+        self.assertEqual(1, sum(path.endswith('/countryAndPostalCode') for path, _, _ in self.server.received))
+
+    def test_failures_are_raised_and_not_cached(self):
+        with self.assertRaises(AlexaAPIError):
+            self.client.get(self.endpoint, '/v2/accounts/~current/settings/Profile.name', 'expired',
+                            user_id='user-1')
+        self.assertEqual(0, len(self.client.cache))
+
+    def test_missing_endpoint_raises(self):
+        @self.ask.intent('NoEndpointIntent')
+        def no_endpoint():
+            with self.assertRaises(ValueError):
+                alexa_api.profile('name')
+            return statement('done')
+
+        self.assertEqual(200, self.post(intent='NoEndpointIntent', endpoint=False).status_code)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,110 @@
+import unittest
+import base64
+import json
+import sys
+from datetime import datetime
+
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.asymmetric import padding
+from flask import Flask
+
+from flask_ask import Ask, statement, session
+from flask_ask.test import AlexaRequestBuilder
+
+from .test_verifier import CERT_URL, StubFetcher, make_certificate
+
+
+# ASGI receive and send are coroutines. They are built with exec so that Python 2 can still
+# import this module and skip its tests.
+_channels = {}
+if sys.version_info >= (3, 5):
+    exec(
+        'def receiver(messages):\n'
+        '    async def receive():\n'
+        '        return messages.pop(0)\n'
+        '    return receive\n'
+        'def sender(sent):\n'
+        '    async def send(message):\n'
+        '        sent.append(message)\n'
+        '    return send\n',
+        _channels)
+
+
+@unittest.skipIf(sys.version_info < (3, 5), 'the ASGI adapter needs Python 3.5')
+class AskASGITests(unittest.TestCase):
+    """ Skills served through the ASGI adapter """
+
+    def setUp(self):
+        import asyncio
+        from flask_ask.asgi import AskASGI
+
+        self.key, pem = make_certificate()
+        self.fetcher = StubFetcher(pem)
+        self.app = Flask(__name__)
+        self.app.config['ASK_VERIFY_CERT_CHAIN'] = False
+        self.ask = Ask(app=self.app, route='/ask', cert_fetcher=self.fetcher)
+        self.asgi = AskASGI(self.ask, max_workers=2)
+        self.loop = asyncio.new_event_loop()
+
+        @self.ask.intent('HelloIntent')
+        def hello():
+            return statement('hello {}'.format(session.user.userId))
+
+    def tearDown(self):
+        self.loop.close()
+        self.asgi.close()
+
+    def call(self, body, headers=(), path='/ask', method='POST'):
+        scope = {'type': 'http', 'method': method, 'path': path,
+                 'headers': [(name.encode('latin-1'), value.encode('latin-1')) for name, value in headers]}
+        chunks = [{'type': 'http.request', 'body': body[:10], 'more_body': True},
+                  {'type': 'http.request', 'body': body[10:], 'more_body': False}]
+        sent = []
+        self.loop.run_until_complete(self.asgi(scope, _channels['receiver'](chunks), _channels['sender'](sent)))
+        return sent[0]['status'], dict(sent[0]['headers']), sent[1]['body']
+
+    def signed_request(self, user_id='user-1'):
+        builder = AlexaRequestBuilder().intent('HelloIntent').user_id(user_id)
+        builder.timestamp(datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%SZ'))
+        body = json.dumps(builder.make()).encode('utf-8')
+        signature = self.key.sign(body, padding.PKCS1v15(), hashes.SHA256())
+        headers = [('SignatureCertChainUrl', CERT_URL), ('Signature-256', base64.b64encode(signature).decode('ascii'))]
+        return body, headers
+
+    def test_verified_request_is_dispatched(self):
+        body, headers = self.signed_request()
+        status, response_headers, data = self.call(body, headers)
+
+        self.assertEqual(200, status)
+        self.assertEqual(b'application/json', response_headers[b'content-type'])
+        self.assertEqual('hello user-1', json.loads(data.decode('utf-8'))['response']['outputSpeech']['text'])
+
+    def test_certificate_is_downloaded_once(self):
+        for _ in range(3):
+            body, headers = self.signed_request()
+            self.assertEqual(200, self.call(body, headers)[0])
+        self.assertEqual(1, self.fetcher.call_count)
+        self.assertEqual(3, self.ask.verification_stats.snapshot()['certificate']['calls'])
+
+    def test_bad_signature_is_rejected(self):
+        body, headers = self.signed_request()
+        self.assertEqual(400, self.call(body.replace(b'user-1', b'user-2'), headers)[0])
+        self.assertEqual(1, self.ask.verification_stats.snapshot()['signature']['rejected'])
+
+    def test_unknown_path_and_method(self):
+        self.assertEqual(404, self.call(b'{}', path='/other')[0])
+        self.assertEqual(405, self.call(b'{}', method='GET')[0])
+
+    def test_lifespan_shutdown_closes_the_pool(self):
+        messages = [{'type': 'lifespan.startup'}, {'type': 'lifespan.shutdown'}]
+        sent = []
+        self.loop.run_until_complete(self.asgi({'type': 'lifespan'}, _channels['receiver'](messages),
+                                               _channels['sender'](sent)))
+        self.assertEqual(['lifespan.startup.complete', 'lifespan.shutdown.complete'],
+                         [message['type'] for message in sent])
+        with self.assertRaises(RuntimeError):
+            self.asgi.executor.submit(lambda: None)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,8 +1,10 @@
 import unittest
+import threading
+import time
 from mock import patch, Mock
 from werkzeug.contrib.cache import SimpleCache
 from flask_ask.core import Ask
-from flask_ask.cache import push_stream, pop_stream, top_stream, set_stream
+from flask_ask.cache import push_stream, pop_stream, top_stream, set_stream, SingleFlight, UserCache, CallCache
 
 
 class CacheTests(unittest.TestCase):
@@ -56,5 +58,168 @@ class CacheTests(unittest.TestCase):
         self.assertIsNone(result)
 
 
+class SingleFlightTests(unittest.TestCase):
+
+    def test_waiters_share_the_leaders_exception(self):
+        flights = SingleFlight()
+        release = threading.Event()
+        calls = []
+        errors = []
+
+        def failing():
+            calls.append(1)
+            release.wait(5)
+            raise KeyError('boom')
+
+        def caller():
+            try:
+                flights.do('key', failing)
+            except KeyError as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=caller) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        time.sleep(0.2)
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(1, len(calls))
+        self.assertEqual(3, len(errors))
+        self.assertFalse(flights.in_flight('key'))
+
+    def test_sequential_calls_are_not_collapsed(self):
+        flights = SingleFlight()
+        self.assertEqual(1, flights.do('key', lambda: 1))
+        self.assertEqual(2, flights.do('key', lambda: 2))
+
+
+class CallCacheTests(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = CallCache()
+        self.calls = []
+
+    def tearDown(self):
+        self.cache.close()
+
+    def call(self):
+        self.calls.append(1)
+        return len(self.calls)
+
+    def test_fresh_results_are_reused(self):
+        self.assertEqual(1, self.cache.get('key', self.call, ttl=60))
+        self.assertEqual(1, self.cache.get('key', self.call, ttl=60))
+        self.assertEqual(2, self.cache.get('other', self.call, ttl=60))
+        self.assertEqual((1, 2), (self.cache.hits, self.cache.misses))
+
+    def test_none_is_cached(self):
+        calls = []
+        self.cache.get('key', lambda: calls.append(1), ttl=60)
+        self.cache.get('key', lambda: calls.append(1), ttl=60)
+        self.assertEqual([1], calls)
+
+    def test_stale_result_is_served_while_refreshing(self):
+        refreshed = threading.Event()
+
+        def refresh():
+            value = self.call()
+            refreshed.set()
+            return value
+
+        self.assertEqual(1, self.cache.get('key', self.call, ttl=0.05, stale_ttl=60))
+        time.sleep(0.1)
+        self.assertEqual(1, self.cache.get('key', self.call, ttl=0.05, stale_ttl=60, make_refresh=lambda: refresh))
+        self.assertTrue(refreshed.wait(5))
+        self.cache.close()
+        self.assertEqual(2, self.cache.get('key', self.call, ttl=60, stale_ttl=60))
+        self.assertEqual(1, self.cache.stale_hits)
+
+    def test_fresh_hits_do_not_build_a_refresh(self):
+        made = []
+        self.cache.get('key', self.call, ttl=60, stale_ttl=60, make_refresh=lambda: made.append(1))
+        self.cache.get('key', self.call, ttl=60, stale_ttl=60, make_refresh=lambda: made.append(1))
+        self.assertEqual([], made)
+
+    def test_expired_result_is_not_served_without_stale_ttl(self):
+        self.cache.get('key', self.call, ttl=0.05)
+        time.sleep(0.1)
+        self.assertEqual(2, self.cache.get('key', self.call, ttl=0.05))
+
+    def test_failed_refresh_keeps_the_stale_result(self):
+        failed = threading.Event()
+
+        def fail():
+            failed.set()
+            raise IOError('upstream down')
+
+        self.cache.get('key', self.call, ttl=0.05, stale_ttl=60)
+        time.sleep(0.1)
+        with patch('flask_ask.cache.logger') as logger:
+            self.assertEqual(1, self.cache.get('key', fail, ttl=0.05, stale_ttl=60))
+            self.assertTrue(failed.wait(5))
+            self.cache.close()
+        self.assertTrue(logger.warning.called)
+        self.assertEqual(1, self.cache.get('key', fail, ttl=0.05, stale_ttl=60))
+
+    def test_exceptions_are_not_cached(self):
+        def fail():
+            raise IOError('upstream down')
+
+        with self.assertRaises(IOError):
+            self.cache.get('key', fail, ttl=60)
+        self.assertEqual(1, self.cache.get('key', self.call, ttl=60))
+
+    def test_concurrent_misses_make_one_call(self):
+        started = threading.Event()
+        release = threading.Event()
+
+        def slow():
+            started.set()
+            release.wait(5)
+            return self.call()
+
+        results = []
+        leader = threading.Thread(target=lambda: results.append(self.cache.get('key', slow, ttl=60)))
+        leader.start()
+        started.wait(5)
+        follower = threading.Thread(target=lambda: results.append(self.cache.get('key', slow, ttl=60)))
+        follower.start()
+        time.sleep(0.05)
+        release.set()
+        leader.join()
+        follower.join()
+        self.assertEqual([1, 1], results)
+        self.assertEqual([1], self.calls)
+
+
+class UserCacheTests(unittest.TestCase):
+
+    def test_entries_expire(self):
+        cache = UserCache(ttl=0)
+        cache.set('user', 'key', 1)
+        self.assertIsNone(cache.get('user', 'key'))
+
+    def test_invalidate_by_prefix(self):
+        cache = UserCache()
+        cache.set('user', ('en-US', '/v1/products'), 1)
+        cache.set('user', ('en-US', '/v2/address'), 2)
+        cache.set('other', ('en-US', '/v1/products'), 3)
+        cache.invalidate('user', '/v1/')
+        self.assertIsNone(cache.get('user', ('en-US', '/v1/products')))
+        self.assertEqual(2, cache.get('user', ('en-US', '/v2/address')))
+        self.assertEqual(3, cache.get('other', ('en-US', '/v1/products')))
+
+    def test_least_recently_used_users_are_evicted(self):
+        cache = UserCache(max_users=2)
+        cache.set('a', 'key', 1)
+        cache.set('b', 'key', 2)
+        cache.get('a', 'key')
+        cache.set('c', 'key', 3)
+        self.assertIsNone(cache.get('b', 'key'))
+        self.assertEqual(1, cache.get('a', 'key'))
+
+
 if __name__ == '__main__':
     unittest.main()
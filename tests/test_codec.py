@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+import unittest
+import json
+import datetime
+
+from flask import Flask
+
+from flask_ask import Ask, statement, session
+from flask_ask.codec import get_codec, JSONCodec
+from flask_ask.test import AlexaRequestBuilder
+
+
+def _installed(name):
+    try:
+        get_codec(name)
+        return True
+    except ImportError:
+        return False
+
+
+class _DateEncoder(json.JSONEncoder):
+
+    def default(self, obj):
+        if isinstance(obj, datetime.date):
+            return obj.isoformat()
+        return super(_DateEncoder, self).default(obj)
+
+
+class CodecTests(unittest.TestCase):
+    """ Every codec round-trips an envelope and honours custom encoders """
+
+    names = [name for name in ('json', 'orjson', 'rapidjson', 'ujson') if _installed(name)]
+
+    def setUp(self):
+        self.app = Flask(__name__)
+        self.envelope = AlexaRequestBuilder().intent('TestIntent').slot('City', u'Zürich').make()
+
+    def test_round_trip(self):
+        with self.app.app_context():
+            for name in self.names:
+                codec = get_codec(name)
+                body = codec.dumps(self.envelope)
+                self.assertIsInstance(body, bytes)
+                self.assertEqual(self.envelope, codec.loads(body))
+                self.assertEqual(self.envelope, codec.loads(body.decode('utf-8')))
+
+    def test_encoder_class_and_default_function(self):
+        value = {'when': datetime.date(2017, 7, 8)}
+        with self.app.app_context():
+            for name in self.names:
+                codec = get_codec(name)
+                self.assertEqual({'when': '2017-07-08'}, json.loads(codec.dumps(value, cls=_DateEncoder)))
+                self.assertEqual({'when': '2017-07-08'},
+                                 json.loads(codec.dumps(value, default=lambda obj: obj.isoformat())))
+
+    def test_auto_picks_an_installed_codec(self):
+        self.assertIsInstance(get_codec('auto'), JSONCodec)
+
+    def test_unknown_codec(self):
+        with self.assertRaises(ValueError):
+            get_codec('yaml')
+
+
+class CodecIntegrationTests(unittest.TestCase):
+
+    def test_responses_rendered_with_configured_codec(self):
+        for name in CodecTests.names:
+            app = Flask(__name__)
+            app.config['ASK_VERIFY_REQUESTS'] = False
+            app.config['ASK_JSON_CODEC'] = name
+            ask = Ask(app=app, route='/ask')
+
+            @ask.intent('TestIntent')
+            def test_intent():
+                session.attributes['when'] = datetime.date(2017, 7, 8)
+                session.attributes_encoder = _DateEncoder
+                return statement(u'grüezi')
+
+            envelope = AlexaRequestBuilder().intent('TestIntent').make()
+            response = app.test_client().post('/ask', data=json.dumps(envelope))
+            data = json.loads(response.data.decode('utf-8'))
+            self.assertEqual(u'grüezi', data['response']['outputSpeech']['text'])
+            self.assertEqual('2017-07-08', data['sessionAttributes']['when'])
+            with app.app_context():
+                self.assertEqual(name, ask.json_codec.name)
+
+
+if __name__ == '__main__':
+    unittest.main()
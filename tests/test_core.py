@@ -1,7 +1,14 @@
 # -*- coding: utf-8 -*-
 import unittest
 from aniso8601.timezone import UTCOffset, build_utcoffset
-from flask_ask.core import Ask
+import sys
+import threading
+from flask import Flask, Blueprint
+from flask_ask.core import Ask, _ViewBinder, find_ask
+from flask_ask.models import _Field
+from flask_ask.convert import to_datetime
+import aniso8601
+from flask_ask.verifier import VerificationError
 
 from datetime import datetime, timedelta
 from mock import patch, MagicMock
@@ -31,7 +38,7 @@ class TestCoreRoutines(unittest.TestCase):
         self.patch_load_cert = patch('flask_ask.core.verifier.load_certificate')
         self.patch_verify_sig = patch('flask_ask.core.verifier.verify_signature')
         self.patch_current_app.start()
-        self.patch_load_cert.start()
+        self.load_cert = self.patch_load_cert.start()
         self.patch_verify_sig.start()
 
     @patch('flask_ask.core.flask_request',
@@ -42,6 +49,36 @@ class TestCoreRoutines(unittest.TestCase):
         ask._alexa_request()
 
 
+    @patch('flask_ask.core.flask_request',
+           new=FakeRequest({'request': {'timestamp': 1234},
+                            'session': {'application': {'applicationId': 'other'}}}))
+    def test_wrong_application_id_rejected_before_certificate_lookup(self):
+        self.mock_app.config['ASK_APPLICATION_ID'] = 'mine'
+        ask = Ask()
+        with self.assertRaises(VerificationError):
+            ask._alexa_request()
+
+        self.assertFalse(self.load_cert.called)
+        stats = ask.verification_stats.snapshot()
+        self.assertEqual(1, stats['application_id']['rejected'])
+        self.assertNotIn('certificate', stats)
+
+    @patch('flask_ask.core.flask_request',
+           new=FakeRequest({'request': {'timestamp': 1234, 'locale': 'de-DE'},
+                            'session': {'application': {'applicationId': 1}}}))
+    def test_verification_check_runs_before_certificate_lookup(self):
+        ask = Ask()
+
+        @ask.verification_check
+        def english_only(payload):
+            if payload['request']['locale'] != 'en-US':
+                raise VerificationError('Unsupported locale')
+
+        with self.assertRaises(VerificationError):
+            ask._alexa_request()
+        self.assertFalse(self.load_cert.called)
+        self.assertEqual(1, ask.verification_stats.snapshot()['english_only']['rejected'])
+
     def test_parse_timestamp(self):
         utc = build_utcoffset('UTC', timedelta(hours=0))
         result = Ask._parse_timestamp('2017-07-08T07:38:00Z')
@@ -76,3 +113,159 @@ class TestCoreRoutines(unittest.TestCase):
         self.patch_current_app.stop()
         self.patch_load_cert.stop()
         self.patch_verify_sig.stop()
+
+
+class TestViewBinder(unittest.TestCase):
+    """ View arguments are resolved once at registration and bound per request """
+
+    def test_mapping_convert_and_default(self):
+        def weather(city, days, unit):
+            pass
+        binder = _ViewBinder(weather, mapping={'city': 'City'}, convert={'days': int},
+                             default={'unit': lambda: 'celsius'})
+
+        args, kwargs, errors = binder.bind({'City': 'Paris', 'days': '3', 'unit': ''})
+        self.assertEqual(['Paris', 3, 'celsius'], args)
+        self.assertEqual({}, kwargs)
+        self.assertEqual({}, errors)
+
+    def test_shorthand_converter_and_errors(self):
+        def when(date, count):
+            pass
+        binder = _ViewBinder(when, convert={'date': 'date', 'count': int})
+
+        args, _, errors = binder.bind({'date': '2017-07-08', 'count': 'many'})
+        self.assertEqual(datetime(2017, 7, 8).date(), args[0])
+        self.assertEqual('many', args[1])
+        self.assertIn('count', errors)
+
+    def test_var_keyword_receives_unbound_values(self):
+        def search(query, **slots):
+            pass
+        binder = _ViewBinder(search, mapping={'query': 'Query', 'pos': 'offsetInMilliseconds'},
+                             convert={'pos': int})
+
+        args, kwargs, _ = binder.bind({'Query': 'jazz', 'offsetInMilliseconds': '10', 'token': 't'})
+        self.assertEqual(['jazz'], args)
+        self.assertEqual({'pos': 10, 'token': 't'}, kwargs)
+
+    @unittest.skipIf(sys.version_info[0] < 3, 'keyword-only arguments need Python 3')
+    def test_keyword_only_arguments(self):
+        namespace = {}
+        exec('def play(token, *, offset, volume=None): pass', namespace)
+        binder = _ViewBinder(namespace['play'], mapping={'offset': 'offsetInMilliseconds'},
+                             default={'volume': 5})
+
+        args, kwargs, _ = binder.bind({'token': 't', 'offsetInMilliseconds': 42})
+        self.assertEqual(['t'], args)
+        self.assertEqual({'offset': 42, 'volume': 5}, kwargs)
+
+
+class TestFindAsk(unittest.TestCase):
+    """ The Ask instance is looked up once per app context """
+
+    def test_blueprint_lookup_is_cached_on_app_context(self):
+        app = Flask(__name__)
+        blueprint = Blueprint('skill', __name__, url_prefix='/ask')
+        ask = Ask(blueprint=blueprint)
+        app.register_blueprint(blueprint)
+
+        with app.app_context():
+            with patch('flask_ask.core._search_ask', wraps=lambda: ask) as search:
+                self.assertIs(ask, find_ask())
+                self.assertIs(ask, find_ask())
+                self.assertEqual(1, search.call_count)
+
+        with app.app_context():
+            self.assertIs(ask, find_ask())
+
+
+class TestField(unittest.TestCase):
+    """ Tests for the request data container """
+
+    def setUp(self):
+        self.payload = {'request': {'type': 'IntentRequest',
+                                    'intent': {'name': 'Foo', 'slots': {'City': {'name': 'City'}}}},
+                        'session': {'attributes': {}}}
+
+    def test_dot_and_key_access(self):
+        field = _Field(self.payload)
+        self.assertEqual('Foo', field.request.intent.name)
+        self.assertEqual('Foo', field['request']['intent']['name'])
+        self.assertEqual('City', field.request.intent.slots.City.name)
+        self.assertIsNone(field.request.missing)
+
+    def test_nested_objects_are_wrapped_once(self):
+        field = _Field(self.payload)
+        self.assertNotIsInstance(dict.__getitem__(field, 'request'), _Field)
+
+        request = field.request
+        self.assertIsInstance(request, _Field)
+        self.assertIs(request, field['request'])
+        self.assertIs(request, field.get('request'))
+
+    def test_iteration_yields_wrapped_objects(self):
+        field = _Field(self.payload)
+        for value in field.values():
+            self.assertIsInstance(value, _Field)
+        for _, value in field.items():
+            self.assertIsInstance(value, _Field)
+
+    def test_pop_and_setdefault_return_wrapped_objects(self):
+        field = _Field(self.payload)
+        self.assertIsInstance(field.setdefault('request'), _Field)
+        self.assertIs(field.request, field.setdefault('request', {}))
+        self.assertIsInstance(field.setdefault('added', {'a': 1}), _Field)
+        self.assertIsInstance(field.pop('session'), _Field)
+        self.assertEqual('missing', field.pop('session', 'missing'))
+        self.assertIsInstance(_Field({'only': {}}).popitem()[1], _Field)
+
+    def test_concurrent_first_reads_share_one_wrapper(self):
+        field = _Field(self.payload)
+        start = threading.Barrier(8) if hasattr(threading, 'Barrier') else None
+        seen = []
+
+        def read():
+            if start is not None:
+                start.wait()
+            seen.append(field.request)
+
+        threads = [threading.Thread(target=read) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(1, len(set(id(request) for request in seen)))
+
+    def test_mutation_is_kept_and_serializable(self):
+        field = _Field(self.payload)
+        field.session.attributes['color'] = 'blue'
+        self.assertEqual('blue', field.session.attributes.color)
+        self.assertEqual({'attributes': {'color': 'blue'}}, json.loads(json.dumps(field.session)))
+        # the parsed payload is left untouched
+        self.assertEqual({}, self.payload['session']['attributes'])
+
+    def test_timestamp_attributes_are_parsed(self):
+        field = _Field({'timestamp': '2017-07-08T07:38:00Z'})
+        utc = build_utcoffset('UTC', timedelta(hours=0))
+        self.assertEqual(datetime(2017, 7, 8, 7, 38, 0, 0, utc), field.timestamp)
+        self.assertIs(field.timestamp, field.timestamp)
+
+
+class TestToDatetime(unittest.TestCase):
+    """ Tests for the request timestamp parser """
+
+    def test_alexa_format_matches_aniso8601(self):
+        for value in ('2017-07-08T07:38:00Z', '2019-01-22T21:00:26Z', '2020-02-29T23:59:59Z'):
+            self.assertEqual(aniso8601.parse_datetime(value), to_datetime(value))
+            self.assertEqual('UTC', to_datetime(value).tzname())
+
+    def test_other_shapes_fall_back_to_aniso8601(self):
+        for value in ('2017-07-08T07:38:00.123Z', '2017-07-08T09:38:00+02:00'):
+            self.assertEqual(aniso8601.parse_datetime(value), to_datetime(value))
+
+    def test_invalid_values_raise(self):
+        with self.assertRaises(ValueError):
+            to_datetime('2017-13-08T07:38:00Z')
+        with self.assertRaises(AttributeError):
+            to_datetime(1234)
@@ -0,0 +1,590 @@
+import unittest
+import json
+import sys
+import threading
+import time
+
+from flask import Flask, g, request as flask_request
+
+from flask_ask import Ask, statement, session, request, copy_ask_context
+from flask_ask.test import AlexaRequestBuilder
+
+
+class ResponseCacheTests(unittest.TestCase):
+    """ Retried requests are answered from the response cache """
+
+    def setUp(self):
+        self.app = Flask(__name__)
+        self.app.config['ASK_VERIFY_REQUESTS'] = False
+        self.app.config['ASK_RESPONSE_CACHE'] = True
+        self.ask = Ask(app=self.app, route='/ask')
+        self.client = self.app.test_client()
+        self.calls = []
+
+        @self.ask.intent('CountIntent')
+        def count():
+            self.calls.append(1)
+            return statement('call {}'.format(len(self.calls)))
+
+        @self.ask.intent('RawIntent')
+        def raw():
+            self.calls.append(1)
+            return 'error', 500
+
+    def post(self, intent_name, request_id):
+        envelope = AlexaRequestBuilder().intent(intent_name).request_id(request_id).make()
+        return self.client.post('/ask', data=json.dumps(envelope))
+
+    def test_retry_is_served_from_cache(self):
+        first = self.post('CountIntent', 'req-1')
+        retry = self.post('CountIntent', 'req-1')
+
+        self.assertEqual(first.data, retry.data)
+        self.assertEqual(1, len(self.calls))
+        self.assertEqual(1, self.ask.response_cache.hits)
+
+    def test_different_requests_are_not_shared(self):
+        self.post('CountIntent', 'req-1')
+        response = self.post('CountIntent', 'req-2')
+
+        self.assertEqual(2, len(self.calls))
+        self.assertIn(b'call 2', response.data)
+
+    def test_only_rendered_responses_are_cached(self):
+        self.post('RawIntent', 'req-1')
+        self.post('RawIntent', 'req-1')
+        self.assertEqual(2, len(self.calls))
+
+    def test_disabled_by_default(self):
+        self.app.config['ASK_RESPONSE_CACHE'] = False
+        self.post('CountIntent', 'req-1')
+        self.post('CountIntent', 'req-1')
+        self.assertEqual(2, len(self.calls))
+        with self.app.app_context():
+            self.assertIsNone(self.ask.response_cache)
+
+
+class RequestRegistryTests(unittest.TestCase):
+    """ Request types are routed through the handler registry """
+
+    def setUp(self):
+        self.app = Flask(__name__)
+        self.app.config['ASK_VERIFY_REQUESTS'] = False
+        self.ask = Ask(app=self.app, route='/ask')
+        self.client = self.app.test_client()
+        self.calls = []
+
+        @self.ask.on_request('CanFulfillIntentRequest')
+        def can_fulfill(city):
+            self.calls.append(('can_fulfill', city))
+            return json.dumps({'version': '1.0', 'response': {'canFulfillIntent': {'canFulfill': 'YES'}}})
+
+        @self.ask.on_request('AlexaSkillEvent.*')
+        def skill_event(type):
+            self.calls.append(('event', type))
+            return "{}", 200
+
+        @self.ask.on_request('AlexaSkillEvent.SkillDisabled')
+        def disabled():
+            self.calls.append(('disabled',))
+            return "{}", 200
+
+    def post(self, request_type, **fields):
+        envelope = AlexaRequestBuilder().intent('Unused').make()
+        envelope['request'] = dict(fields, type=request_type, requestId='req-1')
+        return self.client.post('/ask', data=json.dumps(envelope))
+
+    def test_exact_type(self):
+        envelope = AlexaRequestBuilder().intent('CityIntent').slot('city', 'paris').make()
+        envelope['request']['type'] = 'CanFulfillIntentRequest'
+        response = self.client.post('/ask', data=json.dumps(envelope))
+        self.assertEqual(200, response.status_code)
+        self.assertEqual([('can_fulfill', 'paris')], self.calls)
+
+    def test_prefix_and_exact_precedence(self):
+        self.post('AlexaSkillEvent.SkillEnabled')
+        self.post('AlexaSkillEvent.SkillDisabled')
+        self.assertEqual([('event', 'AlexaSkillEvent.SkillEnabled'), ('disabled',)], self.calls)
+
+    def test_unknown_type_is_bad_request(self):
+        response = self.post('Alexa.Presentation.APL.UserEvent')
+        self.assertEqual(400, response.status_code)
+
+    def test_per_type_counters(self):
+        self.post('AlexaSkillEvent.SkillEnabled')
+        self.post('AlexaSkillEvent.SkillEnabled')
+        self.post('Unknown.Type')
+
+        stats = self.ask.request_stats.snapshot()
+        self.assertEqual(2, stats['AlexaSkillEvent.SkillEnabled']['calls'])
+        self.assertEqual(0, stats['AlexaSkillEvent.SkillEnabled']['rejected'])
+        self.assertEqual(1, stats['Unknown.Type']['rejected'])
+
+
+class RequestStateTests(unittest.TestCase):
+    """ Per-request state can be read from worker threads and tasks """
+
+    def setUp(self):
+        self.app = Flask(__name__)
+        self.app.config['ASK_VERIFY_REQUESTS'] = False
+        self.ask = Ask(app=self.app, route='/ask')
+        self.client = self.app.test_client()
+
+    def post(self, intent_name, user_id='user-1'):
+        envelope = AlexaRequestBuilder().intent(intent_name).user_id(user_id).make()
+        return self.client.post('/ask', data=json.dumps(envelope))
+
+    def run_in_thread(self, func):
+        results = []
+        worker = threading.Thread(target=lambda: results.append(func()))
+        worker.start()
+        worker.join()
+        return results[0]
+
+    def test_copy_ask_context_in_worker_thread(self):
+        @self.ask.intent('FanOutIntent')
+        def fan_out():
+            @copy_ask_context
+            def work():
+                session.attributes['worker'] = True
+                return request.intent.name
+
+            name = self.run_in_thread(work)
+            return statement(name)
+
+        response = json.loads(self.post('FanOutIntent').data.decode('utf-8'))
+        self.assertEqual('FanOutIntent', response['response']['outputSpeech']['text'])
+        self.assertTrue(response['sessionAttributes']['worker'])
+
+    @unittest.skipIf(sys.version_info < (3, 7), 'contextvars needs Python 3.7')
+    def test_copied_contextvars_without_app_context(self):
+        import contextvars
+
+        @self.ask.intent('CopyIntent')
+        def copy():
+            context = contextvars.copy_context()
+            return statement(self.run_in_thread(lambda: context.run(lambda: session.user.userId)))
+
+        response = json.loads(self.post('CopyIntent', user_id='user-7').data.decode('utf-8'))
+        self.assertEqual('user-7', response['response']['outputSpeech']['text'])
+
+    def test_state_does_not_leak_between_requests(self):
+        @self.ask.intent('FirstIntent')
+        def first():
+            session.attributes['secret'] = 1
+            return statement('first')
+
+        @self.ask.intent('SecondIntent')
+        def second():
+            return statement(str(session.attributes.get('secret')))
+
+        self.post('FirstIntent')
+        response = json.loads(self.post('SecondIntent').data.decode('utf-8'))
+        self.assertEqual('None', response['response']['outputSpeech']['text'])
+
+
+@unittest.skipIf(sys.version_info < (3, 5), 'async view functions need Python 3.5')
+class AsyncViewTests(unittest.TestCase):
+    """ async def view functions are awaited by the dispatcher """
+
+    def setUp(self):
+        self.app = Flask(__name__)
+        self.app.config['ASK_VERIFY_REQUESTS'] = False
+        self.ask = Ask(app=self.app, route='/ask')
+        self.client = self.app.test_client()
+
+        namespace = {'statement': statement, 'session': session, 'request': request}
+        exec(
+            'import asyncio\n'
+            'async def lookup(key):\n'
+            '    await asyncio.sleep(0.01)\n'
+            '    return "{}:{}".format(key, session.user.userId)\n'
+            'async def concurrent(city):\n'
+            '    results = await asyncio.gather(lookup("weather"), lookup(city))\n'
+            '    return statement(" ".join(results))\n'
+            'async def launched():\n'
+            '    return statement(request.type)\n',
+            namespace)
+        self.ask.intent('ConcurrentIntent')(namespace['concurrent'])
+        self.ask.launch(namespace['launched'])
+
+    def speech(self, envelope):
+        response = self.client.post('/ask', data=json.dumps(envelope))
+        return json.loads(response.data.decode('utf-8'))['response']['outputSpeech']['text']
+
+    def test_async_intent_runs_calls_concurrently(self):
+        envelope = AlexaRequestBuilder().intent('ConcurrentIntent').slot('city', 'paris').user_id('u1').make()
+        self.assertEqual('weather:u1 paris:u1', self.speech(envelope))
+
+    def test_async_launch(self):
+        envelope = AlexaRequestBuilder().intent('Unused').make()
+        envelope['request']['type'] = 'LaunchRequest'
+        self.assertEqual('LaunchRequest', self.speech(envelope))
+
+    def test_loop_is_reused_by_thread(self):
+        envelope = AlexaRequestBuilder().intent('ConcurrentIntent').slot('city', 'paris').make()
+        self.speech(envelope)
+        from flask_ask import aio
+        loop = aio._loops.loop
+        self.speech(envelope)
+        self.assertIs(loop, aio._loops.loop)
+
+    def test_dispatch_from_running_loop(self):
+        import asyncio
+        envelope = AlexaRequestBuilder().intent('ConcurrentIntent').slot('city', 'rome').user_id('u2').make()
+
+        namespace = {'ask': self.ask, 'envelope': envelope}
+        exec(
+            'async def call():\n'
+            '    return ask.run_aws_lambda_direct(envelope)\n',
+            namespace)
+        call = namespace['call']
+
+        loop = asyncio.new_event_loop()
+        try:
+            response = loop.run_until_complete(call())
+        finally:
+            loop.close()
+        self.assertEqual('weather:u2 rome:u2', response['response']['outputSpeech']['text'])
+
+
+class DeadlineTests(unittest.TestCase):
+    """ View functions that overrun their deadline are answered with a fallback """
+
+    def setUp(self):
+        self.app = Flask(__name__)
+        self.app.config['ASK_VERIFY_REQUESTS'] = False
+        self.ask = Ask(app=self.app, route='/ask')
+        self.client = self.app.test_client()
+        self.release = threading.Event()
+        self.budgets = []
+
+        @self.ask.intent('SlowIntent', deadline=0.05, fallback=statement('still working'))
+        def slow():
+            self.release.wait(2)
+            return statement('done')
+
+        @self.ask.intent('FastIntent')
+        def fast():
+            self.budgets.append(self.ask.remaining_time())
+            return statement('user {}'.format(session.user.userId))
+
+        @self.ask.intent('SkillDeadlineIntent')
+        def skill_deadline():
+            time.sleep(0.2)
+            return statement('late')
+
+    def tearDown(self):
+        self.release.set()
+
+    def speech(self, intent_name):
+        envelope = AlexaRequestBuilder().intent(intent_name).user_id('u1').make()
+        response = self.client.post('/ask', data=json.dumps(envelope))
+        return json.loads(response.data.decode('utf-8'))['response']['outputSpeech']['text']
+
+    def test_deadline_does_not_carry_over_in_a_reused_app_context(self):
+        with self.app.app_context():
+            self.assertEqual('still working', self.speech('SlowIntent'))
+            self.speech('FastIntent')
+        self.assertEqual([None], self.budgets)
+
+    def test_view_with_a_deadline_sees_the_flask_request(self):
+        @self.app.before_request
+        def load_user():
+            g.user = 'alice'
+
+        @self.ask.intent('HeaderIntent', deadline=5)
+        def header():
+            return statement('{} {}'.format(g.user, flask_request.headers['X-Test']))
+
+        envelope = AlexaRequestBuilder().intent('HeaderIntent').make()
+        response = self.client.post('/ask', data=json.dumps(envelope), headers={'X-Test': 'yes'})
+        self.assertEqual('alice yes', json.loads(response.data.decode('utf-8'))['response']['outputSpeech']['text'])
+
+    def test_intent_fallback_answers_immediately(self):
+        start = time.time()
+        self.assertEqual('still working', self.speech('SlowIntent'))
+        self.assertLess(time.time() - start, 1)
+
+        stats = self.ask.deadline_stats.snapshot()['SlowIntent']
+        self.assertEqual(1, stats['rejected'])
+
+    def test_view_within_budget_keeps_its_response(self):
+        self.app.config['ASK_HANDLER_DEADLINE'] = 5
+        self.assertEqual('user u1', self.speech('FastIntent'))
+        self.assertTrue(0 < self.budgets[0] <= 5)
+        self.assertEqual(0, self.ask.deadline_stats.snapshot()['FastIntent']['rejected'])
+
+    def test_no_deadline_by_default(self):
+        self.assertEqual('user u1', self.speech('FastIntent'))
+        self.assertEqual([None], self.budgets)
+        self.assertEqual({}, self.ask.deadline_stats.snapshot())
+
+    def test_skill_fallback_function(self):
+        self.app.config['ASK_HANDLER_DEADLINE'] = 0.05
+
+        @self.ask.deadline_fallback
+        def too_slow():
+            return statement('fallback for {}'.format(request.intent.name))
+
+        self.assertEqual('fallback for SkillDeadlineIntent', self.speech('SkillDeadlineIntent'))
+
+    def test_default_fallback_text(self):
+        self.app.config['ASK_HANDLER_DEADLINE'] = 0.05
+        self.app.config['ASK_DEADLINE_FALLBACK_TEXT'] = 'one moment'
+        self.assertEqual('one moment', self.speech('SkillDeadlineIntent'))
+
+    def test_skill_deadline_skips_requests_without_speech(self):
+        self.app.config['ASK_HANDLER_DEADLINE'] = 0.05
+
+        @self.ask.session_ended
+        def ended():
+            time.sleep(0.2)
+            return "{}", 200
+
+        envelope = AlexaRequestBuilder().make()
+        envelope['request'] = {'type': 'SessionEndedRequest', 'requestId': 'req-1', 'reason': 'USER_INITIATED',
+                               'timestamp': '2019-01-01T00:00:00Z', 'locale': 'en-US'}
+        response = self.client.post('/ask', data=json.dumps(envelope))
+        self.assertEqual(b'{}', response.data)
+        self.assertEqual({}, self.ask.deadline_stats.snapshot())
+
+    def test_fallback_renders_attributes_from_before_the_view(self):
+        @self.ask.intent('ChangingIntent', deadline=0.05, fallback=statement('still working'))
+        def changing():
+            session.attributes['step'] = 'started'
+            self.release.wait(2)
+            return statement('done')
+
+        envelope = AlexaRequestBuilder().intent('ChangingIntent').make()
+        envelope['session']['attributes'] = {'step': 'before'}
+        response = json.loads(self.client.post('/ask', data=json.dumps(envelope)).data.decode('utf-8'))
+        self.assertEqual('still working', response['response']['outputSpeech']['text'])
+        self.assertEqual({'step': 'before'}, response['sessionAttributes'])
+
+
+class CachedCallTests(unittest.TestCase):
+    """ @ask.cached helpers are keyed by their arguments and the request locale """
+
+    def setUp(self):
+        self.app = Flask(__name__)
+        self.app.config['ASK_VERIFY_REQUESTS'] = False
+        self.ask = Ask(app=self.app, route='/ask')
+        self.calls = []
+
+        @self.ask.cached(ttl=60)
+        def lookup(city):
+            self.calls.append((city, request.locale))
+            return '{} in {}'.format(city, request.locale)
+
+        @self.ask.intent('CityIntent')
+        def city(city):
+            return statement(lookup(city))
+
+    def tearDown(self):
+        self.ask.call_cache.close()
+
+    def post(self, city, locale='en-US'):
+        envelope = AlexaRequestBuilder().intent('CityIntent').slot('city', city).locale(locale).make()
+        response = self.app.test_client().post('/ask', data=json.dumps(envelope))
+        return json.loads(response.data.decode('utf-8'))['response']['outputSpeech']['text']
+
+    def test_results_are_cached_per_arguments_and_locale(self):
+        self.assertEqual('Paris in en-US', self.post('Paris'))
+        self.assertEqual('Paris in en-US', self.post('Paris'))
+        self.assertEqual('Paris in fr-FR', self.post('Paris', locale='fr-FR'))
+        self.assertEqual('Rome in en-US', self.post('Rome'))
+        self.assertEqual([('Paris', 'en-US'), ('Paris', 'fr-FR'), ('Rome', 'en-US')], self.calls)
+
+    def test_keyword_arguments_are_part_of_the_key(self):
+        @self.ask.cached(ttl=60)
+        def forecast(city, units='metric'):
+            self.calls.append((city, units))
+            return units
+
+        with self.app.app_context():
+            self.assertEqual('metric', forecast('Paris', units='metric'))
+            self.assertEqual('imperial', forecast('Paris', units='imperial'))
+            self.assertEqual('imperial', forecast('Paris', units='imperial'))
+        self.assertEqual([('Paris', 'metric'), ('Paris', 'imperial')], self.calls)
+
+    def test_custom_key(self):
+        @self.ask.cached(ttl=60, key=lambda city, client: city.lower())
+        def forecast(city, client):
+            self.calls.append(city)
+            return city
+
+        with self.app.app_context():
+            self.assertEqual('Paris', forecast('Paris', object()))
+            self.assertEqual('Paris', forecast('PARIS', object()))
+        self.assertEqual(['Paris'], self.calls)
+
+
+class HookTests(unittest.TestCase):
+    """ before_verify, after_parse, before_dispatch and after_render hooks run in order and are timed """
+
+    def setUp(self):
+        self.app = Flask(__name__)
+        self.app.config['ASK_VERIFY_REQUESTS'] = False
+        self.ask = Ask(app=self.app, route='/ask')
+        self.client = self.app.test_client()
+        self.calls = []
+        self.stop_at = None
+
+        @self.ask.before_verify
+        def throttle():
+            self.calls.append('before_verify')
+            if self.stop_at == 'before_verify':
+                return 'Too Many Requests', 429
+
+        @self.ask.after_parse
+        def check(payload):
+            self.calls.append(('after_parse', payload['request']['requestId']))
+            if self.stop_at == 'after_parse':
+                return 'Unauthorized', 401
+
+        @self.ask.before_dispatch
+        def subscribed():
+            self.calls.append(('before_dispatch', request.intent.name))
+            if self.stop_at == 'before_dispatch':
+                return statement('subscribe first')
+
+        @self.ask.after_render
+        def observe(response):
+            self.calls.append('after_render')
+
+        @self.ask.after_render
+        def add_header(response):
+            response = self.app.make_response(response)
+            response.headers['X-Hooked'] = 'yes'
+            return response
+
+        @self.ask.intent('HookIntent')
+        def hooked():
+            self.calls.append('view')
+            return statement('hooked')
+
+    def post(self):
+        envelope = AlexaRequestBuilder().intent('HookIntent').request_id('req-7').make()
+        return self.client.post('/ask', data=json.dumps(envelope))
+
+    def test_hooks_run_in_order(self):
+        response = self.post()
+        self.assertEqual(200, response.status_code)
+        self.assertEqual('yes', response.headers['X-Hooked'])
+        self.assertEqual(['before_verify', ('after_parse', 'req-7'), ('before_dispatch', 'HookIntent'), 'view',
+                          'after_render'], self.calls)
+
+        stats = self.ask.hook_stats.snapshot()
+        self.assertEqual(['after_parse.check', 'after_render.add_header', 'after_render.observe',
+                          'before_dispatch.subscribed', 'before_verify.throttle'], sorted(stats))
+        self.assertEqual(1, stats['after_render.add_header']['calls'])
+        self.assertEqual(0, stats['after_render.add_header']['rejected'])
+
+    def test_before_verify_stops_the_request(self):
+        self.stop_at = 'before_verify'
+        self.assertEqual(429, self.post().status_code)
+        self.assertEqual(['before_verify'], self.calls)
+        self.assertEqual(1, self.ask.hook_stats.snapshot()['before_verify.throttle']['rejected'])
+
+    def test_after_parse_stops_the_request(self):
+        self.stop_at = 'after_parse'
+        response = self.post()
+        self.assertEqual(401, response.status_code)
+        self.assertEqual('yes', response.headers['X-Hooked'])
+        self.assertNotIn('view', self.calls)
+
+    def test_before_dispatch_replaces_the_view(self):
+        self.stop_at = 'before_dispatch'
+        response = self.post()
+        body = json.loads(response.data.decode('utf-8'))
+        self.assertEqual('subscribe first', body['response']['outputSpeech']['text'])
+        self.assertNotIn('view', self.calls)
+
+    def test_failing_hook_is_recorded(self):
+        @self.ask.after_parse
+        def broken(payload):
+            raise ValueError('broken')
+
+        with self.assertRaises(ValueError):
+            self.ask.run_aws_lambda_direct(AlexaRequestBuilder().intent('HookIntent').make())
+        self.assertEqual(1, self.ask.hook_stats.snapshot()['after_parse.broken']['rejected'])
+
+    @unittest.skipIf(sys.version_info < (3, 5), 'async hooks need Python 3.5')
+    def test_async_hooks_are_awaited(self):
+        namespace = {'statement': statement, 'calls': self.calls}
+        exec(
+            'async def gate(payload):\n'
+            '    calls.append("async after_parse")\n'
+            '    return "Unauthorized", 401\n',
+            namespace)
+        self.ask.after_parse(namespace['gate'])
+
+        self.assertEqual(401, self.post().status_code)
+        self.assertIn('async after_parse', self.calls)
+        self.assertNotIn('view', self.calls)
+        self.assertEqual(1, self.ask.hook_stats.snapshot()['after_parse.gate']['rejected'])
+
+    def test_lambda_direct_runs_hooks_but_before_verify(self):
+        self.ask._hooks['after_render'].pop()
+        response = self.ask.run_aws_lambda_direct(AlexaRequestBuilder().intent('HookIntent').make())
+        self.assertEqual('hooked', response['response']['outputSpeech']['text'])
+        self.assertEqual(['after_parse', 'before_dispatch', 'view', 'after_render'],
+                         [call[0] if isinstance(call, tuple) else call for call in self.calls])
+
+
+class LambdaDirectTests(unittest.TestCase):
+    """ run_aws_lambda_direct dispatches event dicts without going through WSGI """
+
+    def setUp(self):
+        self.app = Flask(__name__)
+        self.ask = Ask(app=self.app, route='/')
+
+        @self.ask.intent('GreetIntent', convert={'count': int})
+        def greet(name, count):
+            session.attributes['name'] = name
+            return statement('hello {} {}'.format(name, count))
+
+        @self.ask.intent('RawIntent')
+        def raw():
+            return '{"raw": true}'
+
+        @self.ask.intent('FailIntent')
+        def fail():
+            return 'nope', 500
+
+    def envelope(self, intent_name, **slots):
+        builder = AlexaRequestBuilder().intent(intent_name)
+        for slot_name, value in slots.items():
+            builder.slot(slot_name, value)
+        return builder.make()
+
+    def test_matches_wsgi_path(self):
+        event = self.envelope('GreetIntent', name='ada', count='3')
+        direct = self.ask.run_aws_lambda_direct(event)
+        self.assertEqual(self.ask.run_aws_lambda(event), json.loads(json.dumps(direct)))
+        self.assertEqual('hello ada 3', direct['response']['outputSpeech']['text'])
+        self.assertEqual('ada', direct['sessionAttributes']['name'])
+
+    def test_other_results_are_converted(self):
+        self.assertEqual({'raw': True}, self.ask.run_aws_lambda_direct(self.envelope('RawIntent')))
+
+    def test_session_ended_without_handler(self):
+        event = self.envelope('GreetIntent')
+        event['request'] = {'type': 'SessionEndedRequest', 'requestId': 'req-1', 'reason': 'USER_INITIATED'}
+        self.assertEqual({}, self.ask.run_aws_lambda_direct(event))
+
+    def test_error_status_raises(self):
+        with self.assertRaises(AssertionError):
+            self.ask.run_aws_lambda_direct(self.envelope('FailIntent'))
+
+    def test_response_cache(self):
+        self.app.config['ASK_RESPONSE_CACHE'] = True
+        event = AlexaRequestBuilder().intent('GreetIntent').request_id('req-1').slot('name', 'ada').make()
+        first = self.ask.run_aws_lambda_direct(event)
+        event['request']['intent']['slots']['name']['value'] = 'bob'
+        self.assertEqual(first, self.ask.run_aws_lambda_direct(event))
+
+
+if __name__ == '__main__':
+    unittest.main()
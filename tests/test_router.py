@@ -0,0 +1,145 @@
+import unittest
+import json
+import os
+import shutil
+import tempfile
+
+from mock import patch
+from flask import Flask, render_template
+
+from flask_ask import Ask, SkillRouter, statement, session
+from flask_ask.core import YamlLoader
+from flask_ask.test import AlexaRequestBuilder
+from flask_ask.verifier import VerificationError, verify_application_id
+
+
+class SkillRouterTests(unittest.TestCase):
+    """ One app serves several skills, routed by applicationId """
+
+    def setUp(self):
+        self.app = Flask(__name__)
+        self.app.config['ASK_VERIFY_REQUESTS'] = False
+        self.router = SkillRouter(self.app, '/ask')
+        self.client = self.app.test_client()
+
+        self.tides = Ask()
+        self.router.add_skill(self.tides, 'amzn1.ask.skill.tides')
+        self.weather = Ask()
+        self.router.add_skill(self.weather, ['amzn1.ask.skill.weather', 'amzn1.ask.skill.weather-beta'])
+
+        @self.tides.intent('HelloIntent')
+        def tides_hello():
+            session.attributes['skill'] = 'tides'
+            return statement('tides')
+
+        @self.weather.intent('HelloIntent')
+        def weather_hello():
+            return statement('weather')
+
+    def post(self, application_id):
+        envelope = AlexaRequestBuilder().intent('HelloIntent').application_id(application_id).make()
+        return self.client.post('/ask', data=json.dumps(envelope))
+
+    def speech(self, response):
+        return json.loads(response.data.decode('utf-8'))['response']['outputSpeech']['text']
+
+    def test_requests_are_routed_by_application_id(self):
+        self.assertEqual('tides', self.speech(self.post('amzn1.ask.skill.tides')))
+        self.assertEqual('weather', self.speech(self.post('amzn1.ask.skill.weather')))
+        self.assertEqual('weather', self.speech(self.post('amzn1.ask.skill.weather-beta')))
+
+    def test_unknown_application_id_is_rejected(self):
+        with self.app.test_request_context():
+            with self.assertRaises(VerificationError):
+                self.router.skill_for('amzn1.ask.skill')
+
+    def test_skills_keep_their_own_stream_cache(self):
+        self.assertIsNot(self.tides.stream_cache, self.weather.stream_cache)
+
+    def test_application_id_cannot_move_between_skills(self):
+        with self.assertRaises(ValueError):
+            self.router.add_skill(Ask(), 'amzn1.ask.skill.tides')
+
+    def test_payload_without_application_id_is_bad_request(self):
+        envelope = AlexaRequestBuilder().intent('HelloIntent').make()
+        del envelope['session']
+        del envelope['context']
+        self.assertEqual(400, self.client.post('/ask', data=json.dumps(envelope)).status_code)
+
+
+class SkillTemplateTests(unittest.TestCase):
+    """ Each skill renders from its own templates file """
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        for name in ('tides', 'weather'):
+            with open(os.path.join(self.root, name + '.yaml'), 'w') as f:
+                f.write('hello: {} says hello\n'.format(name))
+
+        self.router = SkillRouter(route='/ask')
+        self.tides = Ask()
+        self.weather = Ask()
+        # skills may be added before the app is known
+        self.router.add_skill(self.tides, 'amzn1.ask.skill.tides', path='tides.yaml')
+        self.router.add_skill(self.weather, 'amzn1.ask.skill.weather', path='weather.yaml')
+
+        self.app = Flask(__name__, root_path=self.root)
+        self.app.config['ASK_VERIFY_REQUESTS'] = False
+        self.router.init_app(self.app)
+
+        @self.tides.intent('HelloIntent')
+        def tides_hello():
+            return statement(render_template('hello'))
+
+        @self.weather.intent('HelloIntent')
+        def weather_hello():
+            return statement(render_template('hello'))
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def speech(self, application_id):
+        envelope = AlexaRequestBuilder().intent('HelloIntent').application_id(application_id).make()
+        response = self.app.test_client().post('/ask', data=json.dumps(envelope))
+        return json.loads(response.data.decode('utf-8'))['response']['outputSpeech']['text']
+
+    def test_same_template_name_in_two_skills(self):
+        self.assertEqual('tides says hello', self.speech('amzn1.ask.skill.tides'))
+        self.assertEqual('weather says hello', self.speech('amzn1.ask.skill.weather'))
+        self.assertEqual('tides says hello', self.speech('amzn1.ask.skill.tides'))
+
+    def test_templates_are_compiled_once_per_skill(self):
+        with patch('flask_ask.router.YamlLoader.get_source', autospec=True,
+                   side_effect=YamlLoader.get_source) as get_source:
+            for _ in range(5):
+                self.speech('amzn1.ask.skill.tides')
+                self.speech('amzn1.ask.skill.weather')
+        self.assertEqual(2, get_source.call_count)
+        self.assertFalse(self.app.jinja_env.auto_reload)
+
+    def test_skills_share_the_certificate_objects(self):
+        self.app.config['ASK_VERIFY_REQUESTS'] = True
+        with patch('flask_ask.core.Ask._verify_request'):
+            self.speech('amzn1.ask.skill.tides')
+            self.speech('amzn1.ask.skill.weather')
+        self.assertIs(self.tides._cert_cache, self.weather._cert_cache)
+        self.assertIs(self.tides._cert_fetcher, self.weather._cert_fetcher)
+        self.assertIs(self.tides._chain_validator, self.weather._chain_validator)
+
+
+class VerifyApplicationIdTests(unittest.TestCase):
+    """ Application IDs must match exactly """
+
+    def test_string_is_not_a_substring_match(self):
+        verify_application_id('amzn1.ask.skill.a', 'amzn1.ask.skill.a')
+        with self.assertRaises(VerificationError):
+            verify_application_id('skill', 'amzn1.ask.skill.a')
+
+    def test_collection(self):
+        verify_application_id('b', frozenset(['a', 'b']))
+        with self.assertRaises(VerificationError):
+            verify_application_id('c', ['a', 'b'])
+
+
+if __name__ == '__main__':
+    unittest.main()
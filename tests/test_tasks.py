@@ -0,0 +1,169 @@
+import unittest
+import json
+import threading
+
+from mock import patch
+from flask import Flask
+
+from flask_ask import Ask, statement, session, request
+from flask_ask.tasks import TaskQueue
+from flask_ask.test import AlexaRequestBuilder
+
+
+class TaskQueueTests(unittest.TestCase):
+
+    def test_tasks_run_in_the_background(self):
+        queue = TaskQueue()
+        done = []
+        self.assertTrue(queue.submit(done.append, 1))
+        self.assertTrue(queue.drain(5))
+        self.assertEqual([1], done)
+        self.assertEqual(1, queue.completed)
+
+    def test_failures_are_logged(self):
+        queue = TaskQueue()
+        with patch('flask_ask.tasks.logger') as logger:
+            queue.submit(lambda: 1 / 0)
+            queue.drain(5)
+        self.assertTrue(logger.exception.called)
+        self.assertEqual(1, queue.failed)
+
+    def test_full_queue_runs_tasks_on_the_caller(self):
+        queue = TaskQueue(max_workers=1, max_queued=1)
+        release = threading.Event()
+        threads = []
+        queue.submit(release.wait, 5)
+        queue.submit(release.wait, 5)
+        queue.submit(lambda: threads.append(threading.current_thread()))
+        self.assertEqual([threading.current_thread()], threads)
+        self.assertEqual(1, queue.overflowed)
+        release.set()
+        queue.drain(5)
+
+    def test_full_queue_drops_tasks(self):
+        queue = TaskQueue(max_workers=1, max_queued=0, overflow='drop')
+        release = threading.Event()
+        done = []
+        queue.submit(release.wait, 5)
+        with patch('flask_ask.tasks.logger') as logger:
+            self.assertFalse(queue.submit(done.append, 1))
+        self.assertTrue(logger.warning.called)
+        release.set()
+        queue.drain(5)
+        self.assertEqual([], done)
+
+    def test_drain_times_out(self):
+        queue = TaskQueue()
+        release = threading.Event()
+        queue.submit(release.wait, 5)
+        self.assertFalse(queue.drain(0.05))
+        release.set()
+        self.assertTrue(queue.drain(5))
+
+    def test_close_waits_and_rejects_new_tasks(self):
+        queue = TaskQueue()
+        done = []
+        queue.submit(done.append, 1)
+        self.assertTrue(queue.close(5))
+        self.assertEqual([1], done)
+        with patch('flask_ask.tasks.logger'):
+            self.assertFalse(queue.submit(done.append, 2))
+
+    def test_close_gives_up_on_a_hung_task(self):
+        queue = TaskQueue()
+        release = threading.Event()
+        queue.submit(release.wait, 5)
+        self.assertFalse(queue.close(0.05))
+        # the thread running it does not keep the interpreter from exiting
+        self.assertTrue(all(worker.daemon for worker in queue._workers))
+        release.set()
+
+    def test_unknown_overflow(self):
+        with self.assertRaises(ValueError):
+            TaskQueue(overflow='block')
+
+
+class AfterResponseTests(unittest.TestCase):
+    """ ask.after_response queues work once the response is built """
+
+    def setUp(self):
+        self.app = Flask(__name__)
+        self.app.config['ASK_VERIFY_REQUESTS'] = False
+        self.queue = TaskQueue()
+        self.ask = Ask(app=self.app, route='/ask', task_queue=self.queue)
+        self.done = []
+
+        def record(label):
+            self.done.append((label, request.requestId, session.attributes.get('seen')))
+
+        @self.ask.intent('WorkIntent')
+        def work():
+            session.attributes['seen'] = True
+            self.ask.after_response(record, 'first')
+            self.ask.after_response(record, label='second')
+            # nothing runs before the view function returns
+            self.assertEqual([], self.done)
+            return statement('done')
+
+        @self.ask.intent('FailIntent')
+        def fail():
+            self.ask.after_response(record, 'never')
+            raise ValueError('failed')
+
+    def tearDown(self):
+        self.queue.close()
+
+    def envelope(self, intent):
+        return AlexaRequestBuilder().intent(intent).request_id('req-3').make()
+
+    def test_work_runs_with_the_request_state(self):
+        response = self.app.test_client().post('/ask', data=json.dumps(self.envelope('WorkIntent')))
+        self.assertEqual(200, response.status_code)
+        self.assertTrue(self.queue.drain(5))
+        self.assertEqual([('first', 'req-3', True), ('second', 'req-3', True)], sorted(self.done))
+
+    def test_lambda_direct(self):
+        self.ask.run_aws_lambda_direct(self.envelope('WorkIntent'))
+        self.assertTrue(self.queue.drain(5))
+        self.assertEqual(2, len(self.done))
+
+    def test_nothing_runs_when_the_request_fails(self):
+        with self.assertRaises(ValueError):
+            self.ask.run_aws_lambda_direct(self.envelope('FailIntent'))
+        self.assertTrue(self.queue.drain(5))
+        self.assertEqual([], self.done)
+
+    def test_work_queued_by_queued_work_runs(self):
+        second_done = threading.Event()
+
+        def first():
+            self.done.append('first')
+            self.ask.after_response(lambda: (self.done.append(request.requestId), second_done.set()))
+
+        @self.ask.intent('ChainIntent')
+        def chain():
+            self.ask.after_response(first)
+            return statement('done')
+
+        self.ask.run_aws_lambda_direct(self.envelope('ChainIntent'))
+        self.assertTrue(second_done.wait(5))
+        self.assertEqual(['first', 'req-3'], self.done)
+
+    def test_each_request_in_a_reused_app_context_waits_for_its_response(self):
+        with self.app.app_context():
+            for _ in range(2):
+                del self.done[:]
+                response = self.app.test_client().post('/ask', data=json.dumps(self.envelope('WorkIntent')))
+                self.assertEqual(200, response.status_code)
+                self.assertTrue(self.queue.drain(5))
+                self.assertEqual(2, len(self.done))
+
+    def test_outside_of_a_request(self):
+        with self.app.app_context():
+            self.ask.after_response(self.done.append, 1)
+        self.assertTrue(self.queue.drain(5))
+        self.assertEqual([1], self.done)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+import unittest
+import threading
+
+from six.moves import BaseHTTPServer, socketserver
+
+from flask_ask.transport import ConnectionPool
+
+
+class _Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        body = self.path.encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class _Server(socketserver.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+    connections = 0
+
+    def process_request(self, request, client_address):
+        self.connections += 1
+        BaseHTTPServer.HTTPServer.process_request(self, request, client_address)
+
+
+class ConnectionPoolTests(unittest.TestCase):
+    """ Exercise the pool against a local keep-alive HTTP server. """
+
+    def setUp(self):
+        self.server = _Server(('127.0.0.1', 0), _Handler)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        self.url = 'http://127.0.0.1:{}'.format(self.server.server_address[1])
+        self.pool = ConnectionPool(connect_timeout=1, read_timeout=1)
+
+    def tearDown(self):
+        self.pool.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_connection_is_reused(self):
+        first = self.pool.request('GET', self.url + '/one')
+        second = self.pool.request('GET', self.url + '/two?x=1')
+
+        self.assertEqual(200, first.status)
+        self.assertEqual(b'/one', first.data)
+        self.assertEqual(b'/two?x=1', second.data)
+        self.assertEqual(1, self.server.connections)
+
+    def test_closed_idle_connection_is_replaced(self):
+        self.pool.request('GET', self.url + '/one')
+        for connections in self.pool._idle.values():
+            for conn in connections:
+                conn.sock.close()
+        response = self.pool.request('GET', self.url + '/two')
+        self.assertEqual(b'/two', response.data)
+
+
+if __name__ == '__main__':
+    unittest.main()
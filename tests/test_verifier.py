@@ -0,0 +1,380 @@
+import unittest
+import base64
+import datetime
+import os
+import shutil
+import tempfile
+import threading
+import time
+from functools import partial
+
+from mock import Mock, patch
+from cryptography import x509
+from cryptography.x509.oid import NameOID
+from cryptography.hazmat.backends import default_backend
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import rsa, padding
+
+from flask import Flask
+
+from flask_ask import Ask, verifier
+
+
+CERT_URL = 'https://s3.amazonaws.com/echo.api/echo-api-cert.pem'
+
+
+def make_certificate(days=30, san='echo-api.amazon.com', common_name=u'echo-api.amazon.com',
+                     issuer=None, ca=False):
+    """ Build a PEM certificate shaped like the Alexa signing certificate, self-signed unless
+    an issuer (key, pem) pair is given. """
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048, backend=default_backend())
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, common_name)])
+    issuer_key, issuer_name = key, name
+    if issuer is not None:
+        issuer_key = issuer[0]
+        issuer_name = x509.load_pem_x509_certificate(issuer[1], default_backend()).subject
+    now = datetime.datetime.utcnow()
+    builder = x509.CertificateBuilder() \
+        .subject_name(name) \
+        .issuer_name(issuer_name) \
+        .public_key(key.public_key()) \
+        .serial_number(x509.random_serial_number()) \
+        .not_valid_before(now - datetime.timedelta(days=1)) \
+        .not_valid_after(now + datetime.timedelta(days=days)) \
+        .add_extension(x509.BasicConstraints(ca=ca, path_length=None), critical=True)
+    if san is not None:
+        builder = builder.add_extension(x509.SubjectAlternativeName([x509.DNSName(san)]), critical=False)
+    cert = builder.sign(issuer_key, hashes.SHA256(), default_backend())
+    return key, cert.public_bytes(serialization.Encoding.PEM)
+
+
+class StubFetcher(object):
+    """ Local stand-in for verifier.CertificateFetcher. """
+
+    def __init__(self, pem):
+        self.pem = pem
+        self.call_count = 0
+
+    def fetch(self, cert_url):
+        self.call_count += 1
+        return self.pem
+
+
+class CertificateCacheTests(unittest.TestCase):
+
+    def setUp(self):
+        self.key, self.pem = make_certificate()
+        self.fetcher = StubFetcher(self.pem)
+
+    def test_certificate_is_downloaded_once(self):
+        cache = verifier.CertificateCache()
+        first = verifier.load_certificate(CERT_URL, cache=cache, fetcher=self.fetcher)
+        second = verifier.load_certificate(CERT_URL, cache=cache, fetcher=self.fetcher)
+
+        self.assertIs(first, second)
+        self.assertEqual(1, self.fetcher.call_count)
+        self.assertEqual(1, cache.hits)
+        self.assertEqual(1, cache.misses)
+
+    def test_cache_key_is_normalized(self):
+        cache = verifier.CertificateCache()
+        verifier.load_certificate(CERT_URL, cache=cache, fetcher=self.fetcher)
+        verifier.load_certificate('HTTPS://s3.amazonaws.com:443/echo.api/../echo.api/echo-api-cert.pem',
+                                  cache=cache, fetcher=self.fetcher)
+        self.assertEqual(1, self.fetcher.call_count)
+
+    def test_invalidate_forces_download(self):
+        cache = verifier.CertificateCache()
+        verifier.load_certificate(CERT_URL, cache=cache, fetcher=self.fetcher)
+        cache.invalidate(CERT_URL)
+        verifier.load_certificate(CERT_URL, cache=cache, fetcher=self.fetcher)
+        self.assertEqual(2, self.fetcher.call_count)
+
+    def test_ttl_expires_entries(self):
+        cache = verifier.CertificateCache(ttl=-1)
+        verifier.load_certificate(CERT_URL, cache=cache, fetcher=self.fetcher)
+        verifier.load_certificate(CERT_URL, cache=cache, fetcher=self.fetcher)
+        self.assertEqual(2, self.fetcher.call_count)
+
+    def test_max_size_evicts_least_recently_used(self):
+        cache = verifier.CertificateCache(max_size=1)
+        expiry = datetime.datetime.utcnow() + datetime.timedelta(days=1)
+        cache.set('https://s3.amazonaws.com/echo.api/a.pem', 'a', expiry)
+        cache.set('https://s3.amazonaws.com/echo.api/b.pem', 'b', expiry)
+        self.assertEqual(1, len(cache))
+        self.assertIsNone(cache.get('https://s3.amazonaws.com/echo.api/a.pem'))
+        self.assertEqual('b', cache.get('https://s3.amazonaws.com/echo.api/b.pem'))
+
+    def test_invalid_certificate_is_not_cached(self):
+        _, self.fetcher.pem = make_certificate(san='example.com')
+        cache = verifier.CertificateCache()
+        with self.assertRaises(verifier.VerificationError):
+            verifier.load_certificate(CERT_URL, cache=cache, fetcher=self.fetcher)
+        self.assertEqual(0, len(cache))
+
+
+class SignatureTests(unittest.TestCase):
+
+    def setUp(self):
+        self.key, pem = make_certificate()
+        self.cert = verifier.SigningCertificate.from_pem(pem)
+        self.body = b'{"request": {"type": "LaunchRequest"}}'
+
+    def sign(self, algorithm):
+        return base64.b64encode(self.key.sign(self.body, padding.PKCS1v15(), algorithm))
+
+    def test_sha1_signature(self):
+        verifier.verify_signature(self.cert, self.sign(hashes.SHA1()), self.body)
+
+    def test_sha256_signature(self):
+        verifier.verify_signature(self.cert, self.sign(hashes.SHA256()), self.body, 'sha256')
+
+    def test_digest_must_match(self):
+        with self.assertRaises(verifier.VerificationError):
+            verifier.verify_signature(self.cert, self.sign(hashes.SHA1()), self.body, 'sha256')
+
+    def test_tampered_body_is_rejected(self):
+        signature = self.sign(hashes.SHA256())
+        with self.assertRaises(verifier.VerificationError):
+            verifier.verify_signature(self.cert, signature, self.body + b' ', 'sha256')
+
+    def test_garbage_signature_is_rejected(self):
+        with self.assertRaises(verifier.VerificationError):
+            verifier.verify_signature(self.cert, 'not base64!', self.body)
+
+    def test_plain_certificate_is_accepted(self):
+        verifier.verify_signature(self.cert.cert, self.sign(hashes.SHA1()), self.body)
+
+
+class ChainValidatorTests(unittest.TestCase):
+
+    def setUp(self):
+        self.root = make_certificate(common_name=u'Test Root', san=None, ca=True)
+        self.intermediate = make_certificate(common_name=u'Test Intermediate', san=None, ca=True,
+                                             issuer=self.root)
+        self.leaf = make_certificate(issuer=self.intermediate)
+        self.validator = verifier.ChainValidator(verifier._load_pem_certificates(self.root[1]))
+        self.served = self.leaf[1] + self.intermediate[1]
+
+    def test_chain_to_trusted_root_is_valid(self):
+        fetcher = StubFetcher(self.served)
+        cert = verifier.load_certificate(CERT_URL, fetcher=fetcher, chain_validator=self.validator)
+        self.assertEqual(2, len(cert.chain))
+
+    def test_result_is_memoized(self):
+        chain = verifier.SigningCertificate.from_pem(self.served).chain
+        self.validator.validate(chain)
+        with patch.object(self.validator, '_validate_chain') as walk:
+            self.validator.validate(chain)
+        self.assertFalse(walk.called)
+        self.assertEqual(1, self.validator.hits)
+
+    def test_untrusted_root_is_rejected(self):
+        other_root = make_certificate(common_name=u'Test Root', san=None, ca=True)
+        validator = verifier.ChainValidator(verifier._load_pem_certificates(other_root[1]))
+        with self.assertRaises(verifier.VerificationError):
+            validator.validate(verifier.SigningCertificate.from_pem(self.served).chain)
+
+    def test_missing_intermediate_is_rejected(self):
+        fetcher = StubFetcher(self.leaf[1])
+        with self.assertRaises(verifier.VerificationError):
+            verifier.load_certificate(CERT_URL, fetcher=fetcher, chain_validator=self.validator)
+
+    def test_non_ca_issuer_is_rejected(self):
+        rogue = make_certificate(common_name=u'Rogue', san=None, issuer=self.root)
+        leaf = make_certificate(issuer=rogue)
+        with self.assertRaises(verifier.VerificationError):
+            self.validator.validate(verifier.SigningCertificate.from_pem(leaf[1] + rogue[1]).chain)
+
+    def test_chain_ending_with_cross_signed_root_is_valid(self):
+        # the bundle ends with "Test Root" cross-signed by a legacy root that is no longer trusted
+        legacy = make_certificate(common_name=u'Legacy Root', san=None, ca=True)
+        cross_signed = self._reissue(self.root, legacy)
+        chain = verifier.SigningCertificate.from_pem(self.served + cross_signed).chain
+        self.validator.validate(chain)
+
+    def test_chain_issued_by_trusted_root_part_way_is_valid(self):
+        expired_extra = make_certificate(common_name=u'Extra', san=None, ca=True, days=-1)
+        chain = verifier.SigningCertificate.from_pem(self.served + expired_extra[1]).chain
+        self.validator.validate(chain)
+
+    def test_missing_trust_store_is_reported_once(self):
+        app = Flask(__name__)
+        app.config['ASK_CERT_TRUST_STORE'] = os.path.join(tempfile.mkdtemp(), 'missing.pem')
+        ask = Ask(app=app, route='/ask')
+        with app.app_context(), patch('flask_ask.core.logger') as logger, \
+                patch('flask_ask.verifier.load_trust_store', wraps=verifier.load_trust_store) as load:
+            for _ in range(2):
+                with self.assertRaises(verifier.VerificationError):
+                    ask.chain_validator
+        self.assertEqual(1, load.call_count)
+        self.assertEqual(1, logger.error.call_count)
+
+    def _reissue(self, cert, issuer):
+        """ Returns cert's subject and key signed by issuer instead. """
+        key, pem = cert
+        original = x509.load_pem_x509_certificate(pem, default_backend())
+        issuer_cert = x509.load_pem_x509_certificate(issuer[1], default_backend())
+        now = datetime.datetime.utcnow()
+        reissued = x509.CertificateBuilder() \
+            .subject_name(original.subject) \
+            .issuer_name(issuer_cert.subject) \
+            .public_key(key.public_key()) \
+            .serial_number(x509.random_serial_number()) \
+            .not_valid_before(now - datetime.timedelta(days=1)) \
+            .not_valid_after(now + datetime.timedelta(days=30)) \
+            .add_extension(x509.BasicConstraints(ca=True, path_length=None), critical=True) \
+            .sign(issuer[0], hashes.SHA256(), default_backend())
+        return reissued.public_bytes(serialization.Encoding.PEM)
+
+
+class DiskCertificateStoreTests(unittest.TestCase):
+
+    def setUp(self):
+        self.path = os.path.join(tempfile.mkdtemp(), 'certs')
+        self.store = verifier.DiskCertificateStore(self.path)
+        _, self.pem = make_certificate()
+        self.fetcher = StubFetcher(self.pem)
+
+    def tearDown(self):
+        shutil.rmtree(os.path.dirname(self.path))
+
+    def test_store_is_consulted_before_the_network(self):
+        verifier.load_certificate(CERT_URL, fetcher=self.fetcher, store=self.store)
+        # a new process starts with an empty memory cache but shares the directory
+        other_store = verifier.DiskCertificateStore(self.path)
+        cert = verifier.load_certificate(CERT_URL, cache=verifier.CertificateCache(),
+                                         fetcher=self.fetcher, store=other_store)
+
+        self.assertIsNotNone(cert)
+        self.assertEqual(1, self.fetcher.call_count)
+        self.assertEqual([], [name for name in os.listdir(self.path) if name.endswith('.tmp')])
+
+    def test_failed_validation_is_not_stored(self):
+        _, self.fetcher.pem = make_certificate(san='example.com')
+        for _ in range(2):
+            with self.assertRaises(verifier.VerificationError):
+                verifier.load_certificate(CERT_URL, fetcher=self.fetcher, store=self.store)
+        self.assertEqual(2, self.fetcher.call_count)
+        self.assertEqual([], os.listdir(self.path))
+
+    def test_stored_certificates_are_validated_again(self):
+        # anyone able to write to the directory could plant a certificate of their own
+        _, attacker = make_certificate(san='attacker.example.com', common_name=u'attacker')
+        self.store.set(CERT_URL, attacker, datetime.datetime.utcnow() + datetime.timedelta(days=1))
+        with patch('flask_ask.verifier.logger'):
+            cert = verifier.load_certificate(CERT_URL, fetcher=self.fetcher, store=self.store)
+        self.assertEqual(self.pem, cert.cert.public_bytes(serialization.Encoding.PEM))
+        self.assertEqual(1, self.fetcher.call_count)
+
+    def test_stored_chains_are_checked_against_the_trust_store(self):
+        verifier.load_certificate(CERT_URL, fetcher=self.fetcher, store=self.store)
+        _, other_root = make_certificate(ca=True, common_name=u'Other Root')
+        validator = verifier.ChainValidator(verifier._load_pem_certificates(other_root))
+        with patch('flask_ask.verifier.logger'):
+            with self.assertRaises(verifier.VerificationError):
+                verifier.load_certificate(CERT_URL, fetcher=self.fetcher, store=self.store, chain_validator=validator)
+        self.assertEqual(2, self.fetcher.call_count)
+
+    def test_directory_is_private(self):
+        self.assertEqual(0o700, os.stat(self.path).st_mode & 0o777)
+
+    @unittest.skipIf(not hasattr(os, 'getuid'), 'POSIX permissions only')
+    def test_shared_directories_are_refused(self):
+        os.chmod(self.path, 0o777)
+        with self.assertRaises(verifier.VerificationError):
+            verifier.DiskCertificateStore(self.path)
+        with patch('os.getuid', return_value=os.getuid() + 1):
+            os.chmod(self.path, 0o700)
+            with self.assertRaises(verifier.VerificationError):
+                verifier.DiskCertificateStore(self.path)
+
+    def test_expired_entries_are_ignored(self):
+        expired = datetime.datetime.utcnow() - datetime.timedelta(seconds=1)
+        self.store.set(CERT_URL, self.pem, expired)
+        self.assertIsNone(self.store.get(CERT_URL))
+
+    def test_corrupt_entries_are_ignored(self):
+        with open(self.store._filename(CERT_URL), 'w') as f:
+            f.write('{not json')
+        self.assertIsNone(self.store.get(CERT_URL))
+
+
+class CertificateRefresherTests(unittest.TestCase):
+
+    def setUp(self):
+        _, self.pem = make_certificate()
+        self.fetcher = StubFetcher(self.pem)
+
+    def test_certificates_are_warmed_at_init_app(self):
+        trust_store = tempfile.NamedTemporaryFile(suffix='.pem', delete=False)
+        trust_store.write(self.pem)
+        trust_store.close()
+        self.addCleanup(os.remove, trust_store.name)
+
+        app = Flask(__name__)
+        app.config['ASK_CERT_PREWARM_URLS'] = [CERT_URL]
+        app.config['ASK_CERT_TRUST_STORE'] = trust_store.name
+        ask = Ask(app=app, route='/ask', cert_fetcher=self.fetcher)
+        self.addCleanup(ask.cert_refresher.stop)
+
+        status = ask.certificate_status()
+        self.assertEqual(1, len(status))
+        self.assertEqual(CERT_URL, status[0]['url'])
+        self.assertEqual(status[0]['not_after'], status[0]['expires_at'])
+        self.assertEqual(1, self.fetcher.call_count)
+
+    def test_only_due_certificates_are_reloaded(self):
+        cache = verifier.CertificateCache()
+        load = lambda url, refresh: verifier.load_certificate(url, cache=cache, fetcher=self.fetcher, refresh=refresh)
+        refresher = verifier.CertificateRefresher([CERT_URL], cache, load, margin=60)
+
+        self.assertEqual(1, refresher.warm())
+        self.assertEqual(0, refresher.warm(due_only=True))
+        refresher.margin = 365 * 24 * 3600
+        self.assertEqual(1, refresher.warm(due_only=True))
+        self.assertEqual(2, self.fetcher.call_count)
+
+    def test_failures_are_logged_not_raised(self):
+        cache = verifier.CertificateCache()
+        refresher = verifier.CertificateRefresher(['http://example.com/cert.pem'], cache,
+                                                  partial(verifier.load_certificate, cache=cache))
+        self.assertEqual(0, refresher.warm())
+        self.assertEqual(refresher.retry_interval, refresher._next_delay())
+
+
+class CertificateFetcherTests(unittest.TestCase):
+
+    def test_concurrent_fetches_share_one_download(self):
+        release = threading.Event()
+        pool = Mock()
+
+        def slow_request(method, url):
+            release.wait(5)
+            return Mock(status=200, data=b'pem')
+        pool.request.side_effect = slow_request
+
+        fetcher = verifier.CertificateFetcher(pool=pool)
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(fetcher.fetch(CERT_URL))) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        # give every thread time to join the in-flight download
+        time.sleep(0.2)
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual([b'pem'] * 5, results)
+        self.assertEqual(1, pool.request.call_count)
+
+    def test_failed_download_raises_verification_error(self):
+        pool = Mock()
+        pool.request.return_value = Mock(status=403, data=b'')
+        fetcher = verifier.CertificateFetcher(pool=pool)
+        with self.assertRaises(verifier.VerificationError):
+            fetcher.fetch(CERT_URL)
+
+
+if __name__ == '__main__':
+    unittest.main()